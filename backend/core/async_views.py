@@ -0,0 +1,39 @@
+"""
+Versions asynchrones des vues d'APIs externes, pour un déploiement ASGI (uvicorn)
+Activées par API_ASYNC_VIEWS : les appels aux APIs ne bloquent plus un thread chacun
+"""
+
+from adrf.decorators import api_view
+from rest_framework.decorators import permission_classes
+from rest_framework.permissions import IsAuthenticated
+from .services.async_fetch import run_with_async_fetches
+from .views import (
+    search_external_response, get_trending_external_response, get_similar_suggestions_response
+)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+async def search_external(request):
+    """
+    Recherche dans les APIs externes (TMDB, Spotify, Google Books)
+    """
+    return await run_with_async_fetches(search_external_response, request)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+async def get_trending_external(request):
+    """
+    Récupère le contenu tendance depuis les APIs externes
+    """
+    return await run_with_async_fetches(get_trending_external_response, request)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+async def get_similar_suggestions(request, item_id):
+    """
+    Suggestions similaires basées sur un élément existant
+    """
+    return await run_with_async_fetches(get_similar_suggestions_response, request, item_id)
@@ -0,0 +1,79 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import APICache
+from core.services import cache_codecs
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la taille et le temps de décodage des encodages APICache "
+        "(JSONField actuel vs binaires compressés) sur des réponses enregistrées"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*',
+                            help="Fichiers JSON de réponses enregistrées (défaut: échantillon de la table APICache)")
+        parser.add_argument('--sample', type=int, default=200,
+                            help="Nombre d'entrées APICache à échantillonner si aucun fichier n'est fourni")
+        parser.add_argument('--repeat', type=int, default=20,
+                            help="Nombre de décodages par payload pour mesurer le temps")
+
+    def handle(self, *args, **options):
+        payloads = self._load_payloads(options['files'], options['sample'])
+        if not payloads:
+            raise CommandError("Aucune réponse à mesurer")
+
+        repeat = options['repeat']
+        rows = [self._measure_json_field(payloads, repeat)]
+        for encoding in cache_codecs.available_encodings():
+            rows.append(self._measure_encoding(payloads, encoding, repeat))
+
+        baseline_size = rows[0][1]
+        self.stdout.write(f"{len(payloads)} réponses, {repeat} décodages chacune\n")
+        self.stdout.write(f"{'encodage':<16}{'octets':>12}{'ratio':>8}{'décodage (µs/payload)':>24}")
+        for name, size, decode_us in rows:
+            self.stdout.write(f"{name:<16}{size:>12}{size / baseline_size:>8.2f}{decode_us:>24.1f}")
+
+    def _load_payloads(self, files, sample):
+        if files:
+            payloads = []
+            for path in files:
+                try:
+                    payloads.append(json.loads(Path(path).read_text()))
+                except (OSError, ValueError) as e:
+                    raise CommandError(f"{path}: {e}")
+            return payloads
+
+        payloads = []
+        for cache_obj in APICache.objects.order_by('-created_at')[:sample]:
+            try:
+                data = cache_obj.value
+            except Exception:
+                continue
+            if isinstance(data, (dict, list)) and data != APICache.NEGATIVE_MARKER:
+                payloads.append(data)
+        return payloads
+
+    def _measure_json_field(self, payloads, repeat):
+        """JSONField : texte JSON stocké, json.loads à chaque lecture"""
+        raw = [json.dumps(data) for data in payloads]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for text in raw:
+                json.loads(text)
+        elapsed = time.perf_counter() - started
+        size = sum(len(text.encode()) for text in raw)
+        return cache_codecs.JSON_FIELD, size, elapsed / (repeat * len(raw)) * 1e6
+
+    def _measure_encoding(self, payloads, encoding, repeat):
+        encoded = [cache_codecs.encode(data, encoding) for data in payloads]
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for blob in encoded:
+                cache_codecs.decode(blob, encoding)
+        elapsed = time.perf_counter() - started
+        return encoding, sum(len(blob) for blob in encoded), elapsed / (repeat * len(encoded)) * 1e6
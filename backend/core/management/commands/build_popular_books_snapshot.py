@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.tasks import build_popular_books_snapshot
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'instantané des livres populaires (recherches Google Books)"
+
+    def handle(self, *args, **options):
+        result = build_popular_books_snapshot()
+        if not result['books']:
+            self.stdout.write(self.style.WARNING("Aucune recherche n'a abouti, instantané inchangé"))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['books']} livres enregistrés en {result['duration_seconds']}s ({result['built_at']})"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.tasks import purge_expired_api_cache
+
+
+class Command(BaseCommand):
+    help = "Supprime par lots les entrées APICache expirées"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Nombre de lignes supprimées par lot (défaut: API_CACHE_PURGE_BATCH_SIZE)")
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help="Nombre maximal de lots (défaut: jusqu'à épuisement)")
+
+    def handle(self, *args, **options):
+        result = purge_expired_api_cache(
+            batch_size=options['batch_size'],
+            max_batches=options['max_batches'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['deleted']} entrées expirées supprimées en {result['duration_seconds']}s"
+        ))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.models import ListItem
+from core.services.external_enrichment_service import ExternalEnrichmentService
+from core.services.registry import get_service
+
+
+class Command(BaseCommand):
+    help = "Actualise l'enrichissement externe des éléments de liste (appels groupés pour Spotify)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--list', type=int, dest='list_id', default=None,
+                            help="Identifiant de la liste à actualiser (défaut: toutes)")
+        parser.add_argument('--force', action='store_true',
+                            help="Actualiser aussi les références encore récentes")
+
+    def handle(self, *args, **options):
+        items = ListItem.objects.select_related('list', 'external_ref')
+        if options['list_id'] is not None:
+            items = items.filter(list_id=options['list_id'])
+
+        enriched = get_service(ExternalEnrichmentService).refresh_list_items(
+            list(items), force_refresh=options['force']
+        )
+        self.stdout.write(self.style.SUCCESS(f"{enriched} éléments enrichis"))
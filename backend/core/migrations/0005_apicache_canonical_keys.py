@@ -0,0 +1,32 @@
+import re
+
+from django.db import migrations
+
+# Ancien format : "<provider>_<md5 de str(params)>"
+LEGACY_KEY_PATTERN = re.compile(r'^(tmdb|spotify|google_books)_[0-9a-f]{32}$')
+
+
+def purge_legacy_cache_keys(apps, schema_editor):
+    """
+    Les anciennes clés ("<provider>_<md5 de str(params)>") ne sont pas réversibles :
+    les paramètres d'origine ne sont pas stockés, on ne peut donc pas les réécrire
+    au format canonique. Elles ne seront plus jamais lues, on les supprime.
+    """
+    APICache = apps.get_model('core', 'APICache')
+    legacy_ids = [
+        pk for pk, cache_key in APICache.objects.values_list('pk', 'cache_key').iterator()
+        if LEGACY_KEY_PATTERN.match(cache_key)
+    ]
+    for start in range(0, len(legacy_ids), 500):
+        APICache.objects.filter(pk__in=legacy_ids[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_listitem_is_watched'),
+    ]
+
+    operations = [
+        migrations.RunPython(purge_legacy_cache_keys, migrations.RunPython.noop),
+    ]
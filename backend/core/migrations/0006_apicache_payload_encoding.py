@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_apicache_canonical_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apicache',
+            name='encoding',
+            field=models.CharField(default='json', max_length=20, verbose_name='Format des données'),
+        ),
+        migrations.AddField(
+            model_name='apicache',
+            name='payload',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Données cachées (binaire compressé)'),
+        ),
+        migrations.AlterField(
+            model_name='apicache',
+            name='data',
+            field=models.JSONField(blank=True, null=True, verbose_name='Données cachées'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_apicache_payload_encoding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listitem',
+            name='enrichment_status',
+            field=models.CharField(choices=[('none', 'Non demandé'), ('pending', 'En attente'), ('running', 'En cours'), ('done', 'Enrichi'), ('failed', 'Échec')], default='none', max_length=10, verbose_name="État de l'enrichissement externe"),
+        ),
+    ]
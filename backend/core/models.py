@@ -1,7 +1,11 @@
 from django.db import models
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
+from typing import Any, NamedTuple, Optional
+from .services.local_cache import LocalLRUCache
+from .services import cache_backends, cache_codecs
 
 
 class List(models.Model):
@@ -61,11 +65,24 @@ class List(models.Model):
 
 
 class ListItem(models.Model):
+    class EnrichmentStatus(models.TextChoices):
+        NONE = 'none', 'Non demandé'
+        PENDING = 'pending', 'En attente'
+        RUNNING = 'running', 'En cours'
+        DONE = 'done', 'Enrichi'
+        FAILED = 'failed', 'Échec'
+    
     title = models.CharField(max_length=200, verbose_name="Titre")
     description = models.TextField(blank=True, verbose_name="Description/Commentaire")
     position = models.PositiveIntegerField(default=0, verbose_name="Position dans la liste")
     list = models.ForeignKey(List, on_delete=models.CASCADE, related_name='items', verbose_name="Liste")
     is_watched = models.BooleanField(default=False, verbose_name="Vu/Lu")
+    enrichment_status = models.CharField(
+        max_length=10,
+        choices=EnrichmentStatus.choices,
+        default=EnrichmentStatus.NONE,
+        verbose_name="État de l'enrichissement externe"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date d'ajout")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Date de modification")
     
@@ -161,17 +178,55 @@ class ExternalReference(models.Model):
         return self.last_updated < timezone.now() - timedelta(days=days)
 
 
+class _NegativeCacheHit:
+    """Sentinelle (fausse en contexte booléen) pour une absence de résultat mise en cache"""
+    
+    def __bool__(self):
+        return False
+    
+    def __repr__(self):
+        return 'APICache.NEGATIVE'
+
+
+class CacheLookup(NamedTuple):
+    """Lecture d'une entrée de APICache (voir APICache.lookup)"""
+    data: Any
+    is_stale: bool
+    # Validateurs HTTP de l'entrée lue, même trop ancienne pour être servie
+    validators: Optional[dict]
+
+
 class APICache(models.Model):
     """Cache pour les réponses d'APIs externes"""
     
+    # Retourné à la place des données pour une entrée de cache négative (réponse vide ou 404)
+    NEGATIVE = _NegativeCacheHit()
+    # Représentation stockée d'une entrée négative
+    NEGATIVE_MARKER = {'__negative__': True}
+    # Représentation stockée de données accompagnées de leurs validateurs (ETag / Last-Modified)
+    DATA_KEY = '__data__'
+    VALIDATORS_KEY = '__validators__'
+    
     cache_key = models.CharField(
         max_length=255, 
         unique=True,
         verbose_name="Clé de cache"
     )
     data = models.JSONField(
+        null=True,
+        blank=True,
         verbose_name="Données cachées"
     )
+    payload = models.BinaryField(
+        null=True,
+        blank=True,
+        verbose_name="Données cachées (binaire compressé)"
+    )
+    encoding = models.CharField(
+        max_length=20,
+        default=cache_codecs.JSON_FIELD,
+        verbose_name="Format des données"
+    )
     expires_at = models.DateTimeField(
         verbose_name="Date d'expiration"
     )
@@ -192,42 +247,229 @@ class APICache(models.Model):
     def __str__(self):
         return f"Cache: {self.cache_key}"
     
+    @property
+    def value(self):
+        """Données décodées, quel que soit le format de stockage"""
+        if self.encoding == cache_codecs.JSON_FIELD:
+            return self.data
+        return cache_codecs.decode(self.payload, self.encoding)
+    
+    @classmethod
+    def storage_fields(cls, data):
+        """Champs à enregistrer pour des données selon API_CACHE_ENCODING"""
+        encoding = cache_codecs.resolve_encoding(getattr(settings, 'API_CACHE_ENCODING', cache_codecs.JSON_FIELD))
+        if encoding == cache_codecs.JSON_FIELD:
+            return {'data': data, 'payload': None, 'encoding': encoding}
+        return {'data': None, 'payload': cache_codecs.encode(data, encoding), 'encoding': encoding}
+    
+    # Tier LRU en mémoire et backend de stockage, propres à chaque worker (créés à la première utilisation)
+    _local_cache = None
+    _backend = None
+    
     @classmethod
     def is_expired(cls, cache_key):
         """Vérifie si une entrée de cache est expirée"""
-        try:
-            cache_obj = cls.objects.get(cache_key=cache_key)
-            return timezone.now() > cache_obj.expires_at
-        except cls.DoesNotExist:
-            return True
+        entry = cls.backend().get(cache_key)
+        return entry is None or timezone.now() > entry[1]
+    
+    @classmethod
+    def local_cache(cls):
+        """Tier mémoire (par worker) consulté avant le backend"""
+        if cls._local_cache is None:
+            cls._local_cache = LocalLRUCache(
+                max_entries=getattr(settings, 'API_CACHE_LOCAL_MAX_ENTRIES', 1000),
+                max_bytes=getattr(settings, 'API_CACHE_LOCAL_MAX_BYTES', 16 * 1024 * 1024),
+                max_ttl_seconds=getattr(settings, 'API_CACHE_LOCAL_MAX_TTL', 600),
+            )
+        return cls._local_cache
+    
+    @classmethod
+    def backend(cls):
+        """Backend de stockage sélectionné par API_CACHE_BACKEND (table en base par défaut)"""
+        if cls._backend is None:
+            cls._backend = cache_backends.get_backend(cls)
+        return cls._backend
+    
+    @classmethod
+    def stale_max_grace(cls):
+        """Fenêtre maximale pendant laquelle une entrée expirée est conservée"""
+        return timedelta(hours=getattr(settings, 'API_CACHE_STALE_MAX_GRACE_HOURS', 24))
     
     @classmethod
     def get_cached_data(cls, cache_key):
-        """Récupère les données du cache si valides"""
-        try:
-            cache_obj = cls.objects.get(cache_key=cache_key)
-            if timezone.now() <= cache_obj.expires_at:
-                return cache_obj.data
-            else:
-                # Nettoyer l'entrée expirée
-                cache_obj.delete()
-                return None
-        except cls.DoesNotExist:
+        """Récupère les données du cache si valides (mémoire locale puis backend)"""
+        data, is_stale = cls.get_cached_data_or_stale(cache_key, stale_grace_hours=0)
+        return data
+    
+    @classmethod
+    def get_shared_data(cls, cache_key):
+        """
+        Récupère les données valides directement depuis le backend, sans consulter le tier
+        mémoire : voit les entrées écrites entre-temps par les autres workers
+        """
+        entry = cls.backend().get(cache_key)
+        if entry is None:
             return None
+        
+        data, expires_at = entry
+        if timezone.now() > expires_at:
+            return None
+        cls.local_cache().set(cache_key, data, expires_at)
+        return cls._decode(data)
+    
+    @classmethod
+    def get_cached_data_or_stale(cls, cache_key, stale_grace_hours=0):
+        """
+        Récupère les données du cache, en acceptant une entrée expirée depuis
+        moins de stale_grace_hours. Retourne (données, périmée) ou (None, False);
+        une entrée négative est retournée sous la forme APICache.NEGATIVE.
+        """
+        lookup = cls.lookup(cache_key, stale_grace_hours)
+        return lookup.data, lookup.is_stale
+    
+    @classmethod
+    def lookup(cls, cache_key, stale_grace_hours=0):
+        """
+        Comme get_cached_data_or_stale, avec en plus les validateurs HTTP de l'entrée
+        (utilisables pour une requête conditionnelle même si l'entrée ne peut plus être servie)
+        """
+        local = cls.local_cache()
+        stored = local.get(cache_key)
+        if stored is not None:
+            return CacheLookup(cls._decode(stored), False, cls._validators(stored))
+        
+        # Absente du tier mémoire ou périmée : le backend partagé fait foi (une copie
+        # plus récente a pu y être écrite par un autre worker)
+        entry = cls.backend().get(cache_key)
+        if entry is None:
+            return CacheLookup(None, False, None)
+        
+        now = timezone.now()
+        grace = min(timedelta(hours=stale_grace_hours), cls.stale_max_grace())
+        stored, expires_at = entry
+        if now <= expires_at:
+            local.set(cache_key, stored, expires_at)
+            return CacheLookup(cls._decode(stored), False, cls._validators(stored))
+        if now <= expires_at + grace:
+            return CacheLookup(cls._decode(stored), True, cls._validators(stored))
+        
+        # Les entrées expirées sont purgées hors requête (voir purge_expired)
+        return CacheLookup(None, False, cls._validators(stored))
     
     @classmethod
-    def set_cached_data(cls, cache_key, data, ttl_hours=24):
-        """Sauvegarde les données dans le cache"""
+    def _decode(cls, stored):
+        """Données d'une représentation stockée (APICache.NEGATIVE pour une entrée négative)"""
+        if stored == cls.NEGATIVE_MARKER:
+            return cls.NEGATIVE
+        if isinstance(stored, dict) and cls.DATA_KEY in stored:
+            return stored[cls.DATA_KEY]
+        return stored
+    
+    @classmethod
+    def _validators(cls, stored):
+        if isinstance(stored, dict) and cls.VALIDATORS_KEY in stored:
+            return stored[cls.VALIDATORS_KEY]
+        return None
+    
+    @classmethod
+    def set_cached_data(cls, cache_key, data, ttl_hours=24, validators=None):
+        """
+        Sauvegarde les données dans le cache, avec leurs validateurs HTTP éventuels
+        (conservés dans la même entrée, voir lookup)
+        """
+        stored = {cls.DATA_KEY: data, cls.VALIDATORS_KEY: validators} if validators else data
         expires_at = timezone.now() + timedelta(hours=ttl_hours)
-        cls.objects.update_or_create(
-            cache_key=cache_key,
-            defaults={
-                'data': data,
-                'expires_at': expires_at
-            }
-        )
+        cls.backend().set(cache_key, stored, expires_at)
+        cls.local_cache().set(cache_key, stored, expires_at)
+    
+    @classmethod
+    def touch(cls, cache_key, ttl_hours=24):
+        """
+        Repousse l'expiration d'une entrée existante (même expirée) sans réécrire ses données.
+        Retourne les données, ou None si l'entrée n'existe plus ou est négative.
+        """
+        entry = cls.backend().get(cache_key)
+        if entry is None or entry[0] == cls.NEGATIVE_MARKER:
+            return None
+        
+        stored = entry[0]
+        expires_at = timezone.now() + timedelta(hours=ttl_hours)
+        cls.backend().touch(cache_key, stored, expires_at)
+        cls.local_cache().set(cache_key, stored, expires_at)
+        return cls._decode(stored)
+    
+    @classmethod
+    def get_many(cls, cache_keys):
+        """
+        Récupère plusieurs entrées en une seule lecture du backend et alimente le tier mémoire.
+        Retourne {clé: données} pour les entrées valides (APICache.NEGATIVE pour les négatives).
+        """
+        now = timezone.now()
+        local = cls.local_cache()
+        found = {}
+        missing = []
+        
+        for cache_key in dict.fromkeys(cache_keys):
+            data = local.get(cache_key)
+            if data is not None:
+                found[cache_key] = cls._decode(data)
+            else:
+                missing.append(cache_key)
+        
+        if missing:
+            for cache_key, (data, expires_at) in cls.backend().get_many(missing).items():
+                if now <= expires_at:
+                    local.set(cache_key, data, expires_at)
+                    found[cache_key] = cls._decode(data)
+        
+        return found
+    
+    @classmethod
+    def set_many(cls, mapping, ttl_hours=24):
+        """Sauvegarde plusieurs entrées en une seule écriture (upsert groupé ou pipeline)"""
+        if not mapping:
+            return
+        
+        expires_at = timezone.now() + timedelta(hours=ttl_hours)
+        cls.backend().set_many(mapping, expires_at)
+        
+        local = cls.local_cache()
+        for cache_key, data in mapping.items():
+            local.set(cache_key, data, expires_at)
+    
+    @classmethod
+    def set_negative(cls, cache_key, ttl_hours=None):
+        """Mémorise l'absence de résultat pour une clé (TTL court)"""
+        if ttl_hours is None:
+            ttl_hours = getattr(settings, 'API_CACHE_NEGATIVE_TTL_HOURS', 0.25)
+        cls.set_cached_data(cache_key, cls.NEGATIVE_MARKER, ttl_hours=ttl_hours)
+    
+    @classmethod
+    def purge_expired(cls, batch_size=1000, max_batches=None):
+        """
+        Supprime par lots les entrées expirées au-delà de la fenêtre stale-while-revalidate,
+        en s'appuyant sur l'index expires_at. Retourne le nombre de lignes supprimées.
+        Avec le backend Redis, les clés expirent nativement : seule la table de repli est purgée.
+        """
+        cutoff = timezone.now() - cls.stale_max_grace()
+        deleted = 0
+        batches = 0
+        
+        while max_batches is None or batches < max_batches:
+            ids = list(
+                cls.objects.filter(expires_at__lt=cutoff)
+                .order_by('expires_at')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            count, _ = cls.objects.filter(pk__in=ids).delete()
+            deleted += count
+            batches += 1
+        
+        return deleted
     
     @classmethod
     def clean_expired(cls):
         """Nettoie les entrées de cache expirées"""
-        return cls.objects.filter(expires_at__lt=timezone.now()).delete()
+        return cls.purge_expired()
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -19,4 +20,19 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         elif hasattr(obj, 'list') and hasattr(obj.list, 'owner'):
             return obj.list.owner == request.user
         else:
-            return False
\ No newline at end of file
+            return False
+
+
+class IsLocalOrStaff(permissions.BasePermission):
+    """
+    Accès réservé aux requêtes locales (API_METRICS_ALLOWED_IPS, ex: collecteur de métriques
+    sur la même machine) ou aux membres du staff.
+    L'adresse testée est REMOTE_ADDR : derrière un proxy (ex: Render), c'est celle du proxy,
+    et seuls les membres du staff ont alors accès.
+    """
+
+    def has_permission(self, request, view):
+        if request.user and request.user.is_staff:
+            return True
+        allowed_ips = getattr(settings, 'API_METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+        return request.META.get('REMOTE_ADDR') in allowed_ips
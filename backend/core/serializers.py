@@ -38,8 +38,8 @@ class ListItemSerializer(serializers.ModelSerializer):
     external_ref = serializers.SerializerMethodField(read_only=True)
     class Meta:
         model = ListItem
-        fields = ('id', 'title', 'description', 'position', 'list', 'is_watched', 'created_at', 'updated_at', 'external_ref')
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        fields = ('id', 'title', 'description', 'position', 'list', 'is_watched', 'created_at', 'updated_at', 'external_ref', 'enrichment_status')
+        read_only_fields = ('id', 'created_at', 'updated_at', 'enrichment_status')
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -0,0 +1,67 @@
+"""
+Exécution des vues d'APIs externes sous ASGI sans bloquer un thread par appel HTTP
+Le code synchrone existant est exécuté en mode différé : ses absences dans le cache
+sont relevées, les appels sont faits en parallèle sur la boucle d'événements, puis
+le code est rejoué avec un cache complet.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Tuple
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .provider_cache import DeferredFetch, DeferredFetchContext, afetch_and_store, deferred_fetches
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Appels successifs dépendant des réponses précédentes (ex: détails puis similaires)
+MAX_FETCH_ROUNDS = 3
+
+# Appels en cours dans ce processus (une seule requête par clé)
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+async def run_with_async_fetches(func: Callable[..., Any], *args, timeout: float = None, **kwargs) -> Any:
+    """
+    Exécute func(*args, **kwargs) (code synchrone) en faisant ses appels aux APIs
+    de façon asynchrone. Les appels non terminés à l'échéance continuent en
+    arrière-plan ; func voit alors ces données comme absentes, et les tâches de
+    run_parallel qui les attendaient sont signalées manquantes (voir complete_or_raise).
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'API_FAN_OUT_TIMEOUT_SECONDS', 5)
+    deadline = time.monotonic() + timeout
+    context = DeferredFetchContext()
+
+    for round_number in range(MAX_FETCH_ROUNDS + 1):
+        result = await sync_to_async(_run_deferred)(context, func, args, kwargs)
+        pending = context.take_pending()
+        if not pending:
+            return result
+
+        remaining = deadline - time.monotonic()
+        tasks = [_fetch_task(fetch) for fetch in pending.values()]
+        if round_number == MAX_FETCH_ROUNDS or remaining <= 0:
+            # Les appels lancés alimenteront le cache pour les requêtes suivantes
+            return result
+        await asyncio.wait(tasks, timeout=remaining)
+
+    return result
+
+
+def _run_deferred(context: DeferredFetchContext, func: Callable[..., Any], args: Tuple, kwargs: Dict) -> Any:
+    token = deferred_fetches.set(context)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        deferred_fetches.reset(token)
+
+
+def _fetch_task(fetch: DeferredFetch) -> asyncio.Task:
+    task = _inflight.get(fetch.cache_key)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        task = asyncio.ensure_future(afetch_and_store(fetch))
+        _inflight[fetch.cache_key] = task
+        task.add_done_callback(lambda _, key=fetch.cache_key: _inflight.pop(key, None))
+    return task
@@ -0,0 +1,91 @@
+"""
+Transport HTTP asynchrone vers les APIs externes (vues ASGI)
+Un client httpx keep-alive par hôte et par boucle d'événements ; sans httpx, repli sur
+la Session synchrone exécutée dans un thread
+"""
+
+import asyncio
+import time
+import weakref
+from typing import Any, Dict, Tuple
+from urllib.parse import urlsplit
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from . import circuit_breaker, http_client, rate_limit
+from .provider_cache import NotModified, response_validators
+from .redis_client import get_redis
+
+try:
+    import httpx
+except ImportError:  # dépendance optionnelle
+    httpx = None
+
+# Boucle d'événements -> {hôte: client}
+_clients = weakref.WeakKeyDictionary()
+
+
+def _client(url: str):
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    host = urlsplit(url).netloc
+    client = clients.get(host)
+    if client is None:
+        client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=getattr(settings, 'API_ASYNC_HTTP_MAX_CONNECTIONS', 100),
+            max_keepalive_connections=getattr(settings, 'API_HTTP_POOL_MAXSIZE', 20),
+        ))
+        clients[host] = client
+    return client
+
+
+async def _off_loop(func, *args):
+    """Disjoncteur et limiteur partagés : leurs allers-retours Redis sont faits hors de la boucle"""
+    if get_redis() is None:
+        return func(*args)
+    return await sync_to_async(func, thread_sensitive=False)(*args)
+
+
+async def get_json(url: str, params: Dict = None, headers: Dict = None, provider: str = None,
+                   timeout: float = 10) -> Tuple[Any, Dict]:
+    """
+    GET asynchrone : retourne (données JSON, validateurs) ou lève NotModified sur un 304.
+    Les erreurs sont celles de requests (HTTPError, Timeout...) pour que les
+    appelants les traitent comme celles du transport synchrone.
+    """
+    if httpx is None:
+        return await sync_to_async(http_client.get_json, thread_sensitive=False)(
+            url, params, headers, provider, timeout
+        )
+
+    if provider:
+        # Jeton de débit d'abord (voir http_client.get_json)
+        await rate_limit.aacquire(provider)
+        await _off_loop(circuit_breaker.before_call, provider)
+    started = time.monotonic()
+    try:
+        response = await _client(url).get(url, params=params, headers=headers, timeout=timeout)
+    except httpx.HTTPError as e:
+        if provider:
+            await _off_loop(circuit_breaker.record, provider, True)
+        if isinstance(e, httpx.TimeoutException):
+            raise requests.Timeout(str(e))
+        raise requests.ConnectionError(str(e))
+
+    if provider:
+        elapsed = time.monotonic() - started
+        await _off_loop(circuit_breaker.record_response, provider, response.status_code, elapsed)
+        await _off_loop(rate_limit.observe, provider, response.status_code, response.headers)
+    if response.status_code == 429:
+        # Voir http_client.get_json
+        raise rate_limit.RateLimited(f"{provider or url} returned 429")
+    if response.status_code == 304:
+        raise NotModified()
+    if response.status_code >= 400:
+        error_response = requests.Response()
+        error_response.status_code = response.status_code
+        error_response.reason = response.reason_phrase
+        error_response.url = str(response.url)
+        error_response.headers.update(response.headers)
+        raise requests.HTTPError(f"{response.status_code} Error for url: {response.url}", response=error_response)
+    return response.json(), response_validators(response)
+
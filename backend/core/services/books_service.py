@@ -4,10 +4,16 @@ Utilise exclusivement Google Books pour les recherches et données de livres
 """
 
 import requests
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from django.conf import settings
+from django.utils import timezone
 from ..models import APICache
-import hashlib
+from .cache_keys import build_cache_key
+from .ttl_policy import get_ttl_hours
+from . import metrics
+from . import http_client
+from . import async_http
+from .provider_cache import FetchDeferred, cached_fetch, conditional_headers, prefetch, schedule_refresh
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,36 +23,70 @@ class BooksService:
     """Service pour Google Books API"""
     
     GOOGLE_BOOKS_BASE_URL = "https://www.googleapis.com/books/v1"
+    # Recherches utilisées pour les livres populaires (par défaut, voir POPULAR_BOOKS_SEED_QUERIES)
+    POPULAR_QUERIES = [
+        'Le Seigneur des Anneaux Tolkien',
+        '1984 George Orwell',
+        'Harry Potter école sorciers Rowling',
+        'Le Petit Prince Saint-Exupéry',
+        'L\'Étranger Albert Camus',
+        'Dune Frank Herbert',
+        'Les Misérables Victor Hugo',
+        'Germinal Émile Zola',
+        'Pride and Prejudice Jane Austen',
+        'To Kill a Mockingbird Harper Lee'
+    ]
+    # Instantané des livres populaires, reconstruit par la tâche build_popular_books_snapshot
+    # ou en arrière-plan quand il manque
+    POPULAR_SNAPSHOT_KEY = 'google_books:popular_snapshot'
+    # Fenêtre pendant laquelle une réponse expirée est servie pendant son rafraîchissement
+    CACHE_STALE_GRACE_HOURS = 12
+    # Champs de volumeInfo lus par _format_google_book
+    VOLUME_INFO_FIELDS = (
+        'title', 'authors', 'description', 'categories', 'imageLinks', 'publishedDate',
+        'publisher', 'pageCount', 'language', 'industryIdentifiers', 'averageRating',
+        'ratingsCount', 'previewLink', 'infoLink',
+    )
+    # Champs supplémentaires des détails bruts d'un volume (get_book_details)
+    DETAIL_VOLUME_INFO_FIELDS = VOLUME_INFO_FIELDS + (
+        'subtitle', 'printType', 'mainCategory', 'maturityRating', 'canonicalVolumeLink',
+    )
+    # Réponses partielles (paramètre fields) : seuls ces champs sont transférés et mis en cache
+    SEARCH_FIELDS = f"totalItems,items(id,volumeInfo({','.join(VOLUME_INFO_FIELDS)}))"
+    DETAIL_FIELDS = f"id,volumeInfo({','.join(DETAIL_VOLUME_INFO_FIELDS)})"
     
     def __init__(self):
         self.google_api_key = getattr(settings, 'GOOGLE_BOOKS_API_KEY', None)
         if not self.google_api_key:
             logger.warning("GOOGLE_BOOKS_API_KEY not configured, using basic access")
     
-    def _make_request(self, url: str, params: Dict = None) -> Optional[Dict]:
+    def _make_request(self, url: str, params: Dict = None, stale_grace_hours: float = None,
+                      ttl_hours: float = None) -> Optional[Dict]:
         """Effectue une requête avec gestion d'erreur et cache"""
         if params is None:
             params = {}
+        if stale_grace_hours is None:
+            stale_grace_hours = self.CACHE_STALE_GRACE_HOURS
+        if ttl_hours is None:
+            # Durée selon la politique par endpoint (voir ttl_policy)
+            ttl_hours = get_ttl_hours('google_books', self._endpoint_path(url), params)
         
-        # Clé de cache
-        cache_key = f"google_books_{hashlib.md5(f'{url}_{str(params)}'.encode()).hexdigest()}"
-        
-        # Vérifier le cache
-        cached_data = APICache.get_cached_data(cache_key)
-        if cached_data:
-            return cached_data
+        # Clé de cache (sans la clé d'API)
+        cache_key = self.cache_key(url, params)
         
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Mettre en cache pour 12 heures
-            APICache.set_cached_data(cache_key, data, ttl_hours=12)
-            
-            return data
+            return cached_fetch(
+                cache_key,
+                lambda validators: self._fetch(url, params, validators),
+                ttl_hours=ttl_hours,
+                stale_grace_hours=stale_grace_hours,
+                is_empty=self._is_empty_response,
+                metric_labels=metrics.labels('google_books', self._endpoint_path(url)),
+                async_fetcher=lambda validators: self._afetch(url, params, validators)
+            )
             
+        except FetchDeferred:
+            return None
         except requests.RequestException as e:
             logger.error(f"Google Books API error for {url}: {e}")
             return None
@@ -54,33 +94,89 @@ class BooksService:
             logger.error(f"Unexpected error with Google Books API: {e}")
             return None
     
+    def _endpoint_path(self, url: str) -> str:
+        """Chemin de l'endpoint relatif à l'API (ex: /volumes/{id})"""
+        if url.startswith(self.GOOGLE_BOOKS_BASE_URL):
+            return url[len(self.GOOGLE_BOOKS_BASE_URL):]
+        return url
+    
+    def cache_key(self, url: str, params: Dict = None) -> str:
+        """Clé de cache d'un appel, sans l'effectuer (utile pour les lectures groupées)"""
+        return build_cache_key('google_books', url, params)
+    
+    @staticmethod
+    def _is_empty_response(data: Dict) -> bool:
+        """Réponse sans contenu (ex: recherche sans volume), à mettre en cache négatif"""
+        return not data or ('totalItems' in data and not data.get('items'))
+    
+    def _fetch(self, url: str, params: Dict, validators: Dict = None) -> Tuple[Dict, Dict]:
+        """Appel HTTP brut vers Google Books (sans cache), conditionnel si des validateurs sont fournis"""
+        return http_client.get_json(url, params, conditional_headers(validators), provider='google_books')
+    
+    async def _afetch(self, url: str, params: Dict, validators: Dict = None) -> Tuple[Dict, Dict]:
+        """Équivalent asynchrone de _fetch (vues ASGI)"""
+        return await async_http.get_json(url, params, conditional_headers(validators), provider='google_books')
+    
     def search_books(self, query: str, limit: int = 10) -> List[Dict]:
         """Recherche de livres via Google Books API"""
         return self._search_google_books(query, limit)
     
     def get_popular_books(self, limit: int = 20) -> List[Dict]:
-        """Récupère des livres populaires via Google Books API"""
-        popular_queries = [
-            'Le Seigneur des Anneaux Tolkien',
-            '1984 George Orwell',
-            'Harry Potter école sorciers Rowling',
-            'Le Petit Prince Saint-Exupéry',
-            'L\'Étranger Albert Camus',
-            'Dune Frank Herbert',
-            'Les Misérables Victor Hugo',
-            'Germinal Émile Zola',
-            'Pride and Prejudice Jane Austen',
-            'To Kill a Mockingbird Harper Lee'
-        ]
+        """
+        Livres populaires : instantané précalculé (une lecture), sinon recherches Google Books.
+        Un instantané manquant est reconstruit en arrière-plan (une seule construction,
+        tous workers confondus) : sans worker Celery, les requêtes suivantes n'en font qu'une lecture.
+        """
+        snapshot = APICache.get_cached_data(self.POPULAR_SNAPSHOT_KEY)
+        if snapshot:
+            return snapshot['books'][:limit]
+        schedule_refresh(self.POPULAR_SNAPSHOT_KEY, self.build_popular_snapshot)
+        return self._search_popular_books(limit)
+    
+    def popular_queries(self) -> List[str]:
+        """Recherches résolues en livres populaires"""
+        return getattr(settings, 'POPULAR_BOOKS_SEED_QUERIES', None) or self.POPULAR_QUERIES
+    
+    def build_popular_snapshot(self) -> Optional[Dict]:
+        """
+        Résout les recherches de livres populaires et enregistre le résultat (identifiants
+        des volumes, livres formatés, date de construction). L'instantané précédent est
+        conservé si aucune recherche n'aboutit.
+        """
+        queries = self.popular_queries()
+        books = self._search_popular_books(len(queries))
+        if not books:
+            logger.warning("Popular books snapshot not rebuilt: no search succeeded")
+            return None
         
+        snapshot = {
+            'built_at': timezone.now().isoformat(),
+            'queries': queries,
+            'volume_ids': [book['external_id'] for book in books],
+            'books': books,
+        }
+        APICache.set_cached_data(
+            self.POPULAR_SNAPSHOT_KEY, snapshot,
+            ttl_hours=getattr(settings, 'POPULAR_BOOKS_SNAPSHOT_TTL_HOURS', 48)
+        )
+        return snapshot
+    
+    def _search_popular_books(self, limit: int) -> List[Dict]:
+        """Premier résultat de chaque recherche de livre populaire"""
         results = []
+        seen_ids = set()
+        
+        # Charger les recherches déjà en cache en une seule requête
+        prefetch(self._popular_search_cache_keys())
         
         # Rechercher chaque livre populaire dans Google Books
-        for query in popular_queries:
+        for query in self.popular_queries():
             try:
                 gb_results = self._search_google_books(query, 1)
-                if gb_results:
-                    results.extend(gb_results)
+                for book in gb_results:
+                    if book['external_id'] not in seen_ids:
+                        seen_ids.add(book['external_id'])
+                        results.append(book)
                     
                 # Arrêter si on a assez de résultats
                 if len(results) >= limit:
@@ -92,6 +188,14 @@ class BooksService:
         
         return results[:limit]
     
+    def popular_books_cache_keys(self) -> List[str]:
+        """Clés de cache lues par get_popular_books (les recherches ne sont lues que sans instantané)"""
+        return [self.POPULAR_SNAPSHOT_KEY]
+    
+    def _popular_search_cache_keys(self) -> List[str]:
+        url = f"{self.GOOGLE_BOOKS_BASE_URL}/volumes"
+        return [self.cache_key(url, self._search_params(query, 1)) for query in self.popular_queries()]
+    
     def get_books_by_author(self, author: str, limit: int = 10) -> List[Dict]:
         """Récupère les livres d'un auteur via Google Books"""
         query = f"inauthor:{author}"
@@ -106,20 +210,25 @@ class BooksService:
         """Récupère les détails d'un livre via ISBN avec Google Books"""
         return self._get_google_book_by_isbn(isbn)
     
-    def _search_google_books(self, query: str, limit: int = 10) -> List[Dict]:
-        """Recherche spécifique sur Google Books"""
-        url = f"{self.GOOGLE_BOOKS_BASE_URL}/volumes"
+    def _search_params(self, query: str, limit: int = 10) -> Dict:
+        """Paramètres d'une recherche de volumes"""
         params = {
             'q': query,
             'maxResults': min(limit, 40),  # Max 40 pour Google Books
             'langRestrict': 'fr',  # Privilégier le français
-            'orderBy': 'relevance'
+            'orderBy': 'relevance',
+            'fields': self.SEARCH_FIELDS,
         }
         
         if self.google_api_key:
             params['key'] = self.google_api_key
         
-        data = self._make_request(url, params)
+        return params
+    
+    def _search_google_books(self, query: str, limit: int = 10) -> List[Dict]:
+        """Recherche spécifique sur Google Books"""
+        url = f"{self.GOOGLE_BOOKS_BASE_URL}/volumes"
+        data = self._make_request(url, self._search_params(query, limit))
         if not data:
             return []
         
@@ -153,7 +262,8 @@ class BooksService:
         """Récupère un livre de Google Books par ISBN"""
         url = f"{self.GOOGLE_BOOKS_BASE_URL}/volumes"
         params = {
-            'q': f'isbn:{isbn}'
+            'q': f'isbn:{isbn}',
+            'fields': self.SEARCH_FIELDS,
         }
         
         if self.google_api_key:
@@ -218,7 +328,7 @@ class BooksService:
     def get_book_details(self, book_id: str) -> Optional[Dict]:
         """Récupère les détails d'un livre par son ID Google Books"""
         url = f"{self.GOOGLE_BOOKS_BASE_URL}/volumes/{book_id}"
-        params = {}
+        params = {'fields': self.DETAIL_FIELDS}
         
         if self.google_api_key:
             params['key'] = self.google_api_key
@@ -226,5 +336,5 @@ class BooksService:
         data = self._make_request(url, params)
         
         if data:
-            return data  # Retourner les données brutes de Google Books API
+            return data  # Données brutes de Google Books API (limitées à DETAIL_FIELDS)
         return None
\ No newline at end of file
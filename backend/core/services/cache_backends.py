@@ -0,0 +1,193 @@
+"""
+Backends de stockage de APICache
+La table en base reste disponible comme repli quand Redis est configuré mais indisponible
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+from django.conf import settings
+from django.utils import timezone
+from . import cache_codecs
+from .redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (données, expires_at)
+Entry = Tuple[Any, datetime]
+
+
+class BaseCacheBackend:
+    """Interface de stockage : entrées brutes, sans logique de fraîcheur"""
+
+    name = 'base'
+
+    def get(self, cache_key: str) -> Optional[Entry]:
+        raise NotImplementedError
+
+    def get_many(self, cache_keys: Iterable[str]) -> Dict[str, Entry]:
+        return {key: entry for key in cache_keys if (entry := self.get(key)) is not None}
+
+    def set(self, cache_key: str, data: Any, expires_at: datetime) -> None:
+        raise NotImplementedError
+
+    def set_many(self, mapping: Dict[str, Any], expires_at: datetime) -> None:
+        for cache_key, data in mapping.items():
+            self.set(cache_key, data, expires_at)
+
+    def touch(self, cache_key: str, data: Any, expires_at: datetime) -> None:
+        """Repousse l'expiration d'une entrée dont les données n'ont pas changé"""
+        self.set(cache_key, data, expires_at)
+
+    def delete(self, cache_key: str) -> None:
+        raise NotImplementedError
+
+
+class DatabaseCacheBackend(BaseCacheBackend):
+    """Stockage dans la table APICache"""
+
+    name = 'database'
+
+    def __init__(self, model):
+        self.model = model
+
+    def get(self, cache_key: str) -> Optional[Entry]:
+        try:
+            cache_obj = self.model.objects.get(cache_key=cache_key)
+        except self.model.DoesNotExist:
+            return None
+        return self._entry(cache_obj)
+
+    def get_many(self, cache_keys: Iterable[str]) -> Dict[str, Entry]:
+        entries = {}
+        for cache_obj in self.model.objects.filter(cache_key__in=list(cache_keys)):
+            entry = self._entry(cache_obj)
+            if entry is not None:
+                entries[cache_obj.cache_key] = entry
+        return entries
+
+    def set(self, cache_key: str, data: Any, expires_at: datetime) -> None:
+        self.model.objects.update_or_create(
+            cache_key=cache_key,
+            defaults={
+                **self.model.storage_fields(data),
+                'expires_at': expires_at
+            }
+        )
+
+    def set_many(self, mapping: Dict[str, Any], expires_at: datetime) -> None:
+        self.model.objects.bulk_create(
+            [
+                self.model(cache_key=cache_key, expires_at=expires_at, **self.model.storage_fields(data))
+                for cache_key, data in mapping.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['cache_key'],
+            update_fields=['data', 'payload', 'encoding', 'expires_at']
+        )
+
+    def touch(self, cache_key: str, data: Any, expires_at: datetime) -> None:
+        # Seule la date d'expiration est réécrite, pas les données
+        self.model.objects.filter(cache_key=cache_key).update(expires_at=expires_at)
+
+    def delete(self, cache_key: str) -> None:
+        self.model.objects.filter(cache_key=cache_key).delete()
+
+    @staticmethod
+    def _entry(cache_obj) -> Optional[Entry]:
+        """Décode une ligne; une ligne illisible est traitée comme absente"""
+        try:
+            return cache_obj.value, cache_obj.expires_at
+        except Exception as e:
+            logger.warning(f"Unreadable APICache entry {cache_obj.cache_key} ({cache_obj.encoding}): {e}")
+            return None
+
+
+class RedisCacheBackend(BaseCacheBackend):
+    """
+    Stockage dans Redis : TTL natif (expiration + fenêtre stale-while-revalidate),
+    lectures groupées en un seul MGET. Bascule sur fallback en cas d'erreur Redis.
+    """
+
+    name = 'redis'
+    KEY_PREFIX = 'apicache:'
+
+    def __init__(self, client, fallback: BaseCacheBackend, keep_after_expiry: timedelta):
+        self.client = client
+        self.fallback = fallback
+        self.keep_after_expiry = keep_after_expiry
+
+    def get(self, cache_key: str) -> Optional[Entry]:
+        return self.get_many([cache_key]).get(cache_key)
+
+    def get_many(self, cache_keys: Iterable[str]) -> Dict[str, Entry]:
+        cache_keys = list(cache_keys)
+        if not cache_keys:
+            return {}
+        try:
+            raw_values = self.client.mget([self.KEY_PREFIX + key for key in cache_keys])
+        except Exception as e:
+            logger.warning(f"Redis cache read failed, using {self.fallback.name}: {e}")
+            return self.fallback.get_many(cache_keys)
+
+        entries = {}
+        for cache_key, raw in zip(cache_keys, raw_values):
+            if raw is None:
+                continue
+            entry = self._decode(cache_key, raw)
+            if entry is not None:
+                entries[cache_key] = entry
+        return entries
+
+    def set(self, cache_key: str, data: Any, expires_at: datetime) -> None:
+        self.set_many({cache_key: data}, expires_at)
+
+    def set_many(self, mapping: Dict[str, Any], expires_at: datetime) -> None:
+        ttl_ms = int((expires_at + self.keep_after_expiry - timezone.now()).total_seconds() * 1000)
+        if ttl_ms <= 0:
+            return
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for cache_key, data in mapping.items():
+                pipe.set(self.KEY_PREFIX + cache_key, self._encode(data, expires_at), px=ttl_ms)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis cache write failed, using {self.fallback.name}: {e}")
+            self.fallback.set_many(mapping, expires_at)
+
+    def delete(self, cache_key: str) -> None:
+        try:
+            self.client.delete(self.KEY_PREFIX + cache_key)
+        except Exception as e:
+            logger.warning(f"Redis cache delete failed: {e}")
+        self.fallback.delete(cache_key)
+
+    @staticmethod
+    def _encode(data: Any, expires_at: datetime) -> bytes:
+        """Valeur stockée : "<encodage>\\n" suivi de {'e': expiration (timestamp), 'd': données} encodé"""
+        encoding = cache_codecs.resolve_encoding(getattr(settings, 'API_CACHE_ENCODING', cache_codecs.JSON_FIELD))
+        envelope = {'e': expires_at.timestamp(), 'd': data}
+        return encoding.encode() + b'\n' + cache_codecs.encode(envelope, encoding)
+
+    @staticmethod
+    def _decode(cache_key: str, raw: bytes) -> Optional[Entry]:
+        try:
+            encoding, blob = raw.split(b'\n', 1)
+            envelope = cache_codecs.decode(blob, encoding.decode())
+            return envelope['d'], datetime.fromtimestamp(envelope['e'], tz=dt_timezone.utc)
+        except Exception as e:
+            logger.warning(f"Unreadable Redis cache entry {cache_key}: {e}")
+            return None
+
+
+def get_backend(model) -> BaseCacheBackend:
+    """Backend sélectionné par API_CACHE_BACKEND ('database' ou 'redis')"""
+    database = DatabaseCacheBackend(model)
+    if getattr(settings, 'API_CACHE_BACKEND', 'database') != 'redis':
+        return database
+
+    client = get_redis()
+    if client is None:
+        logger.warning("API_CACHE_BACKEND=redis but REDIS_URL is not configured, using database")
+        return database
+    return RedisCacheBackend(client, fallback=database, keep_after_expiry=model.stale_max_grace())
@@ -0,0 +1,85 @@
+"""
+Encodages binaires compressés pour les données de APICache
+Format identifié par une étiquette "<compression>+<sérialisation>" (ex: "zlib+json")
+"""
+
+import json
+import zlib
+from typing import Any, Dict, Tuple
+
+try:
+    import msgpack
+except ImportError:  # dépendance optionnelle
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # dépendance optionnelle
+    zstandard = None
+
+# Données stockées telles quelles dans le JSONField
+JSON_FIELD = 'json'
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def _json_loads(raw: bytes) -> Any:
+    return json.loads(raw)
+
+
+def _serializers() -> Dict[str, Tuple]:
+    serializers = {'json': (_json_dumps, _json_loads)}
+    if msgpack is not None:
+        serializers['msgpack'] = (
+            lambda data: msgpack.packb(data, use_bin_type=True),
+            lambda raw: msgpack.unpackb(raw, raw=False),
+        )
+    return serializers
+
+
+def _compressors() -> Dict[str, Tuple]:
+    compressors = {'zlib': (lambda raw: zlib.compress(raw, 6), zlib.decompress)}
+    if zstandard is not None:
+        compressors['zstd'] = (
+            lambda raw: zstandard.ZstdCompressor(level=3).compress(raw),
+            lambda raw: zstandard.ZstdDecompressor().decompress(raw),
+        )
+    return compressors
+
+
+def available_encodings():
+    """Étiquettes utilisables dans cet environnement (selon les dépendances installées)"""
+    return [
+        f"{compression}+{serialization}"
+        for compression in _compressors()
+        for serialization in _serializers()
+    ]
+
+
+def resolve_encoding(encoding: str) -> str:
+    """Retourne l'encodage demandé s'il est disponible, sinon le meilleur repli binaire"""
+    if not encoding or encoding == JSON_FIELD:
+        return JSON_FIELD
+    if encoding in available_encodings():
+        return encoding
+    return 'zlib+json'
+
+
+def encode(data: Any, encoding: str) -> bytes:
+    if encoding == JSON_FIELD:
+        return _json_dumps(data)
+    compression, serialization = encoding.split('+')
+    dumps, _ = _serializers()[serialization]
+    compress, _ = _compressors()[compression]
+    return compress(dumps(data))
+
+
+def decode(payload: bytes, encoding: str) -> Any:
+    if encoding == JSON_FIELD:
+        return _json_loads(bytes(payload))
+    compression, serialization = encoding.split('+')
+    _, loads = _serializers()[serialization]
+    _, decompress = _compressors()[compression]
+    return loads(decompress(bytes(payload)))
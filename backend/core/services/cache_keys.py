@@ -0,0 +1,48 @@
+"""
+Construction des clés de cache pour les requêtes vers les APIs externes
+Clés canoniques (ordre des paramètres, normalisation des recherches) et sans secrets
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Dict
+from urllib.parse import urlencode
+
+# Incrémenter pour invalider toutes les clés après un changement de format
+KEY_VERSION = 2
+
+# Paramètres d'authentification, jamais inclus dans une clé
+CREDENTIAL_PARAMS = {'api_key', 'key', 'access_token', 'client_id', 'client_secret'}
+
+# Paramètres contenant du texte libre saisi par l'utilisateur
+QUERY_PARAMS = {'q', 'query'}
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_query(value: str) -> str:
+    """Normalise une recherche : Unicode NFC, casse, espaces et accents ("Misérables" == "miserables")"""
+    value = unicodedata.normalize('NFKD', str(value))
+    value = ''.join(c for c in value if not unicodedata.combining(c))
+    value = unicodedata.normalize('NFC', value).casefold()
+    return _WHITESPACE.sub(' ', value).strip()
+
+
+def canonical_params(params: Dict = None) -> str:
+    """Représentation stable des paramètres (triés, sans identifiants, recherches normalisées)"""
+    items = []
+    for name, value in (params or {}).items():
+        if name in CREDENTIAL_PARAMS or value is None:
+            continue
+        if name in QUERY_PARAMS:
+            value = normalize_query(value)
+        items.append((name, str(value)))
+    return urlencode(sorted(items))
+
+
+def build_cache_key(provider: str, endpoint: str, params: Dict = None) -> str:
+    """Clé de cache "<provider>:v<version>:<md5>" pour un appel d'API"""
+    canonical = f"{endpoint}?{canonical_params(params)}"
+    digest = hashlib.md5(canonical.encode()).hexdigest()
+    return f"{provider}:v{KEY_VERSION}:{digest}"
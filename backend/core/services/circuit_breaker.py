@@ -0,0 +1,223 @@
+"""
+Disjoncteur par fournisseur d'API externe
+Fermé : appels normaux. Ouvert : appels refusés immédiatement (le cache sert la dernière
+copie connue). Semi-ouvert : un seul appel d'essai décide de la réouverture ou de la fermeture.
+État partagé entre workers via Redis, sinon par processus.
+"""
+
+import threading
+import time
+from typing import Dict
+import requests
+from django.conf import settings
+from .redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Durée de vie de l'état semi-ouvert si aucun appel d'essai ne conclut (secondes)
+_TRIPPED_TTL_SECONDS = 24 * 3600
+
+# Enregistre le résultat d'un appel ; retourne l'état résultant.
+# KEYS : fenêtre courante, ouverture, déclenchement, essai en cours
+# ARGV : échec (0/1), appels minimum, taux d'échec, durée d'ouverture (ms),
+#        durée de la fenêtre (ms), durée de vie du déclenchement (ms)
+_RECORD_SCRIPT = """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    if redis.call('EXISTS', KEYS[2]) == 1 then
+        return 'open'
+    end
+    redis.call('DEL', KEYS[4])
+    if ARGV[1] == '1' then
+        redis.call('SET', KEYS[2], '1', 'PX', ARGV[4])
+        return 'open'
+    end
+    redis.call('DEL', KEYS[3], KEYS[1])
+    return 'closed'
+end
+local calls = redis.call('HINCRBY', KEYS[1], 'calls', 1)
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', tonumber(ARGV[1]))
+redis.call('PEXPIRE', KEYS[1], ARGV[5])
+if calls >= tonumber(ARGV[2]) and failures / calls >= tonumber(ARGV[3]) then
+    redis.call('SET', KEYS[2], '1', 'PX', ARGV[4])
+    redis.call('SET', KEYS[3], '1', 'PX', ARGV[6])
+    redis.call('DEL', KEYS[1])
+    return 'open'
+end
+return 'closed'
+"""
+
+
+class CircuitOpen(requests.RequestException):
+    """Appel refusé : le fournisseur est considéré comme indisponible"""
+
+
+def _config() -> Dict:
+    return {
+        'window': getattr(settings, 'API_CIRCUIT_WINDOW_SECONDS', 60),
+        'min_calls': getattr(settings, 'API_CIRCUIT_MIN_CALLS', 5),
+        'failure_rate': getattr(settings, 'API_CIRCUIT_FAILURE_RATE', 0.5),
+        'slow_call': getattr(settings, 'API_CIRCUIT_SLOW_CALL_SECONDS', 3),
+        'open': getattr(settings, 'API_CIRCUIT_OPEN_SECONDS', 30),
+    }
+
+
+class _LocalCircuit:
+    """Disjoncteur du processus, utilisé sans Redis"""
+
+    def __init__(self):
+        self.window_id = None
+        self.calls = 0
+        self.failures = 0
+        self.open_until = 0.0
+        self.tripped = False
+        self.probing_until = 0.0
+        self.lock = threading.Lock()
+
+    def state(self) -> str:
+        if time.monotonic() < self.open_until:
+            return OPEN
+        return HALF_OPEN if self.tripped else CLOSED
+
+    def allow(self, config: Dict) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            state = self.state()
+            if state == OPEN:
+                return False
+            if state == HALF_OPEN:
+                if now < self.probing_until:
+                    return False
+                self.probing_until = now + config['open']
+            return True
+
+    def record(self, failed: bool, config: Dict) -> str:
+        with self.lock:
+            now = time.monotonic()
+            if self.tripped:
+                if now < self.open_until:
+                    return OPEN
+                self.probing_until = 0.0
+                if failed:
+                    self.open_until = now + config['open']
+                    return OPEN
+                self.tripped = False
+                self.window_id, self.calls, self.failures = None, 0, 0
+                return CLOSED
+
+            window_id = int(time.time() // config['window'])
+            if window_id != self.window_id:
+                self.window_id, self.calls, self.failures = window_id, 0, 0
+            self.calls += 1
+            self.failures += int(failed)
+            if self.calls >= config['min_calls'] and self.failures / self.calls >= config['failure_rate']:
+                self.open_until = now + config['open']
+                self.tripped = True
+                self.window_id, self.calls, self.failures = None, 0, 0
+                return OPEN
+            return CLOSED
+
+
+_local_circuits: Dict[str, _LocalCircuit] = {}
+_local_circuits_lock = threading.Lock()
+_providers = set()
+
+
+def _local_circuit(provider: str) -> _LocalCircuit:
+    circuit = _local_circuits.get(provider)
+    if circuit is None:
+        with _local_circuits_lock:
+            circuit = _local_circuits.setdefault(provider, _LocalCircuit())
+    return circuit
+
+
+def _keys(provider: str, config: Dict):
+    window_id = int(time.time() // config['window'])
+    return (
+        f"circuit:{provider}:window:{window_id}",
+        f"circuit:{provider}:open",
+        f"circuit:{provider}:tripped",
+        f"circuit:{provider}:probe",
+    )
+
+
+def before_call(provider: str) -> None:
+    """Lève CircuitOpen si le circuit de provider est ouvert, ou semi-ouvert avec un essai en cours"""
+    _providers.add(provider)
+    config = _config()
+    client = get_redis()
+    if client is not None:
+        try:
+            _, open_key, tripped_key, probe_key = _keys(provider, config)
+            is_open, is_tripped = client.exists(open_key), client.exists(tripped_key)
+            if is_open:
+                raise CircuitOpen(f"{provider} circuit is open")
+            # Semi-ouvert : un seul appel d'essai, tous workers confondus
+            if is_tripped and not client.set(probe_key, '1', nx=True, px=int(config['open'] * 1000)):
+                raise CircuitOpen(f"{provider} circuit is half-open, probe in progress")
+            return
+        except CircuitOpen:
+            raise
+        except Exception as e:
+            logger.warning(f"Redis circuit breaker unavailable for {provider}, using local state: {e}")
+    if not _local_circuit(provider).allow(config):
+        raise CircuitOpen(f"{provider} circuit is {_local_circuit(provider).state()}")
+
+
+def record(provider: str, failed: bool) -> None:
+    """Enregistre le résultat d'un appel à provider (échec : erreur réseau, 5xx ou appel lent)"""
+    config = _config()
+    state = None
+    client = get_redis()
+    if client is not None:
+        try:
+            state = client.eval(
+                _RECORD_SCRIPT, 4, *_keys(provider, config),
+                int(failed), config['min_calls'], config['failure_rate'],
+                int(config['open'] * 1000), int(config['window'] * 2000), _TRIPPED_TTL_SECONDS * 1000
+            )
+            if isinstance(state, bytes):
+                state = state.decode()
+        except Exception as e:
+            logger.warning(f"Redis circuit breaker unavailable for {provider}, using local state: {e}")
+    if state is None:
+        state = _local_circuit(provider).record(failed, config)
+    if failed and state == OPEN:
+        logger.warning(f"{provider} circuit open for {config['open']}s")
+
+
+def record_response(provider: str, status_code: int, elapsed: float) -> None:
+    """Résultat d'un appel ayant obtenu une réponse HTTP"""
+    record(provider, failed=status_code >= 500 or elapsed >= _config()['slow_call'])
+
+
+def state(provider: str) -> str:
+    client = get_redis()
+    if client is not None:
+        try:
+            _, open_key, tripped_key, _ = _keys(provider, _config())
+            if client.exists(open_key):
+                return OPEN
+            return HALF_OPEN if client.exists(tripped_key) else CLOSED
+        except Exception as e:
+            logger.warning(f"Redis circuit breaker unavailable for {provider}, using local state: {e}")
+    return _local_circuit(provider).state()
+
+
+def states() -> Dict[str, str]:
+    """État du circuit de chaque fournisseur configuré ou déjà appelé"""
+    providers = set(getattr(settings, 'API_RATE_LIMITS', {})) | _providers
+    return {provider: state(provider) for provider in sorted(providers)}
+
+
+def prometheus() -> str:
+    """Jauge api_circuit_state (1 pour l'état courant de chaque fournisseur)"""
+    lines = ['# TYPE api_circuit_state gauge']
+    for provider, current in states().items():
+        for name in (CLOSED, OPEN, HALF_OPEN):
+            lines.append(f'api_circuit_state{{provider="{provider}",state="{name}"}} {int(name == current)}')
+    return '\n'.join(lines) + '\n'
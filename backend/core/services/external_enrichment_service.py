@@ -3,11 +3,15 @@ Service d'enrichissement orchestrant toutes les APIs externes
 Gère l'intégration et l'enrichissement automatique des éléments de liste
 """
 
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from ..models import ListItem, ExternalReference, List as TasteList
 from .tmdb_service import TMDBService
 from .spotify_service import SpotifyService
 from .books_service import BooksService
+from .provider_cache import prefetch
+from .registry import get_service
+from .fan_out import run_parallel
+from . import rate_limit
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,54 +21,73 @@ class ExternalEnrichmentService:
     """Service orchestrateur pour l'enrichissement externe"""
     
     def __init__(self):
-        self.tmdb = TMDBService()
-        self.spotify = SpotifyService()
-        self.books = BooksService()
+        self.tmdb = get_service(TMDBService)
+        self.spotify = get_service(SpotifyService)
+        self.books = get_service(BooksService)
     
     def search_external(self, query: str, category: str = None, limit: int = 10) -> List[Dict]:
         """Recherche enrichie dans toutes les APIs externes pertinentes"""
-        results = []
-        
-        if not category or category == 'FILMS':
+        results, _ = self.search_external_with_missing(query, category, limit)
+        return results
+    
+    def search_external_with_missing(self, query: str, category: str = None, limit: int = 10,
+                                     timeout: float = None) -> Tuple[List[Dict], List[str]]:
+        """
+        Comme search_external, les APIs étant interrogées en parallèle avec une échéance.
+        Retourne aussi les catégories dont l'API n'a pas répondu à temps (ou a échoué).
+        """
+        def search_movies():
             # Rechercher dans TMDB pour les films
-            tmdb_movies = self.tmdb.search_movies(query, limit // 4 if category else limit // 3)
-            for movie in tmdb_movies:
-                movie['category'] = 'FILMS'
-                movie['category_display'] = 'Films'
-            results.extend(tmdb_movies)
+            if not category:
+                # Films et séries : un seul appel /search/multi, partagé avec search_shows
+                return self.tmdb.search_multi(query, limit // 3)['FILMS']
+            return self.tmdb.search_movies(query, limit // 4)
         
-        if not category or category == 'SERIES':
+        def search_shows():
             # Rechercher dans TMDB pour les séries
-            tmdb_shows = self.tmdb.search_tv_shows(query, limit // 4 if category else limit // 3)
-            for show in tmdb_shows:
-                show['category'] = 'SERIES'
-                show['category_display'] = 'Séries'
-            results.extend(tmdb_shows)
+            if not category:
+                return self.tmdb.search_multi(query, limit // 3)['SERIES']
+            return self.tmdb.search_tv_shows(query, limit // 4)
         
-        if not category or category == 'MUSIQUE':
+        def search_music():
             # Rechercher dans Spotify
-            spotify_results = self.spotify.search_music(query, limit // 2 if category else limit // 3)
-            for item in spotify_results:
-                item['category'] = 'MUSIQUE'
-                item['category_display'] = 'Musique'
-            results.extend(spotify_results)
+            return self.spotify.search_music(query, limit // 2 if category else limit // 3)
         
-        if not category or category == 'LIVRES':
+        def search_books():
             # Rechercher dans les APIs de livres
-            book_results = self.books.search_books(query, limit // 2 if category else limit // 3)
-            for book in book_results:
-                book['category'] = 'LIVRES'
-                book['category_display'] = 'Livres'
-            results.extend(book_results)
+            return self.books.search_books(query, limit // 2 if category else limit // 3)
+        
+        searches = [
+            ('FILMS', 'Films', search_movies),
+            ('SERIES', 'Séries', search_shows),
+            ('MUSIQUE', 'Musique', search_music),
+            ('LIVRES', 'Livres', search_books),
+        ]
+        searches = [search for search in searches if not category or category == search[0]]
+        
+        provider_results, missing = run_parallel(
+            [(search_category, search) for search_category, _, search in searches],
+            timeout=timeout
+        )
+        
+        results = []
+        for search_category, category_display, _ in searches:
+            for item in provider_results.get(search_category, []):
+                item['category'] = search_category
+                item['category_display'] = category_display
+                results.append(item)
         
         # Trier par popularité/pertinence et limiter
         results = sorted(results, key=lambda x: x.get('popularity', 0), reverse=True)
-        return results[:limit]
+        return results[:limit], missing
     
     def get_trending_content(self, category: str = None, limit: int = 20) -> List[Dict]:
         """Récupère le contenu tendance des APIs externes avec gestion d'erreur robuste"""
         results = []
         
+        # Une seule lecture du cache pour tous les appels ci-dessous
+        prefetch(self._trending_cache_keys(category, limit))
+        
         # Films via TMDB
         if not category or category == 'FILMS':
             try:
@@ -121,6 +144,21 @@ class ExternalEnrichmentService:
         
         return results[:limit]
     
+    def _trending_cache_keys(self, category: str = None, limit: int = 20) -> List[str]:
+        """Clés de cache utilisées par get_trending_content"""
+        keys = []
+        if not category or category == 'FILMS':
+            keys.append(self.tmdb.cache_key('/trending/movie/week'))
+        if not category or category == 'SERIES':
+            keys.append(self.tmdb.cache_key('/trending/tv/week'))
+        if not category or category == 'MUSIQUE':
+            music_limit = limit // 3 if category else limit // 6
+            keys.append(self.spotify.cache_key('/browse/new-releases', {'country': 'FR', 'limit': music_limit}))
+            keys.append(self.spotify.cache_key('/browse/featured-playlists', {'country': 'FR', 'limit': music_limit}))
+        if not category or category == 'LIVRES':
+            keys.extend(self.books.popular_books_cache_keys())
+        return keys
+    
     def get_similar_content(self, list_item: ListItem, limit: int = 10) -> List[Dict]:
         """Récupère du contenu similaire basé sur un élément existant"""
         try:
@@ -137,6 +175,7 @@ class ExternalEnrichmentService:
             category = list_item.list.category
             
             if source == 'tmdb':
+                # Similaires et recommandations proviennent du même appel groupé (voir TMDBService._get_title)
                 if category == 'FILMS':
                     similar = self.tmdb.get_similar_movies(int(external_id), limit)
                     recommendations = self.tmdb.get_recommendations_movies(int(external_id), limit)
@@ -163,6 +202,10 @@ class ExternalEnrichmentService:
             elif source == 'spotify':
                 # Pour Spotify, utiliser les artistes similaires ou les meilleurs titres
                 if external_ref.metadata.get('type') == 'artist':
+                    prefetch([
+                        self.spotify.cache_key(f'/artists/{external_id}/related-artists'),
+                        self.spotify.cache_key(f'/artists/{external_id}/top-tracks', {'country': 'FR'}),
+                    ])
                     similar = self.spotify.get_related_artists(external_id, limit)
                     top_tracks = self.spotify.get_artist_top_tracks(external_id, limit=5)
                 else:
@@ -204,6 +247,7 @@ class ExternalEnrichmentService:
             # Déterminer le service à utiliser selon la catégorie
             category = list_item.list.category
             
+            # Priorité de débit fixée par l'appelant (bulk_priority pour les tâches de fond)
             if category == 'FILMS':
                 return self._enrich_movie(list_item)
             elif category == 'SERIES':
@@ -220,6 +264,47 @@ class ExternalEnrichmentService:
             logger.error(f"Error enriching item {list_item.id}: {e}")
             return False
     
+    def refresh_list_items(self, list_items: List[ListItem], force_refresh: bool = False) -> int:
+        """
+        Actualise l'enrichissement de plusieurs éléments ; retourne le nombre d'éléments enrichis.
+        Les références Spotify existantes sont relues par appels groupés (/tracks?ids=...),
+        les autres éléments sont enrichis un par un.
+        """
+        by_type = {'track': {}, 'artist': {}, 'album': {}}
+        others = []
+        for list_item in list_items:
+            existing_ref = getattr(list_item, 'external_ref', None)
+            if existing_ref and not force_refresh and not existing_ref.needs_refresh():
+                continue
+            music_type = existing_ref.metadata.get('type') if existing_ref else None
+            if existing_ref and existing_ref.external_source == ExternalReference.Source.SPOTIFY and music_type in by_type:
+                by_type[music_type][existing_ref.external_id] = list_item
+            else:
+                others.append(list_item)
+        
+        enriched = 0
+        with rate_limit.bulk_priority():
+            fetchers = {
+                'track': self.spotify.get_tracks_details,
+                'artist': self.spotify.get_artists_details,
+                'album': self.spotify.get_albums_details,
+            }
+            for music_type, items in by_type.items():
+                if not items:
+                    continue
+                details = fetchers[music_type](list(items))
+                for external_id, list_item in items.items():
+                    if external_id in details:
+                        enriched += self._create_or_update_external_ref(
+                            list_item, details[external_id], ExternalReference.Source.SPOTIFY
+                        )
+                    else:
+                        others.append(list_item)
+            
+            for list_item in others:
+                enriched += self.enrich_list_item(list_item, force_refresh=True)
+        return enriched
+    
     def _enrich_movie(self, list_item: ListItem) -> bool:
         """Enrichit un film avec TMDB"""
         search_results = self.tmdb.search_movies(list_item.title, limit=1)
@@ -378,8 +463,9 @@ class ExternalEnrichmentService:
         
         return cleaned
     
-    def import_from_external_id(self, external_id: str, source: str, category: str, user) -> Optional[Dict]:
-        """Importe directement depuis un ID externe"""
+    def import_from_external_id(self, external_id: str, source: str, category: str, user,
+                                item_type: str = None) -> Optional[Dict]:
+        """Importe directement depuis un ID externe (item_type : type Spotify, si connu)"""
         try:
             # Récupérer les détails selon la source
             if source == 'tmdb':
@@ -390,10 +476,8 @@ class ExternalEnrichmentService:
                 else:
                     return None
             elif source == 'spotify':
-                # Détecter le type depuis l'ID ou essayer différents types
-                data = (self.spotify.get_track_details(external_id) or
-                       self.spotify.get_artist_details(external_id) or
-                       self.spotify.get_album_details(external_id))
+                # Type explicite, URI spotify:track:..., ou index des identifiants
+                data = self.spotify.get_details(external_id, item_type)
             elif source in ['openlibrary', 'google_books']:
                 data = self.books.get_book_details_by_isbn(external_id)
             else:
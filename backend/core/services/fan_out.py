@@ -0,0 +1,123 @@
+"""
+Exécution parallèle des appels aux APIs externes
+Pool de threads borné partagé par le processus, avec une échéance globale par appel groupé
+et une file d'attente bornée : au-delà, les appels sont abandonnés plutôt que mis en attente
+"""
+
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import close_old_connections
+from .provider_cache import FetchIncomplete, complete_or_raise
+import logging
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pid = os.getpid()
+
+# Tâches soumises au pool et pas encore démarrées
+_queued = 0
+_queued_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_lock, _pid, _queued, _queued_lock
+    # Les threads du pool ne survivent pas à un fork : en recréer un dans l'enfant
+    if os.getpid() != _pid:
+        _executor, _executor_lock, _pid = None, threading.Lock(), os.getpid()
+        _queued, _queued_lock = 0, threading.Lock()
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'API_FAN_OUT_MAX_WORKERS', 16),
+                    thread_name_prefix='api-fan-out',
+                )
+    return _executor
+
+
+def _reserve_slot() -> bool:
+    """Réserve une place dans la file d'attente du pool ; False si elle est pleine"""
+    global _queued
+    with _queued_lock:
+        if _queued >= getattr(settings, 'API_FAN_OUT_MAX_QUEUE', 16):
+            return False
+        _queued += 1
+        return True
+
+
+def _release_slot() -> None:
+    global _queued
+    with _queued_lock:
+        _queued -= 1
+
+
+def _run(task: Callable[[], Any]) -> Any:
+    _release_slot()
+    # Threads hors cycle requête/réponse : gérer nous-mêmes les connexions en base
+    close_old_connections()
+    try:
+        # En mode différé, une tâche dont des données manquent encore est en échec (manquante)
+        return complete_or_raise(task)
+    finally:
+        close_old_connections()
+
+
+def run_parallel(tasks: List[Tuple[str, Callable[[], Any]]],
+                 timeout: float = None) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Lance les tâches (nom, fonction) en parallèle et attend au plus timeout secondes.
+    Retourne ({nom: résultat}, [noms manquants]) ; une tâche en erreur ou pas terminée
+    à l'échéance est manquante (si elle a démarré, elle continue en arrière-plan et
+    alimente le cache ; sinon elle est annulée). Une tâche est aussi manquante,
+    sans être lancée, quand la file d'attente du pool est pleine.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'API_FAN_OUT_TIMEOUT_SECONDS', 5)
+
+    started = time.monotonic()
+    executor = _get_executor()
+    futures = {}
+    for name, task in tasks:
+        if not _reserve_slot():
+            logger.warning(f"Fan-out queue full, task {name} shed")
+            continue
+        # Chaque tâche hérite du contexte de l'appelant (ex: mode différé, voir async_fetch)
+        futures[name] = executor.submit(contextvars.copy_context().run, _run, task)
+    wait(futures.values(), timeout=timeout)
+
+    results, missing = {}, []
+    for name, _ in tasks:
+        future = futures.get(name)
+        if future is None:
+            missing.append(name)
+            continue
+        if not future.done():
+            if future.cancel():
+                # Jamais démarrée : libérer sa place pour les requêtes suivantes
+                _release_slot()
+                logger.warning(f"Fan-out task {name} not started before the {timeout}s deadline, cancelled")
+            else:
+                logger.warning(f"Fan-out task {name} missed the {timeout}s deadline")
+            missing.append(name)
+            continue
+        error = future.exception()
+        if isinstance(error, FetchIncomplete):
+            logger.debug(f"Fan-out task {name} incomplete, waiting on {error}")
+            missing.append(name)
+            continue
+        if error is not None:
+            logger.error(f"Fan-out task {name} failed: {error}")
+            missing.append(name)
+            continue
+        results[name] = future.result()
+
+    logger.debug(f"Fan-out of {len(tasks)} tasks done in {time.monotonic() - started:.3f}s")
+    return results, missing
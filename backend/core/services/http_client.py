@@ -0,0 +1,102 @@
+"""
+Transport HTTP partagé vers les APIs externes
+Une Session keep-alive par hôte et par processus, pour réutiliser les connexions TCP/TLS
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Tuple
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from . import circuit_breaker, rate_limit
+from .provider_cache import NotModified, response_validators
+from .redis_client import reset_redis
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+_pid = os.getpid()
+
+
+def get_session(url: str) -> requests.Session:
+    """Session réutilisable pour l'hôte de url (créée à la première utilisation dans le processus)"""
+    host = urlsplit(url).netloc
+
+    # Filet de sécurité si le fork n'a pas été intercepté (voir _after_fork)
+    if os.getpid() != _pid:
+        _after_fork()
+
+    session = _sessions.get(host)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(host)
+            if session is None:
+                session = _build_session()
+                _sessions[host] = session
+    return session
+
+
+def get_json(url: str, params: Dict = None, headers: Dict = None, provider: str = None,
+             timeout: float = 10) -> Tuple[Any, Dict]:
+    """
+    GET vers une API externe : retourne (données JSON, validateurs) ou lève NotModified sur un 304.
+    Avec provider, l'appel passe par son disjoncteur et respecte sa limite de débit
+    (voir circuit_breaker et rate_limit) ; une réponse 429 lève RateLimited.
+    """
+    if provider:
+        # Jeton de débit d'abord : un appel abandonné faute de jeton ne doit pas occuper
+        # l'appel d'essai d'un disjoncteur semi-ouvert
+        rate_limit.acquire(provider)
+        circuit_breaker.before_call(provider)
+    started = time.monotonic()
+    try:
+        response = get_session(url).get(url, params=params, headers=headers, timeout=timeout)
+    except requests.RequestException:
+        if provider:
+            circuit_breaker.record(provider, failed=True)
+        raise
+    if provider:
+        circuit_breaker.record_response(provider, response.status_code, time.monotonic() - started)
+        rate_limit.observe(provider, response.status_code, response.headers)
+    if response.status_code == 429:
+        # Fournisseur suspendu par observe() : traité comme un jeton refusé, pas comme une erreur
+        raise rate_limit.RateLimited(f"{provider or url} returned 429")
+    if response.status_code == 304:
+        raise NotModified()
+    response.raise_for_status()
+    return response.json(), response_validators(response)
+
+
+def _build_session() -> requests.Session:
+    pool_size = getattr(settings, 'API_HTTP_POOL_MAXSIZE', 20)
+    adapter = HTTPAdapter(
+        pool_connections=1,  # un seul hôte par session
+        pool_maxsize=pool_size,
+        pool_block=False,  # au-delà, connexions supplémentaires non conservées
+        max_retries=0,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def reset_sessions() -> None:
+    """Abandonne les sessions du processus (leurs sockets appartiennent au processus parent)"""
+    global _pid, _sessions_lock
+    # Le verrou a pu être copié verrouillé par le fork
+    _sessions_lock = threading.Lock()
+    _sessions.clear()
+    _pid = os.getpid()
+
+
+def _after_fork() -> None:
+    """Connexions héritées du parent (gunicorn --preload) : ne pas les partager avec lui"""
+    reset_sessions()
+    reset_redis()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -0,0 +1,105 @@
+"""
+Cache mémoire local (par worker) placé devant la table APICache
+Évite un aller-retour en base pour les clés les plus sollicitées
+Les données sont conservées sérialisées : chaque lecture retourne une copie indépendante
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from django.utils import timezone
+
+
+class LocalLRUCache:
+    """Cache LRU borné en nombre d'entrées et en octets, respectant expires_at"""
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 16 * 1024 * 1024, max_ttl_seconds: int = 600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_ttl_seconds = max_ttl_seconds
+        self._entries = OrderedDict()  # cache_key -> (JSON sérialisé, expires_at, local_deadline, size)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, cache_key: str) -> Optional[Any]:
+        """
+        Retourne les données si présentes et non expirées, sinon None. Une entrée
+        périmée n'est jamais servie d'ici : le backend partagé fait alors foi.
+        """
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+
+            raw, _, local_deadline, _ = entry
+            if timezone.now() > local_deadline:
+                self._remove(cache_key)
+                return None
+
+            self._entries.move_to_end(cache_key)
+        # Désérialisé à chaque lecture : modifier le résultat n'altère pas le cache
+        return json.loads(raw)
+
+    def set(self, cache_key: str, data: Any, expires_at: datetime) -> None:
+        """
+        Ajoute une entrée encore valide (une entrée expirée est ignorée);
+        la durée de vie locale est plafonnée par max_ttl_seconds
+        """
+        if self.max_entries <= 0:
+            return
+
+        now = timezone.now()
+        if now >= expires_at:
+            self.delete(cache_key)
+            return
+
+        try:
+            raw = json.dumps(data, separators=(',', ':'))
+        except (TypeError, ValueError):
+            # Non sérialisable : la base reste la source
+            self.delete(cache_key)
+            return
+
+        size = len(raw)
+        if size > self.max_bytes:
+            # Trop gros pour le tier local, la base reste la source
+            self.delete(cache_key)
+            return
+
+        local_deadline = min(expires_at, now + timedelta(seconds=self.max_ttl_seconds))
+
+        with self._lock:
+            self._remove(cache_key)
+            self._entries[cache_key] = (raw, expires_at, local_deadline, size)
+            self._size += size
+            self._evict()
+
+    def delete(self, cache_key: str) -> None:
+        with self._lock:
+            self._remove(cache_key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def _remove(self, cache_key: str) -> None:
+        entry = self._entries.pop(cache_key, None)
+        if entry is not None:
+            self._size -= entry[3]
+
+    def _evict(self) -> None:
+        """Évince les entrées les moins récemment utilisées jusqu'à respecter les budgets"""
+        while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+            _, (_, _, _, size) = self._entries.popitem(last=False)
+            self._size -= size
@@ -0,0 +1,159 @@
+"""
+Métriques du cache des APIs externes, par fournisseur et modèle d'endpoint
+Compteurs (hit, stale, miss, erreurs...) et histogrammes de latence, en mémoire du processus
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Optional, Tuple
+
+# (fournisseur, modèle d'endpoint), ex: ('tmdb', '/movie/{id}')
+Labels = Tuple[str, str]
+
+HIT = 'hit'
+STALE = 'stale'
+MISS = 'miss'
+NOT_MODIFIED = 'not_modified'
+UPSTREAM_ERROR = 'upstream_error'
+# Appel non effectué : limite de débit du fournisseur atteinte
+RATE_LIMITED = 'rate_limited'
+# Appel refusé : disjoncteur du fournisseur ouvert
+CIRCUIT_OPEN = 'circuit_open'
+
+# Bornes supérieures des classes de latence (secondes)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Nombre de clés suivies pour le classement des clés les plus demandées
+HOT_KEYS_MAX = 1000
+
+# Segment de chemin identifiant une ressource : numérique (TMDB) ou identifiant
+# opaque en casse mixte (Spotify, Google Books)
+_NUMERIC_ID = re.compile(r'^\d+$')
+_OPAQUE_ID = re.compile(r'^(?=.*[A-Z0-9])[A-Za-z0-9_-]{12,}$')
+
+
+def endpoint_template(path: str) -> str:
+    """Chemin sans identifiants : /movie/550/similar -> /movie/{id}/similar"""
+    segments = []
+    for segment in path.split('?', 1)[0].split('/'):
+        if _NUMERIC_ID.match(segment) or _OPAQUE_ID.match(segment):
+            segment = '{id}'
+        segments.append(segment)
+    return '/'.join(segments)
+
+
+def labels(provider: str, path: str) -> Labels:
+    return provider, endpoint_template(path)
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = len(LATENCY_BUCKETS)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                index = i
+                break
+        self.buckets[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+class MetricsRegistry:
+    """Registre thread-safe ; chaque worker tient le sien"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters: Dict[Labels, Counter] = defaultdict(Counter)
+            self._latency: Dict[Labels, _Histogram] = defaultdict(_Histogram)
+            self._hot_keys: Counter = Counter()
+            self._started_at = time.time()
+
+    def incr(self, labels: Optional[Labels], event: str, cache_key: str = None) -> None:
+        if labels is None:
+            return
+        with self._lock:
+            self._counters[labels][event] += 1
+            if cache_key is not None:
+                self._track_key(labels, cache_key)
+
+    def observe_latency(self, labels: Optional[Labels], seconds: float) -> None:
+        if labels is None:
+            return
+        with self._lock:
+            self._latency[labels].observe(seconds)
+
+    def _track_key(self, labels: Labels, cache_key: str) -> None:
+        self._hot_keys[(labels, cache_key)] += 1
+        # Borne la mémoire : on ne garde que la moitié la plus demandée
+        if len(self._hot_keys) > HOT_KEYS_MAX:
+            self._hot_keys = Counter(dict(self._hot_keys.most_common(HOT_KEYS_MAX // 2)))
+
+    def snapshot(self, hot_keys: int = 20) -> Dict:
+        """État courant sous forme sérialisable en JSON"""
+        with self._lock:
+            endpoints = []
+            for provider, template in sorted(set(self._counters) | set(self._latency)):
+                counters = self._counters.get((provider, template), Counter())
+                histogram = self._latency.get((provider, template))
+                lookups = counters[HIT] + counters[STALE] + counters[MISS]
+                entry = {
+                    'provider': provider,
+                    'endpoint': template,
+                    'counters': {event: counters[event] for event in (HIT, STALE, MISS, NOT_MODIFIED, UPSTREAM_ERROR, RATE_LIMITED, CIRCUIT_OPEN)},
+                    'hit_ratio': round((counters[HIT] + counters[STALE]) / lookups, 4) if lookups else None,
+                }
+                if histogram is not None:
+                    entry['upstream_latency'] = {
+                        'count': histogram.count,
+                        'sum': round(histogram.sum, 6),
+                        'buckets': dict(zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], histogram.buckets)),
+                    }
+                endpoints.append(entry)
+
+            return {
+                'pid': os.getpid(),
+                'since': self._started_at,
+                'endpoints': endpoints,
+                'hot_keys': [
+                    {'provider': provider, 'endpoint': template, 'cache_key': cache_key, 'count': count}
+                    for ((provider, template), cache_key), count in self._hot_keys.most_common(hot_keys)
+                ],
+            }
+
+    def prometheus(self) -> str:
+        """Format texte d'exposition Prometheus"""
+        with self._lock:
+            lines = [
+                '# TYPE api_cache_events_total counter',
+            ]
+            for (provider, template), counters in sorted(self._counters.items()):
+                for event, value in sorted(counters.items()):
+                    lines.append(
+                        f'api_cache_events_total{{provider="{provider}",endpoint="{template}",event="{event}"}} {value}'
+                    )
+
+            lines.append('# TYPE api_upstream_latency_seconds histogram')
+            for (provider, template), histogram in sorted(self._latency.items()):
+                label = f'provider="{provider}",endpoint="{template}"'
+                cumulative = 0
+                for bound, count in zip([str(b) for b in LATENCY_BUCKETS] + ['+Inf'], histogram.buckets):
+                    cumulative += count
+                    lines.append(f'api_upstream_latency_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'api_upstream_latency_seconds_sum{{{label}}} {histogram.sum}')
+                lines.append(f'api_upstream_latency_seconds_count{{{label}}} {histogram.count}')
+            return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,358 @@
+"""
+Accès au cache partagé par les services d'APIs externes (TMDB, Spotify, Google Books)
+Gère le mode stale-while-revalidate, le cache négatif, la revalidation conditionnelle
+(ETag / Last-Modified) et le rafraîchissement en arrière-plan
+"""
+
+import threading
+import time
+import requests
+from asgiref.sync import sync_to_async
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Set, Tuple
+from django.db import close_old_connections, connections
+from ..models import APICache
+from . import circuit_breaker, metrics, rate_limit, single_flight
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Clés en cours de rafraîchissement dans ce processus
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+class NotModified(Exception):
+    """L'API a répondu 304 : la copie en cache est toujours valide"""
+
+
+class FetchDeferred(Exception):
+    """Absent du cache en mode différé : l'appel sera fait de façon asynchrone (voir async_fetch)"""
+
+
+class FetchIncomplete(Exception):
+    """Mode différé : des données demandées n'ont pas été obtenues avant l'échéance"""
+
+
+class DeferredFetch(NamedTuple):
+    cache_key: str
+    async_fetcher: Callable[[Optional[Dict]], Awaitable[Tuple[Any, Dict]]]
+    validators: Optional[Dict]
+    ttl_hours: float
+    is_empty: Optional[Callable[[Any], bool]]
+    negative_ttl_hours: Optional[float]
+    metric_labels: Optional[metrics.Labels]
+
+
+class DeferredFetchContext:
+    """Appels relevés pendant une exécution en mode différé, et clés déjà tentées"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pending: Dict[str, DeferredFetch] = {}
+        self.attempted: Set[str] = set()
+
+    def defer(self, fetch: DeferredFetch) -> None:
+        with self._lock:
+            if fetch.cache_key not in self.attempted:
+                self.pending[fetch.cache_key] = fetch
+
+    def take_pending(self) -> Dict[str, DeferredFetch]:
+        with self._lock:
+            pending, self.pending = self.pending, {}
+            self.attempted.update(pending)
+        return pending
+
+
+# Actif pendant l'exécution du code synchrone d'une vue asynchrone : une absence
+# dans le cache est relevée au lieu de bloquer le thread sur l'appel HTTP
+deferred_fetches: ContextVar[Optional[DeferredFetchContext]] = ContextVar('deferred_fetches', default=None)
+
+# Clés restées sans données pendant la tâche courante en mode différé (voir complete_or_raise)
+_incomplete_fetches: ContextVar[Optional[Set[str]]] = ContextVar('incomplete_fetches', default=None)
+
+
+def complete_or_raise(task: Callable[[], Any]) -> Any:
+    """
+    Exécute task ; en mode différé, lève FetchIncomplete si une des clés qu'elle a lues
+    est restée sans données (appel relevé ou pas encore abouti) : son résultat est partiel.
+    """
+    if deferred_fetches.get() is None:
+        return task()
+
+    incomplete = set()
+    token = _incomplete_fetches.set(incomplete)
+    try:
+        result = task()
+    finally:
+        _incomplete_fetches.reset(token)
+    if incomplete:
+        raise FetchIncomplete(', '.join(sorted(incomplete)))
+    return result
+
+
+def _mark_incomplete(cache_key: str) -> None:
+    incomplete = _incomplete_fetches.get()
+    if incomplete is not None:
+        incomplete.add(cache_key)
+
+
+def conditional_headers(validators: Optional[Dict] = None) -> Dict:
+    """En-têtes If-None-Match / If-Modified-Since à partir des validateurs mémorisés"""
+    headers = {}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+    return headers
+
+
+def response_validators(response) -> Dict:
+    """Validateurs (ETag / Last-Modified) renvoyés par l'API, s'il y en a"""
+    validators = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    return {name: value for name, value in validators.items() if value}
+
+
+def cached_fetch(cache_key: str, fetcher: Callable[[Optional[Dict]], Tuple[Any, Dict]], ttl_hours: float,
+                 stale_grace_hours: float = 0,
+                 is_empty: Callable[[Any], bool] = None,
+                 negative_ttl_hours: float = None,
+                 metric_labels: metrics.Labels = None,
+                 async_fetcher: Callable[[Optional[Dict]], Awaitable[Tuple[Any, Dict]]] = None) -> Optional[Any]:
+    """
+    Retourne les données en cache ou appelle fetcher(validators) puis met en cache.
+    fetcher retourne (données, validateurs) ou lève NotModified quand l'API
+    répond 304 aux validateurs transmis ; seule l'expiration est alors repoussée.
+    Avec stale_grace_hours > 0, une entrée expirée depuis moins de ce délai est
+    servie immédiatement et un unique rafraîchissement est lancé en arrière-plan.
+    En cas d'absence, un seul appelant (processus et workers confondus) interroge
+    l'API, les autres attendent son résultat (voir single_flight).
+    Une réponse 404 ou jugée vide par is_empty() est mémorisée comme entrée
+    négative (TTL court) et retournée sous la forme None.
+    Les autres exceptions levées par fetcher() sont propagées à l'appelant ; si le
+    disjoncteur du fournisseur est ouvert, la dernière copie connue est retournée.
+    metric_labels (fournisseur, modèle d'endpoint) active l'instrumentation (voir metrics).
+    En mode différé (deferred_fetches), une absence lève FetchDeferred après avoir
+    relevé l'appel à faire avec async_fetcher, l'équivalent asynchrone de fetcher.
+    """
+    # Validateurs lus avec l'entrée elle-même : pas de lecture supplémentaire avant l'appel
+    cached_data, is_stale, validators = APICache.lookup(cache_key, stale_grace_hours)
+
+    def fetch_and_store():
+        return _fetch_and_store(cache_key, fetcher, validators, ttl_hours, is_empty, negative_ttl_hours, metric_labels)
+
+    deferred = deferred_fetches.get()
+    # Une clé obtenue lors d'un tour précédent du mode différé a déjà été comptée
+    counted = deferred is None or cache_key not in deferred.attempted
+
+    if cached_data is not None:
+        if counted:
+            metrics.registry.incr(metric_labels, metrics.STALE if is_stale else metrics.HIT, cache_key)
+        if is_stale:
+            schedule_refresh(cache_key, fetch_and_store)
+        return None if cached_data is APICache.NEGATIVE else cached_data
+
+    if counted:
+        metrics.registry.incr(metric_labels, metrics.MISS, cache_key)
+
+    if deferred is not None and async_fetcher is not None:
+        if cache_key in deferred.attempted:
+            # L'appel asynchrone a échoué ou n'a pas abouti : dernière copie connue, s'il y en a une
+            data = last_known_data(cache_key)
+            if data is None:
+                _mark_incomplete(cache_key)
+            return data
+        deferred.defer(DeferredFetch(
+            cache_key, async_fetcher, validators, ttl_hours, is_empty, negative_ttl_hours, metric_labels
+        ))
+        _mark_incomplete(cache_key)
+        raise FetchDeferred(cache_key)
+
+    try:
+        data = single_flight.do(
+            cache_key,
+            fetch_and_store,
+            # Résultat déposé par le worker qui détenait le verrou
+            recheck=lambda: APICache.get_shared_data(cache_key)
+        )
+    except circuit_breaker.CircuitOpen:
+        # Fournisseur indisponible : dernière copie connue plutôt qu'une erreur
+        data = last_known_data(cache_key)
+        if data is None:
+            raise
+    return None if data is APICache.NEGATIVE else data
+
+
+def last_known_data(cache_key: str) -> Optional[Any]:
+    """Copie en cache même expirée (dans la limite de conservation des entrées périmées)"""
+    max_grace_hours = APICache.stale_max_grace().total_seconds() / 3600
+    data, _ = APICache.get_cached_data_or_stale(cache_key, max_grace_hours)
+    return None if data is APICache.NEGATIVE else data
+
+
+def prefetch(cache_keys) -> None:
+    """
+    Charge plusieurs clés en une seule requête dans le tier mémoire, pour que les
+    appels suivants à cached_fetch() n'interrogent plus la base une par une.
+    """
+    try:
+        APICache.get_many(cache_keys)
+    except Exception as e:
+        logger.warning(f"Cache prefetch failed: {e}")
+
+
+def _fetch_and_store(cache_key: str, fetcher: Callable[[Optional[Dict]], Tuple[Any, Dict]],
+                     validators: Optional[Dict], ttl_hours: float,
+                     is_empty: Callable[[Any], bool] = None,
+                     negative_ttl_hours: float = None,
+                     metric_labels: metrics.Labels = None) -> Any:
+    """
+    Appelle l'API et met le résultat en cache (APICache.NEGATIVE si vide ou 404).
+    Avec les validateurs de la copie existante, la requête est conditionnelle
+    et un 304 ne fait que prolonger l'entrée existante.
+    """
+    try:
+        try:
+            data, new_validators = _timed(fetcher, validators, metric_labels)
+        except NotModified:
+            data = _revalidated(cache_key, ttl_hours, metric_labels)
+            if data is not None:
+                return data
+            # La copie a disparu entre-temps : nouvelle requête sans condition
+            data, new_validators = _timed(fetcher, None, metric_labels)
+    except Exception as e:
+        return _fetch_failed(e, cache_key, negative_ttl_hours, metric_labels)
+
+    return _store_response(cache_key, data, new_validators, ttl_hours, is_empty, negative_ttl_hours)
+
+
+def _revalidated(cache_key: str, ttl_hours: float, metric_labels: metrics.Labels = None) -> Optional[Any]:
+    """Réponse 304 : prolonge la copie en cache (et ses validateurs) et la retourne (None si elle a disparu)"""
+    metrics.registry.incr(metric_labels, metrics.NOT_MODIFIED)
+    return APICache.touch(cache_key, ttl_hours=ttl_hours)
+
+
+def _fetch_failed(error: Exception, cache_key: str, negative_ttl_hours: float = None,
+                  metric_labels: metrics.Labels = None) -> Any:
+    """Une 404 devient une entrée négative, les autres erreurs sont comptées et propagées"""
+    if isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code == 404:
+        APICache.set_negative(cache_key, negative_ttl_hours)
+        return APICache.NEGATIVE
+    if isinstance(error, rate_limit.RateLimited):
+        metrics.registry.incr(metric_labels, metrics.RATE_LIMITED)
+    elif isinstance(error, circuit_breaker.CircuitOpen):
+        metrics.registry.incr(metric_labels, metrics.CIRCUIT_OPEN)
+    else:
+        metrics.registry.incr(metric_labels, metrics.UPSTREAM_ERROR)
+    raise error
+
+
+def _store_response(cache_key: str, data: Any, validators: Optional[Dict], ttl_hours: float,
+                    is_empty: Callable[[Any], bool] = None,
+                    negative_ttl_hours: float = None) -> Any:
+    if (is_empty or _is_empty)(data):
+        APICache.set_negative(cache_key, negative_ttl_hours)
+        return APICache.NEGATIVE
+
+    APICache.set_cached_data(cache_key, data, ttl_hours=ttl_hours, validators=validators)
+    return data
+
+
+def _timed(fetcher: Callable[[Optional[Dict]], Tuple[Any, Dict]], validators: Optional[Dict],
+           metric_labels: metrics.Labels = None) -> Tuple[Any, Dict]:
+    """Appelle fetcher en mesurant la latence de l'API (réponse 304 et erreurs comprises)"""
+    started = time.monotonic()
+    try:
+        return fetcher(validators)
+    finally:
+        metrics.registry.observe_latency(metric_labels, time.monotonic() - started)
+
+
+def _database(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Accès au cache depuis un thread hors cycle requête/réponse"""
+    def run(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def afetch_and_store(fetch: DeferredFetch) -> Optional[Any]:
+    """
+    Équivalent asynchrone de _fetch_and_store pour un appel relevé en mode différé.
+    Exécuté dans une tâche sans appelant pour recevoir les erreurs : elles sont journalisées.
+    """
+    try:
+        try:
+            try:
+                data, new_validators = await _atimed(fetch, fetch.validators)
+            except NotModified:
+                data = await _database(_revalidated)(fetch.cache_key, fetch.ttl_hours, fetch.metric_labels)
+                if data is not None:
+                    return data
+                data, new_validators = await _atimed(fetch, None)
+        except Exception as e:
+            return await _database(_fetch_failed)(e, fetch.cache_key, fetch.negative_ttl_hours, fetch.metric_labels)
+
+        return await _database(_store_response)(
+            fetch.cache_key, data, new_validators, fetch.ttl_hours, fetch.is_empty, fetch.negative_ttl_hours
+        )
+    except Exception as e:
+        logger.warning(f"Async fetch failed for {fetch.cache_key}: {e}")
+        return None
+
+
+async def _atimed(fetch: DeferredFetch, validators: Optional[Dict]) -> Tuple[Any, Dict]:
+    started = time.monotonic()
+    try:
+        return await fetch.async_fetcher(validators)
+    finally:
+        metrics.registry.observe_latency(fetch.metric_labels, time.monotonic() - started)
+
+
+def _is_empty(data: Any) -> bool:
+    return not data
+
+
+def schedule_refresh(cache_key: str, fetch_and_store: Callable[[], Any]) -> bool:
+    """Lance un rafraîchissement en arrière-plan, sauf s'il y en a déjà un pour cette clé"""
+    with _refreshing_lock:
+        if cache_key in _refreshing:
+            return False
+        _refreshing.add(cache_key)
+
+    thread = threading.Thread(
+        target=_refresh,
+        args=(cache_key, fetch_and_store),
+        name=f"cache-refresh-{cache_key}",
+        daemon=True,
+    )
+    thread.start()
+    return True
+
+
+def _refresh(cache_key: str, fetch_and_store: Callable[[], Any]) -> None:
+    try:
+        # Rafraîchissement de fond : laisser la réserve de débit aux requêtes interactives
+        # (priorité fixée avant le verrou, dont la durée couvre alors l'attente d'un jeton)
+        with rate_limit.bulk_priority(), single_flight.distributed_lock(cache_key) as acquired:
+            # Un autre worker rafraîchit déjà cette clé
+            if not acquired:
+                return
+            # Déjà rafraîchie par un autre worker avant l'obtention du verrou
+            if not APICache.is_expired(cache_key):
+                return
+            fetch_and_store()
+    except Exception as e:
+        logger.warning(f"Background refresh failed for {cache_key}: {e}")
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(cache_key)
+        # Le thread ouvre ses propres connexions, les libérer
+        connections.close_all()
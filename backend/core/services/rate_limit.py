@@ -0,0 +1,219 @@
+"""
+Limitation du débit des appels aux APIs externes, par fournisseur
+Seau à jetons partagé entre workers (Redis, sinon par processus), respect des Retry-After
+reçus avec les réponses 429 et réserve de jetons pour les requêtes interactives
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+
+# Priorité des appels du contexte courant (voir bulk_priority)
+_priority: ContextVar[str] = ContextVar('api_rate_limit_priority', default=INTERACTIVE)
+
+# Retourne 0 si un jeton a été pris, sinon l'attente en millisecondes.
+# KEYS[1] : seau (jetons, horodatage), KEYS[2] : blocage posé par un Retry-After
+# ARGV : capacité, jetons par milliseconde, jetons à laisser dans le seau
+_TAKE_SCRIPT = """
+local blocked = redis.call('PTTL', KEYS[2])
+if blocked > 0 then
+    return blocked
+end
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 + reserve then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 + reserve - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate) + 1000)
+return wait
+"""
+
+
+class RateLimited(requests.RequestException):
+    """Appel non effectué : quota du fournisseur atteint au-delà de l'attente autorisée"""
+
+
+class _LocalBucket:
+    """Seau à jetons du processus, utilisé sans Redis"""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def take(self, reserve: float) -> float:
+        with self.lock:
+            now = time.monotonic()
+            if self.blocked_until > now:
+                return self.blocked_until - now
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1 + reserve:
+                self.tokens -= 1
+                return 0.0
+            return (1 + reserve - self.tokens) / self.rate
+
+    def block(self, seconds: float) -> None:
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+_local_buckets: Dict[str, _LocalBucket] = {}
+_local_buckets_lock = threading.Lock()
+
+
+def _limit(provider: str) -> Optional[Dict]:
+    return getattr(settings, 'API_RATE_LIMITS', {}).get(provider)
+
+
+def _bucket_key(provider: str) -> str:
+    return f"ratelimit:{provider}:bucket"
+
+
+def _blocked_key(provider: str) -> str:
+    return f"ratelimit:{provider}:blocked"
+
+
+def _local_bucket(provider: str, limit: Dict) -> _LocalBucket:
+    bucket = _local_buckets.get(provider)
+    if bucket is None:
+        with _local_buckets_lock:
+            bucket = _local_buckets.setdefault(provider, _LocalBucket(limit['burst'], limit['rate']))
+    return bucket
+
+
+def _take(provider: str, limit: Dict, reserve: float) -> float:
+    """Prend un jeton ; retourne 0 ou l'attente (secondes) avant qu'un jeton soit disponible"""
+    client = get_redis()
+    if client is not None:
+        try:
+            wait_ms = client.eval(
+                _TAKE_SCRIPT, 2, _bucket_key(provider), _blocked_key(provider),
+                limit['burst'], limit['rate'] / 1000, reserve
+            )
+            return int(wait_ms) / 1000
+        except Exception as e:
+            logger.warning(f"Redis rate limiter unavailable for {provider}, using local bucket: {e}")
+    return _local_bucket(provider, limit).take(reserve)
+
+
+def max_wait_seconds() -> float:
+    """Attente maximale d'un jeton pour un appel de la priorité courante"""
+    if _priority.get() == BULK:
+        return getattr(settings, 'API_RATE_LIMIT_BULK_MAX_WAIT_SECONDS', 30)
+    return getattr(settings, 'API_RATE_LIMIT_MAX_WAIT_SECONDS', 1)
+
+
+def _reserve_and_max_wait(limit: Dict):
+    """Les appels de masse laissent une part du seau aux requêtes interactives"""
+    reserve = 0
+    if _priority.get() == BULK:
+        reserve = limit['burst'] * getattr(settings, 'API_RATE_LIMIT_BULK_RESERVE', 0.3)
+    return reserve, max_wait_seconds()
+
+
+def acquire(provider: str) -> None:
+    """Attend un jeton pour appeler provider, ou lève RateLimited si l'attente dépasse le maximum"""
+    limit = _limit(provider)
+    if limit is None:
+        return
+    reserve, max_wait = _reserve_and_max_wait(limit)
+    deadline = time.monotonic() + max_wait
+    while True:
+        wait = _take(provider, limit, reserve)
+        if wait <= 0:
+            return
+        if time.monotonic() + wait > deadline:
+            raise RateLimited(f"{provider} rate limit reached, retry in {wait:.2f}s")
+        time.sleep(wait)
+
+
+async def aacquire(provider: str) -> None:
+    """Équivalent asynchrone de acquire()"""
+    import asyncio
+    limit = _limit(provider)
+    if limit is None:
+        return
+    reserve, max_wait = _reserve_and_max_wait(limit)
+    deadline = time.monotonic() + max_wait
+    take = sync_to_async(_take, thread_sensitive=False) if get_redis() is not None else _take_now
+    while True:
+        wait = await take(provider, limit, reserve)
+        if wait <= 0:
+            return
+        if time.monotonic() + wait > deadline:
+            raise RateLimited(f"{provider} rate limit reached, retry in {wait:.2f}s")
+        await asyncio.sleep(wait)
+
+
+async def _take_now(provider: str, limit: Dict, reserve: float) -> float:
+    return _take(provider, limit, reserve)
+
+
+def observe(provider: str, status_code: int, headers) -> None:
+    """Sur une réponse 429, suspend les appels à provider pendant la durée de Retry-After"""
+    if status_code != 429:
+        return
+    seconds = retry_after_seconds(headers.get('Retry-After'))
+    logger.warning(f"{provider} returned 429, pausing calls for {seconds:.1f}s")
+    client = get_redis()
+    if client is not None:
+        try:
+            client.set(_blocked_key(provider), '1', px=max(1, int(seconds * 1000)))
+            return
+        except Exception as e:
+            logger.warning(f"Redis rate limiter unavailable for {provider}, using local bucket: {e}")
+    limit = _limit(provider)
+    if limit is not None:
+        _local_bucket(provider, limit).block(seconds)
+
+
+def retry_after_seconds(value: Optional[str], default: float = 1.0) -> float:
+    """Valeur de Retry-After : nombre de secondes ou date HTTP"""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+@contextmanager
+def bulk_priority():
+    """Appels de masse (enrichissement, rafraîchissements) : ne consomment pas la réserve interactive"""
+    token = _priority.set(BULK)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
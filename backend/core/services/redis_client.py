@@ -0,0 +1,44 @@
+"""
+Client Redis partagé (optionnel)
+Retourne None si REDIS_URL n'est pas configuré; les appelants gèrent les erreurs de connexion
+"""
+
+import threading
+from django.conf import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_redis():
+    """Retourne un client Redis partagé par le processus, ou None"""
+    global _client
+
+    redis_url = getattr(settings, 'REDIS_URL', None)
+    if not redis_url:
+        return None
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    import redis
+                    _client = redis.Redis.from_url(
+                        redis_url,
+                        socket_timeout=1,
+                        socket_connect_timeout=1,
+                    )
+                except Exception as e:
+                    logger.warning(f"Redis unavailable ({redis_url}): {e}")
+                    return None
+    return _client
+
+
+def reset_redis() -> None:
+    """Oublie le client courant (ex: après un fork)"""
+    global _client
+    with _client_lock:
+        _client = None
@@ -0,0 +1,31 @@
+"""
+Instances de services partagées par le processus
+Les services d'APIs externes n'ont pas d'état par requête : une instance par worker suffit
+"""
+
+import threading
+from typing import Dict, Type, TypeVar
+
+T = TypeVar('T')
+
+_instances: Dict[type, object] = {}
+# Réentrant : un service peut obtenir ses dépendances pendant sa construction
+_instances_lock = threading.RLock()
+
+
+def get_service(service_class: Type[T]) -> T:
+    """Instance unique de service_class pour ce processus (créée au premier appel)"""
+    instance = _instances.get(service_class)
+    if instance is None:
+        with _instances_lock:
+            instance = _instances.get(service_class)
+            if instance is None:
+                instance = service_class()
+                _instances[service_class] = instance
+    return instance
+
+
+def reset_services() -> None:
+    """Oublie les instances (ex: après un changement de configuration dans les tests)"""
+    with _instances_lock:
+        _instances.clear()
@@ -0,0 +1,159 @@
+"""
+Coalescence des appels concurrents ("single-flight") sur une même clé de cache
+Un seul appelant interroge l'API externe, les autres attendent son résultat
+"""
+
+import threading
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+from django.conf import settings
+from django.db import connection
+from . import rate_limit
+from .redis_client import get_redis
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Libère le verrou Redis seulement s'il appartient toujours à son détenteur
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _Call:
+    """Appel en cours partagé entre les threads du processus"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+def wait_timeout() -> float:
+    return getattr(settings, 'API_SINGLE_FLIGHT_TIMEOUT', 10)
+
+
+def do(key: str, fn: Callable[[], Any], recheck: Callable[[], Optional[Any]] = None) -> Any:
+    """
+    Exécute fn() une seule fois pour une clé donnée, dans le processus et entre workers.
+    recheck() est appelé par les appelants en attente pour relire le résultat
+    déposé (en cache) par le worker qui détient le verrou; None signifie "absent".
+    Au-delà du délai d'attente, l'appelant exécute fn() lui-même.
+    """
+    with _calls_lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _calls[key] = call
+
+    if not leader:
+        if call.done.wait(wait_timeout()):
+            if call.error is not None:
+                raise call.error
+            return call.result
+        logger.warning(f"Single-flight wait timed out for {key}")
+        return fn()
+
+    try:
+        call.result = _do_across_workers(key, fn, recheck)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _calls_lock:
+            _calls.pop(key, None)
+        call.done.set()
+
+
+def _do_across_workers(key: str, fn: Callable[[], Any], recheck: Callable[[], Optional[Any]] = None) -> Any:
+    """Sérialise fn() entre workers grâce à un verrou distribué"""
+    deadline = time.monotonic() + wait_timeout()
+    delay = 0.05
+
+    while True:
+        with distributed_lock(key) as acquired:
+            if acquired:
+                # Un autre worker a pu remplir le cache pendant qu'on attendait
+                if recheck is not None:
+                    data = recheck()
+                    if data is not None:
+                        return data
+                return fn()
+
+        if recheck is not None:
+            data = recheck()
+            if data is not None:
+                return data
+
+        if time.monotonic() >= deadline:
+            logger.warning(f"Distributed single-flight wait timed out for {key}")
+            return fn()
+
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+@contextmanager
+def distributed_lock(key: str, ttl_seconds: float = None):
+    """
+    Tente d'acquérir (sans attendre) un verrou partagé entre workers.
+    Utilise Redis si configuré, sinon un verrou consultatif PostgreSQL;
+    sans l'un ni l'autre le verrou est toujours accordé (coalescence locale seulement).
+    Par défaut le verrou Redis dure plus longtemps que l'appel qu'il protège : attente
+    d'un jeton de débit (selon la priorité courante, voir rate_limit) puis appel HTTP.
+    """
+    if ttl_seconds is None:
+        ttl_seconds = rate_limit.max_wait_seconds() + wait_timeout() * 2
+
+    client = get_redis()
+    if client is not None:
+        token = uuid.uuid4().hex
+        lock_key = f"singleflight:{key}"
+        try:
+            acquired = bool(client.set(lock_key, token, nx=True, px=int(ttl_seconds * 1000)))
+        except Exception as e:
+            logger.warning(f"Redis lock unavailable for {key}: {e}")
+            yield True
+            return
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    client.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.warning(f"Redis lock release failed for {key}: {e}")
+        return
+
+    if connection.vendor == 'postgresql':
+        lock_id = _advisory_lock_id(key)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [lock_id])
+            acquired = cursor.fetchone()[0]
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
+        return
+
+    yield True
+
+
+def _advisory_lock_id(key: str) -> int:
+    """Identifiant 64 bits signé stable pour pg_advisory_lock"""
+    checksum = zlib.crc32(key.encode()) | (zlib.adler32(key.encode()) << 32)
+    return checksum - (1 << 64) if checksum >= (1 << 63) else checksum
@@ -3,22 +3,61 @@ Service pour l'intégration avec l'API Spotify
 Gère la recherche et l'enrichissement de contenu musical
 """
 
+import functools
+import re
 import requests
 import base64
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from django.conf import settings
 from ..models import APICache
-import hashlib
+from .cache_keys import build_cache_key
+from .ttl_policy import get_ttl_hours
+from . import metrics
+from . import http_client
+from .http_client import get_session
+from . import async_http
+from .circuit_breaker import CircuitOpen
+from .provider_cache import FetchDeferred, cached_fetch, conditional_headers
+from .rate_limit import RateLimited
+from .token_manager import AccessTokenManager
 import logging
 
 logger = logging.getLogger(__name__)
 
+ITEM_TYPES = ('track', 'artist', 'album')
+
+# spotify:track:<id> ou https://open.spotify.com/track/<id>
+_SPOTIFY_URI = re.compile(r'^spotify:(track|artist|album):([A-Za-z0-9]+)$')
+_SPOTIFY_URL = re.compile(r'^https?://open\.spotify\.com/(?:intl-[\w-]+/)?(track|artist|album)/([A-Za-z0-9]+)')
+
+
+def _indexes_types(method):
+    """Mémorise le type des éléments retournés par method (index du processus)"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        try:
+            self._index_types(result)
+        except Exception as e:
+            logger.warning(f"Spotify id type index update failed: {e}")
+        return result
+    return wrapper
+
 
 class SpotifyService:
     """Service pour l'API Spotify"""
     
     BASE_URL = "https://api.spotify.com/v1"
     TOKEN_URL = "https://accounts.spotify.com/api/token"
+    # Fenêtre pendant laquelle une réponse expirée est servie pendant son rafraîchissement
+    CACHE_STALE_GRACE_HOURS = 1
+    # Index partagé identifiant -> type (track, artist, album), limité aux identifiants dont le
+    # type a dû être trouvé par essais : durée de conservation d'une entrée
+    ID_TYPE_TTL_HOURS = 90 * 24
+    # Types des identifiants vus dans les réponses, en mémoire du processus (sans écriture en base)
+    ID_TYPE_MEMO_SIZE = 10000
+    # Nombre maximal d'identifiants par appel groupé (/tracks?ids=...)
+    BATCH_SIZES = {'tracks': 50, 'artists': 50, 'albums': 20}
     
     def __init__(self):
         self.client_id = getattr(settings, 'SPOTIFY_CLIENT_ID', None)
@@ -30,54 +69,40 @@ class SpotifyService:
             self.client_id = "demo_client_id"
             self.client_secret = "demo_client_secret"
         
-        self._access_token = None
+        self._indexed_ids = {}
+        self._tokens = AccessTokenManager('spotify_access_token', self._request_access_token)
     
     def _get_access_token(self) -> Optional[str]:
-        """Récupère un token d'accès via Client Credentials Flow"""
-        # Vérifier le cache pour le token
-        cache_key = "spotify_access_token"
-        cached_token = APICache.get_cached_data(cache_key)
-        if cached_token:
-            self._access_token = cached_token
-            return cached_token
-        
+        """Token d'accès (Client Credentials Flow), gardé en mémoire et renouvelé avant expiration"""
         # Si pas de credentials valides, retourner None
         if self.client_id == "demo_client_id":
             return None
+        return self._tokens.get()
+    
+    def _request_access_token(self) -> Tuple[str, int]:
+        """Demande un nouveau token à Spotify : (token, durée de validité en secondes)"""
+        # Encoder les credentials
+        credentials = f"{self.client_id}:{self.client_secret}"
+        encoded_credentials = base64.b64encode(credentials.encode()).decode()
+        
+        headers = {
+            'Authorization': f'Basic {encoded_credentials}',
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
         
-        try:
-            # Encoder les credentials
-            credentials = f"{self.client_id}:{self.client_secret}"
-            encoded_credentials = base64.b64encode(credentials.encode()).decode()
-            
-            headers = {
-                'Authorization': f'Basic {encoded_credentials}',
-                'Content-Type': 'application/x-www-form-urlencoded'
-            }
-            
-            data = {'grant_type': 'client_credentials'}
-            
-            response = requests.post(self.TOKEN_URL, headers=headers, data=data, timeout=10)
-            response.raise_for_status()
-            
-            token_data = response.json()
-            access_token = token_data.get('access_token')
-            expires_in = token_data.get('expires_in', 3600)
-            
-            # Cacher le token (moins 5 min pour être sûr)
-            APICache.set_cached_data(cache_key, access_token, ttl_hours=(expires_in - 300) / 3600)
-            
-            self._access_token = access_token
-            return access_token
-            
-        except requests.RequestException as e:
-            logger.error(f"Spotify token error: {e}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error getting Spotify token: {e}")
-            return None
+        data = {'grant_type': 'client_credentials'}
+        
+        response = get_session(self.TOKEN_URL).post(self.TOKEN_URL, headers=headers, data=data, timeout=10)
+        response.raise_for_status()
+        
+        token_data = response.json()
+        access_token = token_data.get('access_token')
+        if not access_token:
+            raise requests.RequestException("No access token in Spotify token response")
+        return access_token, token_data.get('expires_in', 3600)
     
-    def _make_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
+    def _make_request(self, endpoint: str, params: Dict = None, stale_grace_hours: float = None,
+                      ttl_hours: float = None) -> Optional[Dict]:
         """Effectue une requête vers l'API Spotify avec gestion d'erreur et cache"""
         # Récupérer le token d'accès
         token = self._get_access_token()
@@ -87,29 +112,33 @@ class SpotifyService:
         
         if params is None:
             params = {}
+        if stale_grace_hours is None:
+            stale_grace_hours = self.CACHE_STALE_GRACE_HOURS
+        if ttl_hours is None:
+            # Durée selon la politique par endpoint (voir ttl_policy)
+            ttl_hours = get_ttl_hours('spotify', endpoint, params)
         
         # Clé de cache
-        cache_key = f"spotify_{hashlib.md5(f'{endpoint}_{str(params)}'.encode()).hexdigest()}"
-        
-        # Vérifier le cache
-        cached_data = APICache.get_cached_data(cache_key)
-        if cached_data:
-            return cached_data
+        cache_key = self.cache_key(endpoint, params)
         
         try:
-            headers = {'Authorization': f'Bearer {token}'}
-            url = f"{self.BASE_URL}{endpoint}"
-            
-            response = requests.get(url, headers=headers, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Mettre en cache pour 2 heures
-            APICache.set_cached_data(cache_key, data, ttl_hours=2)
-            
-            return data
+            return cached_fetch(
+                cache_key,
+                lambda validators: self._fetch(endpoint, params, validators),
+                ttl_hours=ttl_hours,
+                stale_grace_hours=stale_grace_hours,
+                is_empty=self._is_empty_response,
+                metric_labels=metrics.labels('spotify', endpoint),
+                async_fetcher=lambda validators: self._afetch(endpoint, params, validators, token)
+            )
             
+        except FetchDeferred:
+            return None
+        except (RateLimited, CircuitOpen) as e:
+            # Quota atteint ou Spotify indisponible, sans copie en cache : pas de données
+            # de démo, l'appelant traite l'absence de résultat
+            logger.warning(f"Spotify API call shed for {endpoint}: {e}")
+            return None
         except requests.RequestException as e:
             logger.error(f"Spotify API error for {endpoint}: {e}")
             return self._get_demo_data(endpoint, params)
@@ -117,6 +146,39 @@ class SpotifyService:
             logger.error(f"Unexpected error with Spotify API: {e}")
             return self._get_demo_data(endpoint, params)
     
+    def cache_key(self, endpoint: str, params: Dict = None) -> str:
+        """Clé de cache d'un appel, sans l'effectuer (utile pour les lectures groupées)"""
+        return build_cache_key('spotify', endpoint, params)
+    
+    @staticmethod
+    def _is_empty_response(data: Dict) -> bool:
+        """Réponse sans contenu (ex: recherche sans résultat), à mettre en cache négatif"""
+        if not data:
+            return True
+        if 'items' in data:
+            return not data['items']
+        # Recherches et listings paginés : {'tracks': {'items': [...]}, ...}
+        pages = [value for value in data.values() if isinstance(value, dict) and 'items' in value]
+        if pages and len(pages) == len(data):
+            return all(not page['items'] for page in pages)
+        return False
+    
+    def _fetch(self, endpoint: str, params: Dict, validators: Dict = None) -> Tuple[Dict, Dict]:
+        """Appel HTTP brut vers Spotify (sans cache), conditionnel si des validateurs sont fournis"""
+        # Le token est relu ici pour qu'un rafraîchissement différé utilise un token valide
+        token = self._get_access_token()
+        if not token:
+            raise requests.RequestException("No Spotify access token available")
+        
+        headers = {'Authorization': f'Bearer {token}', **conditional_headers(validators)}
+        return http_client.get_json(f"{self.BASE_URL}{endpoint}", params, headers, provider='spotify')
+    
+    async def _afetch(self, endpoint: str, params: Dict, validators: Dict = None,
+                      token: str = None) -> Tuple[Dict, Dict]:
+        """Équivalent asynchrone de _fetch (vues ASGI), avec le token obtenu par _make_request"""
+        headers = {'Authorization': f'Bearer {token}', **conditional_headers(validators)}
+        return await async_http.get_json(f"{self.BASE_URL}{endpoint}", params, headers, provider='spotify')
+    
     def _get_demo_data(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
         """Retourne des données de démo pour les tests"""
         if '/search' in endpoint:
@@ -176,6 +238,7 @@ class SpotifyService:
             }
         return None
     
+    @_indexes_types
     def search_music(self, query: str, limit: int = 10) -> List[Dict]:
         """Recherche de contenu musical (tracks, albums, artists)"""
         params = {
@@ -205,6 +268,7 @@ class SpotifyService:
         
         return results[:limit]
     
+    @_indexes_types
     def search_tracks(self, query: str, limit: int = 10) -> List[Dict]:
         """Recherche spécifique de pistes"""
         params = {
@@ -224,6 +288,7 @@ class SpotifyService:
         
         return results
     
+    @_indexes_types
     def search_artists(self, query: str, limit: int = 10) -> List[Dict]:
         """Recherche spécifique d'artistes"""
         params = {
@@ -242,6 +307,7 @@ class SpotifyService:
         
         return results
     
+    @_indexes_types
     def search_albums(self, query: str, limit: int = 10) -> List[Dict]:
         """Recherche spécifique d'albums"""
         params = {
@@ -261,6 +327,7 @@ class SpotifyService:
         
         return results
     
+    @_indexes_types
     def get_track_details(self, track_id: str) -> Optional[Dict]:
         """Récupère les détails d'une piste"""
         data = self._make_request(f'/tracks/{track_id}')
@@ -268,6 +335,7 @@ class SpotifyService:
             return self._format_track(data)
         return None
     
+    @_indexes_types
     def get_artist_details(self, artist_id: str) -> Optional[Dict]:
         """Récupère les détails d'un artiste"""
         data = self._make_request(f'/artists/{artist_id}')
@@ -275,6 +343,7 @@ class SpotifyService:
             return self._format_artist(data)
         return None
     
+    @_indexes_types
     def get_album_details(self, album_id: str) -> Optional[Dict]:
         """Récupère les détails d'un album"""
         data = self._make_request(f'/albums/{album_id}')
@@ -282,6 +351,138 @@ class SpotifyService:
             return self._format_album(data)
         return None
     
+    @_indexes_types
+    def get_tracks_details(self, track_ids: List[str]) -> Dict[str, Dict]:
+        """Détails de plusieurs pistes ({id: détails}), par lots de 50"""
+        return self._get_many_details('tracks', track_ids, self._format_track)
+    
+    @_indexes_types
+    def get_artists_details(self, artist_ids: List[str]) -> Dict[str, Dict]:
+        """Détails de plusieurs artistes ({id: détails}), par lots de 50"""
+        return self._get_many_details('artists', artist_ids, self._format_artist)
+    
+    @_indexes_types
+    def get_albums_details(self, album_ids: List[str]) -> Dict[str, Dict]:
+        """Détails de plusieurs albums ({id: détails}), par lots de 20"""
+        return self._get_many_details('albums', album_ids, self._format_album)
+    
+    def _get_many_details(self, kind: str, ids: List[str], formatter) -> Dict[str, Dict]:
+        """
+        Lit les éléments en cache en une seule lecture, puis demande les absents par lots
+        (/tracks?ids=...). Chaque élément est mis en cache sous la clé de l'appel unitaire
+        (/tracks/{id}), partagée avec get_track_details et consorts.
+        """
+        ids = list(dict.fromkeys(item_id for item_id in ids if item_id))
+        if not ids:
+            return {}
+        if not self._get_access_token():
+            # Pas de token : données de démo, élément par élément
+            details = {item_id: self._make_request(f'/{kind}/{item_id}') for item_id in ids}
+            return {item_id: formatter(data) for item_id, data in details.items() if data}
+        
+        keys = {item_id: self.cache_key(f'/{kind}/{item_id}') for item_id in ids}
+        cached = APICache.get_many(keys.values())
+        found = {item_id: cached[key] for item_id, key in keys.items() if cached.get(key)}
+        missing = [item_id for item_id, key in keys.items() if key not in cached]
+        
+        batch_size = self.BATCH_SIZES[kind]
+        ttl_hours = get_ttl_hours('spotify', f'/{kind}/{ids[0]}')
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            try:
+                data, _ = self._fetch(f'/{kind}', {'ids': ','.join(batch)})
+            except requests.RequestException as e:
+                logger.error(f"Spotify API error for /{kind} batch: {e}")
+                continue
+            
+            # Un identifiant inconnu donne null dans la liste de réponse
+            fetched = {item['id']: item for item in data.get(kind, []) if item}
+            APICache.set_many({keys[item_id]: item for item_id, item in fetched.items()}, ttl_hours=ttl_hours)
+            for item_id in batch:
+                if item_id not in fetched:
+                    APICache.set_negative(keys[item_id])
+            found.update(fetched)
+        
+        return {item_id: formatter(found[item_id]) for item_id in ids if item_id in found}
+    
+    def get_details(self, spotify_id: str, item_type: str = None) -> Optional[Dict]:
+        """
+        Détails d'un élément Spotify de type quelconque. spotify_id peut être un identifiant,
+        une URI (spotify:track:...) ou un lien open.spotify.com ; sans type explicite, il est
+        lu dans l'index des identifiants, et à défaut chaque type est essayé (le type trouvé
+        est alors ajouté à l'index partagé).
+        """
+        uri_type, spotify_id = self.parse_id(spotify_id)
+        item_type = item_type or uri_type or self.resolve_type(spotify_id)
+        getters = {
+            'track': self.get_track_details,
+            'artist': self.get_artist_details,
+            'album': self.get_album_details,
+        }
+        if item_type in getters:
+            return getters[item_type](spotify_id)
+        
+        for item_type, getter in getters.items():
+            details = getter(spotify_id)
+            if details:
+                if self.client_id != "demo_client_id":
+                    APICache.set_cached_data(self._id_type_key(spotify_id), item_type, ttl_hours=self.ID_TYPE_TTL_HOURS)
+                return details
+        return None
+    
+    @staticmethod
+    def parse_id(value: str) -> Tuple[Optional[str], str]:
+        """(type, identifiant) d'une URI ou d'un lien Spotify ; (None, value) pour un identifiant seul"""
+        value = value.strip()
+        match = _SPOTIFY_URI.match(value) or _SPOTIFY_URL.match(value)
+        if match:
+            return match.group(1), match.group(2)
+        return None, value
+    
+    def resolve_type(self, spotify_id: str) -> Optional[str]:
+        """
+        Type connu d'un identifiant, sinon None : vu dans une réponse de ce processus,
+        détails déjà en cache pour l'un des types, ou index partagé
+        """
+        if spotify_id in self._indexed_ids:
+            return self._indexed_ids[spotify_id]
+        
+        keys = {item_type: self.cache_key(f'/{item_type}s/{spotify_id}') for item_type in ITEM_TYPES}
+        keys['index'] = self._id_type_key(spotify_id)
+        cached = APICache.get_many(keys.values())
+        for item_type in ITEM_TYPES:
+            if cached.get(keys[item_type]):
+                return item_type
+        return cached.get(keys['index']) or None
+    
+    def _id_type_key(self, spotify_id: str) -> str:
+        return f"spotify:id_type:{spotify_id}"
+    
+    def _index_types(self, result) -> None:
+        """
+        Mémorise (par processus, nombre borné) le type des éléments formatés d'une réponse
+        (liste, élément ou {id: élément}) ; rien n'est écrit en base sur ce chemin
+        """
+        if self.client_id == "demo_client_id" or not result:
+            return
+        if isinstance(result, dict):
+            items = [result] if 'external_id' in result else result.values()
+        else:
+            items = result
+        
+        new_types = {}
+        for item in items:
+            item_id, item_type = item.get('external_id'), item.get('type')
+            if item_id and item_type in ITEM_TYPES and self._indexed_ids.get(item_id) != item_type:
+                new_types[item_id] = item_type
+        if not new_types:
+            return
+        
+        if len(self._indexed_ids) + len(new_types) > self.ID_TYPE_MEMO_SIZE:
+            self._indexed_ids.clear()
+        self._indexed_ids.update(new_types)
+    
+    @_indexes_types
     def get_artist_top_tracks(self, artist_id: str, country: str = 'FR', limit: int = 10) -> List[Dict]:
         """Récupère les meilleurs titres d'un artiste"""
         data = self._make_request(f'/artists/{artist_id}/top-tracks', {'country': country})
@@ -294,6 +495,7 @@ class SpotifyService:
         
         return results
     
+    @_indexes_types
     def get_related_artists(self, artist_id: str, limit: int = 10) -> List[Dict]:
         """Récupère les artistes similaires"""
         data = self._make_request(f'/artists/{artist_id}/related-artists')
@@ -306,6 +508,7 @@ class SpotifyService:
         
         return results
     
+    @_indexes_types
     def get_album_tracks(self, album_id: str, limit: int = 50) -> List[Dict]:
         """Récupère les pistes d'un album"""
         data = self._make_request(f'/albums/{album_id}/tracks', {'limit': limit})
@@ -342,6 +545,7 @@ class SpotifyService:
         
         return results
     
+    @_indexes_types
     def get_new_releases(self, country: str = 'FR', limit: int = 20) -> List[Dict]:
         """Récupère les nouvelles sorties"""
         data = self._make_request('/browse/new-releases', {
@@ -4,10 +4,15 @@ Gère la recherche et l'enrichissement de films et séries
 """
 
 import requests
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from django.conf import settings
 from ..models import APICache
-import hashlib
+from .cache_keys import build_cache_key
+from .ttl_policy import get_ttl_hours
+from . import metrics
+from . import http_client
+from . import async_http
+from .provider_cache import FetchDeferred, cached_fetch, conditional_headers, deferred_fetches
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,6 +23,10 @@ class TMDBService:
     
     BASE_URL = "https://api.themoviedb.org/3"
     IMAGE_BASE_URL = "https://image.tmdb.org/t/p"
+    # Fenêtre pendant laquelle une réponse expirée est servie pendant son rafraîchissement
+    CACHE_STALE_GRACE_HOURS = 2
+    # Sous-ressources chargées avec les détails d'un titre, en un seul appel
+    TITLE_APPENDS = 'similar,recommendations,credits'
     
     def __init__(self):
         self.api_key = getattr(settings, 'TMDB_API_KEY', None)
@@ -25,34 +34,36 @@ class TMDBService:
             logger.warning("TMDB_API_KEY not configured in settings")
             self.api_key = "demo_key"  # Pour les tests
     
-    def _make_request(self, endpoint: str, params: Dict = None) -> Optional[Dict]:
+    def _make_request(self, endpoint: str, params: Dict = None, stale_grace_hours: float = None,
+                      ttl_hours: float = None) -> Optional[Dict]:
         """Effectue une requête vers l'API TMDB avec gestion d'erreur et cache"""
         if params is None:
             params = {}
+        if stale_grace_hours is None:
+            stale_grace_hours = self.CACHE_STALE_GRACE_HOURS
+        if ttl_hours is None:
+            # Durée selon la politique par endpoint (voir ttl_policy)
+            ttl_hours = get_ttl_hours('tmdb', endpoint, params)
         
         params['api_key'] = self.api_key
         params['language'] = 'fr-FR'  # Priorité au français
         
-        # Clé de cache basée sur l'endpoint et les paramètres
-        cache_key = f"tmdb_{hashlib.md5(f'{endpoint}_{str(params)}'.encode()).hexdigest()}"
-        
-        # Vérifier le cache d'abord
-        cached_data = APICache.get_cached_data(cache_key)
-        if cached_data:
-            return cached_data
+        # Clé de cache basée sur l'endpoint et les paramètres (sans la clé d'API)
+        cache_key = self.cache_key(endpoint, params)
         
         try:
-            url = f"{self.BASE_URL}{endpoint}"
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Mettre en cache pour 6 heures
-            APICache.set_cached_data(cache_key, data, ttl_hours=6)
-            
-            return data
+            return cached_fetch(
+                cache_key,
+                lambda validators: self._fetch(endpoint, params, validators),
+                ttl_hours=ttl_hours,
+                stale_grace_hours=stale_grace_hours,
+                is_empty=self._is_empty_response,
+                metric_labels=metrics.labels('tmdb', endpoint),
+                async_fetcher=lambda validators: self._afetch(endpoint, params, validators)
+            )
             
+        except FetchDeferred:
+            return None
         except requests.RequestException as e:
             logger.error(f"TMDB API error for {endpoint}: {e}")
             return None
@@ -60,6 +71,59 @@ class TMDBService:
             logger.error(f"Unexpected error with TMDB API: {e}")
             return None
     
+    def cache_key(self, endpoint: str, params: Dict = None) -> str:
+        """Clé de cache d'un appel, sans l'effectuer (utile pour les lectures groupées)"""
+        return build_cache_key('tmdb', endpoint, {**(params or {}), 'language': 'fr-FR'})
+    
+    @staticmethod
+    def _is_empty_response(data: Dict) -> bool:
+        """Réponse sans contenu (ex: recherche sans résultat), à mettre en cache négatif"""
+        return not data or ('results' in data and not data['results'])
+    
+    def _fetch(self, endpoint: str, params: Dict, validators: Dict = None) -> Tuple[Dict, Dict]:
+        """Appel HTTP brut vers TMDB (sans cache), conditionnel si des validateurs sont fournis"""
+        return http_client.get_json(
+            f"{self.BASE_URL}{endpoint}", params, conditional_headers(validators), provider='tmdb'
+        )
+    
+    async def _afetch(self, endpoint: str, params: Dict, validators: Dict = None) -> Tuple[Dict, Dict]:
+        """Équivalent asynchrone de _fetch (vues ASGI)"""
+        return await async_http.get_json(
+            f"{self.BASE_URL}{endpoint}", params, conditional_headers(validators), provider='tmdb'
+        )
+    
+    def search_multi(self, query: str, limit: int = 10) -> Dict[str, List[Dict]]:
+        """
+        Recherche films et séries en un seul appel (/search/multi) : {'FILMS': [...], 'SERIES': [...]}.
+        Si l'appel échoue, repli sur /search/movie et /search/tv.
+        """
+        params = {'query': query}
+        data = self._make_request('/search/multi', params)
+        if data is None and self._search_multi_failed(self.cache_key('/search/multi', params)):
+            return {
+                'FILMS': self.search_movies(query, limit),
+                'SERIES': self.search_tv_shows(query, limit),
+            }
+        
+        results = {'FILMS': [], 'SERIES': []}
+        for item in (data or {}).get('results', []):
+            # Les personnes (media_type 'person') sont ignorées
+            if item.get('media_type') == 'movie' and len(results['FILMS']) < limit:
+                results['FILMS'].append(self._format_movie(item))
+            elif item.get('media_type') == 'tv' and len(results['SERIES']) < limit:
+                results['SERIES'].append(self._format_tv_show(item))
+        
+        return results
+    
+    @staticmethod
+    def _search_multi_failed(cache_key: str) -> bool:
+        """Absence de réponse due à une erreur, et non à une recherche sans résultat"""
+        deferred = deferred_fetches.get()
+        if deferred is not None and cache_key not in deferred.attempted:
+            # Vue asynchrone : l'appel est en attente, le code sera rejoué avec sa réponse
+            return False
+        return APICache.get_cached_data(cache_key) is not APICache.NEGATIVE
+    
     def search_movies(self, query: str, limit: int = 10) -> List[Dict]:
         """Recherche de films"""
         data = self._make_request('/search/movie', {'query': query})
@@ -86,18 +150,28 @@ class TMDBService:
     
     def get_movie_details(self, movie_id: int) -> Optional[Dict]:
         """Récupère les détails complets d'un film"""
-        data = self._make_request(f'/movie/{movie_id}')
+        data = self._get_title('movie', movie_id)
         if data:
             return self._format_movie_details(data)
         return None
     
     def get_tv_show_details(self, tv_id: int) -> Optional[Dict]:
         """Récupère les détails complets d'une série"""
-        data = self._make_request(f'/tv/{tv_id}')
+        data = self._get_title('tv', tv_id)
         if data:
             return self._format_tv_show_details(data)
         return None
     
+    def _get_title(self, media_type: str, title_id: int) -> Optional[Dict]:
+        """
+        Détails d'un film ou d'une série avec similaires, recommandations et générique
+        (append_to_response) : un seul appel et une seule entrée de cache par titre.
+        """
+        endpoint = f'/{media_type}/{title_id}'
+        # Durée la plus courte des parties (les similaires changent plus vite que les détails)
+        ttl_hours = min(get_ttl_hours('tmdb', endpoint), get_ttl_hours('tmdb', f'{endpoint}/similar'))
+        return self._make_request(endpoint, {'append_to_response': self.TITLE_APPENDS}, ttl_hours=ttl_hours)
+    
     def get_trending_movies(self, time_window: str = 'week', limit: int = 20) -> List[Dict]:
         """Récupère les films tendance"""
         data = self._make_request(f'/trending/movie/{time_window}')
@@ -124,48 +198,48 @@ class TMDBService:
     
     def get_similar_movies(self, movie_id: int, limit: int = 10) -> List[Dict]:
         """Récupère les films similaires"""
-        data = self._make_request(f'/movie/{movie_id}/similar')
+        data = self._get_title('movie', movie_id)
         if not data:
             return []
         
         results = []
-        for movie in data.get('results', [])[:limit]:
+        for movie in data.get('similar', {}).get('results', [])[:limit]:
             results.append(self._format_movie(movie))
         
         return results
     
     def get_similar_tv_shows(self, tv_id: int, limit: int = 10) -> List[Dict]:
         """Récupère les séries similaires"""
-        data = self._make_request(f'/tv/{tv_id}/similar')
+        data = self._get_title('tv', tv_id)
         if not data:
             return []
         
         results = []
-        for show in data.get('results', [])[:limit]:
+        for show in data.get('similar', {}).get('results', [])[:limit]:
             results.append(self._format_tv_show(show))
         
         return results
     
     def get_recommendations_movies(self, movie_id: int, limit: int = 10) -> List[Dict]:
         """Récupère les recommandations de films basées sur TMDB"""
-        data = self._make_request(f'/movie/{movie_id}/recommendations')
+        data = self._get_title('movie', movie_id)
         if not data:
             return []
         
         results = []
-        for movie in data.get('results', [])[:limit]:
+        for movie in data.get('recommendations', {}).get('results', [])[:limit]:
             results.append(self._format_movie(movie))
         
         return results
     
     def get_recommendations_tv_shows(self, tv_id: int, limit: int = 10) -> List[Dict]:
         """Récupère les recommandations de séries basées sur TMDB"""
-        data = self._make_request(f'/tv/{tv_id}/recommendations')
+        data = self._get_title('tv', tv_id)
         if not data:
             return []
         
         results = []
-        for show in data.get('results', [])[:limit]:
+        for show in data.get('recommendations', {}).get('results', [])[:limit]:
             results.append(self._format_tv_show(show))
         
         return results
@@ -224,7 +298,9 @@ class TMDBService:
             'status': movie_data.get('status'),
             'tagline': movie_data.get('tagline'),
             'homepage': movie_data.get('homepage'),
-            'imdb_id': movie_data.get('imdb_id')
+            'imdb_id': movie_data.get('imdb_id'),
+            'cast': self._format_cast(movie_data),
+            'directors': [c['name'] for c in movie_data.get('credits', {}).get('crew', []) if c.get('job') == 'Director']
         })
         
         return base_info
@@ -246,11 +322,16 @@ class TMDBService:
             'type': show_data.get('type'),
             'homepage': show_data.get('homepage'),
             'last_air_date': show_data.get('last_air_date'),
-            'in_production': show_data.get('in_production', False)
+            'in_production': show_data.get('in_production', False),
+            'cast': self._format_cast(show_data)
         })
         
         return base_info
     
+    def _format_cast(self, data: Dict, limit: int = 10) -> List[str]:
+        """Principaux interprètes (générique chargé avec les détails)"""
+        return [c['name'] for c in data.get('credits', {}).get('cast', [])[:limit]]
+    
     def _get_image_url(self, path: Optional[str], size: str = 'w500') -> Optional[str]:
         """Construit l'URL complète pour une image TMDB"""
         if not path:
@@ -0,0 +1,85 @@
+"""
+Jetons d'accès OAuth des APIs externes (ex: Spotify, client credentials)
+Le jeton est gardé en mémoire du processus et renouvelé avant son expiration par un seul
+thread ; entre workers, un seul renouvellement à la fois et le jeton obtenu est partagé
+via APICache.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+from ..models import APICache
+from . import single_flight
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AccessTokenManager:
+    """Jeton d'accès d'une API, sans lecture en base tant qu'il n'approche pas de son expiration"""
+
+    # Renouvellement anticipé : délai avant expiration à partir duquel on renouvelle (secondes)
+    REFRESH_MARGIN_SECONDS = 300
+    # Délai avant une nouvelle tentative après un échec du renouvellement (secondes)
+    RETRY_DELAY_SECONDS = 10
+
+    def __init__(self, cache_key: str, request_token: Callable[[], Tuple[str, int]]):
+        """request_token() demande un nouveau jeton à l'API et retourne (jeton, durée de validité en secondes)"""
+        self.cache_key = cache_key
+        self.request_token = request_token
+        self._token = None
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[str]:
+        """Jeton valide, ou None si aucun n'a pu être obtenu"""
+        now = time.time()
+        token, expires_at = self._token, self._expires_at
+        if token and now < expires_at - self.REFRESH_MARGIN_SECONDS:
+            return token
+
+        if token and now < expires_at:
+            # Encore valide : un seul thread renouvelle, les autres utilisent le jeton courant
+            if not self._lock.acquire(blocking=False):
+                return token
+            try:
+                return self._refresh() or token
+            finally:
+                self._lock.release()
+
+        with self._lock:
+            # Renouvelé par un autre thread pendant l'attente du verrou
+            if self._token and time.time() < self._expires_at - self.REFRESH_MARGIN_SECONDS:
+                return self._token
+            token = self._refresh()
+            if token is None and self._token and time.time() < self._expires_at:
+                return self._token
+            return token
+
+    def _refresh(self) -> Optional[str]:
+        if time.time() < self._retry_at:
+            return None
+        try:
+            entry = single_flight.do(self.cache_key, self._request_shared, recheck=self._read_shared)
+        except Exception as e:
+            logger.error(f"Access token refresh failed for {self.cache_key}: {e}")
+            self._retry_at = time.time() + self.RETRY_DELAY_SECONDS
+            return None
+
+        self._token, self._expires_at = entry['access_token'], entry['expires_at']
+        return self._token
+
+    def _read_shared(self) -> Optional[Dict]:
+        """Jeton déjà renouvelé par un autre worker, s'il n'approche pas de son expiration"""
+        entry = APICache.get_shared_data(self.cache_key)
+        if isinstance(entry, dict) and time.time() < entry.get('expires_at', 0) - self.REFRESH_MARGIN_SECONDS:
+            return entry
+        return None
+
+    def _request_shared(self) -> Dict:
+        token, expires_in = self.request_token()
+        entry = {'access_token': token, 'expires_at': time.time() + expires_in}
+        APICache.set_cached_data(self.cache_key, entry, ttl_hours=expires_in / 3600)
+        logger.info(f"Access token refreshed for {self.cache_key}, valid for {expires_in}s")
+        return entry
@@ -0,0 +1,63 @@
+"""
+Politique de durée de cache par fournisseur et par endpoint
+Les données de catalogue stables sont gardées des jours, les flux volatils quelques minutes
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+
+HOUR = 1
+DAY = 24 * HOUR
+
+# Durée par défaut d'un fournisseur quand aucune règle ne correspond
+DEFAULT_TTL_HOURS = {
+    'tmdb': 6,
+    'spotify': 2,
+    'google_books': 12,
+}
+
+# (fournisseur, motif d'endpoint, préfixe du paramètre de recherche ou None, durée en heures)
+# La première règle qui correspond s'applique.
+TTL_POLICIES: List[Tuple[str, str, Optional[str], float]] = [
+    # TMDB
+    ('tmdb', r'^/genre/\w+/list$', None, 7 * DAY),
+    ('tmdb', r'^/(movie|tv)/\d+$', None, 3 * DAY),
+    ('tmdb', r'^/(movie|tv)/\d+/(similar|recommendations)$', None, DAY),
+    ('tmdb', r'^/trending/', None, 1 * HOUR),
+    ('tmdb', r'^/search/', None, 6 * HOUR),
+    # Spotify
+    ('spotify', r'^/(tracks|albums|artists)/[^/]+$', None, 3 * DAY),
+    ('spotify', r'^/albums/[^/]+/tracks$', None, 7 * DAY),
+    ('spotify', r'^/artists/[^/]+/(top-tracks|related-artists)$', None, DAY),
+    ('spotify', r'^/browse/', None, 0.25 * HOUR),
+    ('spotify', r'^/search$', None, 2 * HOUR),
+    # Google Books
+    ('google_books', r'^/volumes$', 'isbn:', 30 * DAY),
+    ('google_books', r'^/volumes/[^/]+$', None, 7 * DAY),
+    ('google_books', r'^/volumes$', None, 12 * HOUR),
+]
+
+
+@lru_cache(maxsize=None)
+def _compile(pattern: str):
+    return re.compile(pattern)
+
+
+def _rules():
+    """Règles de API_CACHE_TTL_OVERRIDES (prioritaires) puis règles par défaut"""
+    return list(getattr(settings, 'API_CACHE_TTL_OVERRIDES', [])) + TTL_POLICIES
+
+
+def get_ttl_hours(provider: str, endpoint: str, params: Dict = None) -> float:
+    """Durée de cache (heures) d'un appel selon la politique"""
+    query = str((params or {}).get('q', '')).lower()
+    for rule_provider, pattern, query_prefix, ttl_hours in _rules():
+        if rule_provider != provider:
+            continue
+        if query_prefix and not query.startswith(query_prefix):
+            continue
+        if _compile(pattern).search(endpoint):
+            return ttl_hours
+    return DEFAULT_TTL_HOURS.get(provider, 24)
@@ -0,0 +1,116 @@
+"""
+Tâches Celery de l'application core
+"""
+
+import time
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .models import APICache, ListItem
+from .services import rate_limit
+from .services.books_service import BooksService
+from .services.external_enrichment_service import ExternalEnrichmentService
+from .services.registry import get_service
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def purge_expired_api_cache(batch_size=None, max_batches=None):
+    """Purge par lots les entrées APICache expirées, hors du chemin des requêtes"""
+    if batch_size is None:
+        batch_size = getattr(settings, 'API_CACHE_PURGE_BATCH_SIZE', 1000)
+
+    started = time.monotonic()
+    deleted = APICache.purge_expired(batch_size=batch_size, max_batches=max_batches)
+    duration = time.monotonic() - started
+
+    logger.info(f"APICache purge: {deleted} expired rows removed in {duration:.2f}s")
+    return {'deleted': deleted, 'duration_seconds': round(duration, 3)}
+
+
+@shared_task
+def build_popular_books_snapshot():
+    """Reconstruit l'instantané des livres populaires servi par BooksService.get_popular_books"""
+    started = time.monotonic()
+    with rate_limit.bulk_priority():
+        snapshot = get_service(BooksService).build_popular_snapshot()
+    duration = time.monotonic() - started
+
+    if snapshot is None:
+        return {'books': 0, 'duration_seconds': round(duration, 3)}
+    logger.info(f"Popular books snapshot: {len(snapshot['books'])} books built in {duration:.2f}s")
+    return {'books': len(snapshot['books']), 'built_at': snapshot['built_at'], 'duration_seconds': round(duration, 3)}
+
+
+def _enrichment_queued_key(item_id):
+    return f"enrichment:queued:{item_id}"
+
+
+def enqueue_enrichment(list_item, force_refresh=False):
+    """
+    Planifie l'enrichissement externe de list_item, une fois la transaction en cours validée ;
+    list_item passe à l'état "en attente". Avec un broker (ENRICHMENT_ASYNC), une seule
+    tâche en attente par élément. Sans broker, l'enrichissement est fait sur place après
+    la validation : list_item porte alors son état final.
+    """
+    _set_enrichment_status(list_item, ListItem.EnrichmentStatus.PENDING)
+    if getattr(settings, 'ENRICHMENT_ASYNC', True):
+        transaction.on_commit(lambda: _send_enrichment(list_item.pk, force_refresh))
+    else:
+        transaction.on_commit(lambda: _run_enrichment(list_item, force_refresh))
+
+
+def _send_enrichment(item_id, force_refresh):
+    key = _enrichment_queued_key(item_id)
+    # Déjà en attente (cache partagé entre workers avec Redis)
+    if not cache.add(key, True, timeout=getattr(settings, 'ENRICHMENT_QUEUE_DEDUP_SECONDS', 600)):
+        return
+
+    try:
+        enrich_list_item.delay(item_id, force_refresh)
+    except Exception as e:
+        logger.error(f"Could not queue enrichment of item {item_id}: {e}")
+        cache.delete(key)
+        ListItem.objects.filter(pk=item_id).update(enrichment_status=ListItem.EnrichmentStatus.FAILED)
+
+
+def _set_enrichment_status(list_item, enrichment_status):
+    ListItem.objects.filter(pk=list_item.pk).update(enrichment_status=enrichment_status)
+    list_item.enrichment_status = enrichment_status
+
+
+def _run_enrichment(list_item, force_refresh):
+    """Enrichit list_item en tenant son état à jour ; la priorité de débit est celle de l'appelant"""
+    _set_enrichment_status(list_item, ListItem.EnrichmentStatus.RUNNING)
+    started = time.monotonic()
+    try:
+        success = get_service(ExternalEnrichmentService).enrich_list_item(list_item, force_refresh=force_refresh)
+    except Exception as e:
+        logger.error(f"Enrichment of item {list_item.pk} raised: {e}")
+        success = False
+    _set_enrichment_status(
+        list_item, ListItem.EnrichmentStatus.DONE if success else ListItem.EnrichmentStatus.FAILED
+    )
+
+    logger.info(f"Enrichment of item {list_item.pk} {'succeeded' if success else 'failed'} in {time.monotonic() - started:.2f}s")
+    return success
+
+
+@shared_task
+def enrich_list_item(item_id, force_refresh=False):
+    """Enrichit un élément de liste avec les APIs externes, hors du chemin des requêtes"""
+    # Une modification ultérieure de l'élément pourra planifier un nouvel enrichissement
+    cache.delete(_enrichment_queued_key(item_id))
+
+    try:
+        list_item = ListItem.objects.select_related('list', 'external_ref').get(pk=item_id)
+    except ListItem.DoesNotExist:
+        logger.info(f"Enrichment skipped: item {item_id} no longer exists")
+        return False
+
+    # Dans un worker, l'attente d'un jeton est tolérée sans entamer la réserve des requêtes interactives
+    with rate_limit.bulk_priority():
+        return _run_enrichment(list_item, force_refresh)
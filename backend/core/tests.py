@@ -1,3 +1,1360 @@
-from django.test import TestCase
+import asyncio
+import inspect
+import json
+import re
+import threading
+import time
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import httpx
+import requests
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+
+from . import async_views, tasks
+from .models import APICache, List, ListItem
+from .services import (
+    async_http, cache_backends, cache_codecs, circuit_breaker, fan_out, http_client, metrics, provider_cache, rate_limit,
+    single_flight,
+)
+from .services.async_fetch import run_with_async_fetches
+from .services import books_service
+from .services.books_service import BooksService
+from .services.cache_keys import build_cache_key
+from .services.local_cache import LocalLRUCache
+from .services.provider_cache import FetchDeferred, NotModified, cached_fetch, conditional_headers
+from .services.registry import get_service, reset_services
+from .services.spotify_service import SpotifyService
+from .services.tmdb_service import TMDBService
+from .services.token_manager import AccessTokenManager
+from .views import get_similar_suggestions_response, get_trending_external_response
+from .services.ttl_policy import DAY, HOUR, get_ttl_hours
+
+
+class APICacheTestCase(TestCase):
+    """Tier mémoire vidé entre les tests (il est partagé par le processus)"""
+
+    def setUp(self):
+        APICache.local_cache().clear()
+        self.addCleanup(APICache.local_cache().clear)
+
+    def expire(self, cache_key, seconds_ago=60):
+        APICache.objects.filter(cache_key=cache_key).update(
+            expires_at=timezone.now() - timedelta(seconds=seconds_ago)
+        )
+        APICache.local_cache().clear()
+
+
+class LocalLRUCacheTests(TestCase):
+
+    def test_reads_return_independent_copies(self):
+        cache = LocalLRUCache()
+        cache.set('k', {'items': [1]}, timezone.now() + timedelta(hours=1))
+
+        cache.get('k')['items'].append(2)
+
+        self.assertEqual(cache.get('k'), {'items': [1]})
+
+    def test_expired_entries_are_not_kept(self):
+        cache = LocalLRUCache()
+        cache.set('k', {'v': 1}, timezone.now() - timedelta(seconds=1))
+
+        self.assertIsNone(cache.get('k'))
+        self.assertEqual(len(cache), 0)
+
+    def test_evicts_least_recently_used_entries(self):
+        cache = LocalLRUCache(max_entries=2)
+        expires_at = timezone.now() + timedelta(hours=1)
+        cache.set('a', 1, expires_at)
+        cache.set('b', 2, expires_at)
+        cache.get('a')
+        cache.set('c', 3, expires_at)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_entries_over_the_byte_budget_are_not_kept(self):
+        cache = LocalLRUCache(max_bytes=10)
+        cache.set('k', {'text': 'x' * 20}, timezone.now() + timedelta(hours=1))
+
+        self.assertIsNone(cache.get('k'))
+        self.assertEqual(cache.size_bytes, 0)
+
+
+class LocalTierTests(APICacheTestCase):
+
+    def test_reads_are_served_from_memory(self):
+        APICache.set_cached_data('k', {'v': 1})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(APICache.get_cached_data('k'), {'v': 1})
+
+    def test_mutating_a_result_does_not_change_the_cache(self):
+        APICache.set_cached_data('k', {'items': [1]})
+
+        APICache.get_cached_data('k')['items'].append(2)
+
+        self.assertEqual(APICache.get_cached_data('k'), {'items': [1]})
+
+
+class StaleWhileRevalidateTests(APICacheTestCase):
+
+    def test_expired_entry_is_served_stale_within_the_grace_window(self):
+        APICache.set_cached_data('k', {'v': 1})
+        self.expire('k')
+
+        self.assertEqual(APICache.get_cached_data_or_stale('k', stale_grace_hours=1), ({'v': 1}, True))
+        self.assertIsNone(APICache.get_cached_data('k'))
+
+    def test_entry_past_the_grace_window_is_not_served(self):
+        APICache.set_cached_data('k', {'v': 1})
+        self.expire('k', seconds_ago=7200)
+
+        self.assertEqual(APICache.get_cached_data_or_stale('k', stale_grace_hours=1), (None, False))
+
+    def test_stale_local_copy_does_not_hide_a_fresh_backend_row(self):
+        APICache.set_cached_data('k', {'v': 1}, ttl_hours=1 / 3600)
+        time.sleep(1.1)
+        self.assertEqual(APICache.get_cached_data_or_stale('k', stale_grace_hours=1), ({'v': 1}, True))
+
+        # Ligne rafraîchie par un autre worker
+        APICache.backend().set('k', {'v': 2}, timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(APICache.get_cached_data('k'), {'v': 2})
+        self.assertEqual(APICache.get_cached_data_or_stale('k', stale_grace_hours=1), ({'v': 2}, False))
+
+    def test_stale_hit_schedules_a_refresh_and_serves_the_old_copy(self):
+        APICache.set_cached_data('k', {'v': 1})
+        self.expire('k')
+        fetcher = mock.Mock(return_value=({'v': 2}, {}))
+
+        with mock.patch.object(provider_cache, 'schedule_refresh') as schedule_refresh:
+            data = cached_fetch('k', fetcher, ttl_hours=1, stale_grace_hours=1)
+
+        self.assertEqual(data, {'v': 1})
+        schedule_refresh.assert_called_once()
+        fetcher.assert_not_called()
+
+    def test_refresh_is_skipped_when_another_worker_already_refreshed(self):
+        APICache.set_cached_data('k', {'v': 2})
+        fetch_and_store = mock.Mock()
+
+        with mock.patch.object(provider_cache, 'connections'):
+            provider_cache._refresh('k', fetch_and_store)
+
+        fetch_and_store.assert_not_called()
+
+    def test_refresh_fetches_an_expired_key(self):
+        APICache.set_cached_data('k', {'v': 1})
+        self.expire('k')
+        fetch_and_store = mock.Mock()
+
+        with mock.patch.object(provider_cache, 'connections'):
+            provider_cache._refresh('k', fetch_and_store)
+
+        fetch_and_store.assert_called_once()
+
+
+class SingleFlightTests(TestCase):
+
+    def test_concurrent_callers_share_one_call(self):
+        calls = []
+        results = []
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'data'
+
+        threads = [
+            threading.Thread(target=lambda: results.append(single_flight.do('k', fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['data'] * 5)
+
+    def test_errors_are_shared_with_waiting_callers(self):
+        def fetch():
+            time.sleep(0.2)
+            raise ValueError('upstream')
+
+        errors = []
+
+        def call():
+            try:
+                single_flight.do('k', fetch)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 3)
+
+    def lock_ttl_ms(self):
+        """Durée (ms) demandée à Redis pour le verrou partagé"""
+        client = mock.Mock()
+        client.set.return_value = True
+        with mock.patch.object(single_flight, 'get_redis', return_value=client):
+            with single_flight.distributed_lock('k') as acquired:
+                self.assertTrue(acquired)
+        client.eval.assert_called_once()
+        self.assertTrue(client.set.call_args.kwargs['nx'])
+        return client.set.call_args.kwargs['px']
+
+    def test_redis_lock_outlives_the_interactive_token_wait(self):
+        self.assertGreater(self.lock_ttl_ms(), rate_limit.max_wait_seconds() * 1000)
+
+    def test_redis_lock_outlives_the_bulk_token_wait(self):
+        interactive_ttl = self.lock_ttl_ms()
+        with rate_limit.bulk_priority():
+            bulk_wait = rate_limit.max_wait_seconds()
+            bulk_ttl = self.lock_ttl_ms()
+
+        self.assertGreater(bulk_ttl, bulk_wait * 1000)
+        self.assertGreater(bulk_ttl, interactive_ttl)
+
+
+class NegativeCacheTests(APICacheTestCase):
+
+    def test_empty_response_is_cached_negatively(self):
+        fetcher = mock.Mock(return_value=({'items': []}, {}))
+        is_empty = lambda data: not data['items']
+
+        self.assertIsNone(cached_fetch('k', fetcher, ttl_hours=1, is_empty=is_empty))
+        self.assertIsNone(cached_fetch('k', fetcher, ttl_hours=1, is_empty=is_empty))
+
+        fetcher.assert_called_once()
+        self.assertIs(APICache.get_cached_data('k'), APICache.NEGATIVE)
+
+    def test_not_found_is_cached_negatively(self):
+        response = requests.Response()
+        response.status_code = 404
+        fetcher = mock.Mock(side_effect=requests.HTTPError(response=response))
+
+        self.assertIsNone(cached_fetch('k', fetcher, ttl_hours=1))
+        self.assertIsNone(cached_fetch('k', fetcher, ttl_hours=1))
+
+        fetcher.assert_called_once()
+
+    @override_settings(API_CACHE_NEGATIVE_TTL_HOURS=0.5)
+    def test_negative_entries_use_the_short_ttl(self):
+        cached_fetch('k', mock.Mock(return_value=({}, {})), ttl_hours=24)
+
+        expires_at = APICache.objects.get(cache_key='k').expires_at
+        self.assertLess(expires_at, timezone.now() + timedelta(hours=1))
+
+    def test_other_errors_are_raised_and_not_cached(self):
+        fetcher = mock.Mock(side_effect=requests.ConnectionError())
+
+        with self.assertRaises(requests.ConnectionError):
+            cached_fetch('k', fetcher, ttl_hours=1)
+
+        self.assertIsNone(APICache.get_cached_data('k'))
+
+
+class CacheKeyTests(TestCase):
+
+    def test_parameter_order_does_not_matter(self):
+        self.assertEqual(
+            build_cache_key('tmdb', '/search/movie', {'query': 'Dune', 'page': 1}),
+            build_cache_key('tmdb', '/search/movie', {'page': 1, 'query': 'Dune'}),
+        )
+
+    def test_queries_are_normalized(self):
+        self.assertEqual(
+            build_cache_key('google_books', '/volumes', {'q': '  Les Misérables '}),
+            build_cache_key('google_books', '/volumes', {'q': 'les miserables'}),
+        )
+
+    def test_credentials_are_excluded(self):
+        key = build_cache_key('tmdb', '/movie/1', {'api_key': 'secret'})
+
+        self.assertEqual(key, build_cache_key('tmdb', '/movie/1'))
+        self.assertNotIn('secret', key)
+
+    def test_distinct_calls_get_distinct_keys(self):
+        self.assertNotEqual(
+            build_cache_key('tmdb', '/movie/1'),
+            build_cache_key('tmdb', '/movie/2'),
+        )
+
+    def test_legacy_keys_are_purged(self):
+        migration = import_module('core.migrations.0005_apicache_canonical_keys')
+        expires_at = timezone.now() + timedelta(hours=1)
+        legacy_key = 'tmdb_' + '0' * 32
+        current_key = build_cache_key('tmdb', '/movie/1')
+        for cache_key in (legacy_key, current_key, 'google_books:popular_snapshot'):
+            APICache.objects.create(cache_key=cache_key, data={}, expires_at=expires_at)
+
+        migration.purge_legacy_cache_keys(apps, None)
+
+        self.assertEqual(
+            set(APICache.objects.values_list('cache_key', flat=True)),
+            {current_key, 'google_books:popular_snapshot'}
+        )
+
+
+class BatchLookupTests(APICacheTestCase):
+
+    def test_get_many_returns_fresh_and_negative_entries_only(self):
+        APICache.set_many({'a': {'v': 1}, 'b': {'v': 2}})
+        APICache.set_negative('c')
+        self.expire('b')
+
+        found = APICache.get_many(['a', 'b', 'c', 'd'])
+
+        self.assertEqual(found, {'a': {'v': 1}, 'c': APICache.NEGATIVE})
+
+    def test_get_many_reads_the_backend_once(self):
+        APICache.set_many({'a': {'v': 1}, 'b': {'v': 2}})
+        APICache.local_cache().clear()
+
+        with self.assertNumQueries(1):
+            APICache.get_many(['a', 'b', 'c'])
+        with self.assertNumQueries(0):
+            self.assertEqual(APICache.get_cached_data('b'), {'v': 2})
+
+    def test_set_many_overwrites_existing_rows(self):
+        APICache.set_cached_data('a', {'v': 1})
+
+        APICache.set_many({'a': {'v': 2}, 'b': {'v': 3}})
+        APICache.local_cache().clear()
+
+        self.assertEqual(APICache.get_many(['a', 'b']), {'a': {'v': 2}, 'b': {'v': 3}})
+
+
+class PurgeExpiredTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        for i in range(5):
+            APICache.objects.create(cache_key=f'old{i}', data={}, expires_at=now - timedelta(days=2))
+        # Expirée mais encore dans la fenêtre stale-while-revalidate
+        APICache.objects.create(cache_key='stale', data={}, expires_at=now - timedelta(hours=1))
+        APICache.objects.create(cache_key='fresh', data={}, expires_at=now + timedelta(hours=1))
+
+    def remaining_keys(self):
+        return set(APICache.objects.values_list('cache_key', flat=True))
+
+    def test_purges_rows_past_the_stale_window(self):
+        self.assertEqual(APICache.purge_expired(batch_size=2), 5)
+        self.assertEqual(self.remaining_keys(), {'stale', 'fresh'})
+
+    def test_max_batches_bounds_the_work(self):
+        self.assertEqual(APICache.purge_expired(batch_size=2, max_batches=1), 2)
+        self.assertEqual(len(self.remaining_keys()), 5)
+
+    def test_management_command(self):
+        out = StringIO()
+
+        call_command('purge_api_cache', '--batch-size', '2', stdout=out)
+
+        self.assertIn('5 entrées expirées supprimées', out.getvalue())
+        self.assertEqual(self.remaining_keys(), {'stale', 'fresh'})
+
+
+class CacheCodecTests(APICacheTestCase):
+
+    DATA = {'title': 'Les Misérables', 'ids': [1, 2, 3], 'rating': 4.5, 'cover': None}
+
+    def assertRoundTrips(self, encoding):
+        self.assertEqual(cache_codecs.decode(cache_codecs.encode(self.DATA, encoding), encoding), self.DATA)
+
+    def test_json_round_trip(self):
+        self.assertRoundTrips(cache_codecs.JSON_FIELD)
+
+    def test_zlib_json_round_trip(self):
+        self.assertRoundTrips('zlib+json')
+
+    @skipUnless(cache_codecs.msgpack, 'msgpack not installed')
+    def test_zlib_msgpack_round_trip(self):
+        self.assertRoundTrips('zlib+msgpack')
+
+    @skipUnless(cache_codecs.zstandard, 'zstandard not installed')
+    def test_zstd_json_round_trip(self):
+        self.assertRoundTrips('zstd+json')
+
+    @skipUnless(cache_codecs.zstandard and cache_codecs.msgpack, 'zstandard or msgpack not installed')
+    def test_zstd_msgpack_round_trip(self):
+        self.assertRoundTrips('zstd+msgpack')
+
+    def test_unavailable_encoding_falls_back_to_zlib_json(self):
+        self.assertEqual(cache_codecs.resolve_encoding('lz4+json'), 'zlib+json')
+        self.assertEqual(cache_codecs.resolve_encoding(''), cache_codecs.JSON_FIELD)
+
+    @override_settings(API_CACHE_ENCODING='zlib+json')
+    def test_compressed_rows_are_read_back(self):
+        APICache.set_cached_data('k', self.DATA)
+        APICache.local_cache().clear()
+
+        row = APICache.objects.get(cache_key='k')
+        self.assertIsNone(row.data)
+        self.assertEqual(row.encoding, 'zlib+json')
+        self.assertEqual(APICache.get_cached_data('k'), self.DATA)
+
+    def test_rows_in_another_encoding_stay_readable(self):
+        with override_settings(API_CACHE_ENCODING='zlib+json'):
+            APICache.set_cached_data('k', self.DATA)
+        APICache.local_cache().clear()
+
+        self.assertEqual(APICache.get_cached_data('k'), self.DATA)
+
+
+class FakeRedis:
+    """Sous-ensemble des commandes Redis utilisées par RedisCacheBackend, en mémoire"""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    def set(self, key, value, px=None):
+        self.values[key] = value
+        self.ttls[key] = px
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def execute(self):
+        return []
+
+
+class RedisCacheBackendTests(APICacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.database = cache_backends.DatabaseCacheBackend(APICache)
+
+    def backend(self, client):
+        return cache_backends.RedisCacheBackend(client, fallback=self.database, keep_after_expiry=timedelta(hours=1))
+
+    def broken_client(self):
+        client = mock.Mock()
+        client.mget.side_effect = ConnectionError('down')
+        client.pipeline.side_effect = ConnectionError('down')
+        return client
+
+    def test_round_trip_with_native_ttl(self):
+        client = FakeRedis()
+        backend = self.backend(client)
+        expires_at = timezone.now() + timedelta(hours=2)
+
+        backend.set_many({'a': {'v': 1}, 'b': [1, 2]}, expires_at)
+
+        self.assertEqual(backend.get_many(['a', 'b', 'c']), {'a': ({'v': 1}, expires_at), 'b': ([1, 2], expires_at)})
+        # Conservée au-delà de l'expiration pendant la fenêtre stale-while-revalidate
+        self.assertGreater(client.ttls['apicache:a'], 2.9 * 3600 * 1000)
+        self.assertFalse(APICache.objects.exists())
+
+    @override_settings(API_CACHE_ENCODING='zlib+json')
+    def test_compressed_values_are_read_back(self):
+        backend = self.backend(FakeRedis())
+        expires_at = timezone.now() + timedelta(hours=1)
+
+        backend.set('a', {'v': 1}, expires_at)
+
+        self.assertEqual(backend.get('a'), ({'v': 1}, expires_at))
+
+    def test_falls_back_to_the_database_when_redis_fails(self):
+        backend = self.backend(self.broken_client())
+        expires_at = timezone.now() + timedelta(hours=1)
+
+        backend.set('a', {'v': 1}, expires_at)
+
+        self.assertTrue(APICache.objects.filter(cache_key='a').exists())
+        self.assertEqual(backend.get('a'), ({'v': 1}, expires_at))
+
+    @override_settings(API_CACHE_BACKEND='redis')
+    def test_database_is_used_without_a_redis_url(self):
+        with mock.patch.object(cache_backends, 'get_redis', return_value=None):
+            self.assertIsInstance(cache_backends.get_backend(APICache), cache_backends.DatabaseCacheBackend)
+
+    @override_settings(API_CACHE_BACKEND='redis')
+    def test_redis_backend_is_selected(self):
+        with mock.patch.object(cache_backends, 'get_redis', return_value=FakeRedis()):
+            backend = cache_backends.get_backend(APICache)
+
+        self.assertIsInstance(backend, cache_backends.RedisCacheBackend)
+        self.assertIsInstance(backend.fallback, cache_backends.DatabaseCacheBackend)
+
+
+class TTLPolicyTests(TestCase):
+
+    def test_stable_catalogue_data_is_kept_longer_than_feeds(self):
+        self.assertEqual(get_ttl_hours('tmdb', '/movie/550'), 3 * DAY)
+        self.assertEqual(get_ttl_hours('tmdb', '/trending/movie/week'), HOUR)
+        self.assertEqual(get_ttl_hours('spotify', '/browse/new-releases'), 0.25 * HOUR)
+
+    def test_query_prefix_rules(self):
+        self.assertEqual(get_ttl_hours('google_books', '/volumes', {'q': 'isbn:9782070360024'}), 30 * DAY)
+        self.assertEqual(get_ttl_hours('google_books', '/volumes', {'q': 'dune'}), 12 * HOUR)
+
+    def test_unknown_endpoint_uses_the_provider_default(self):
+        self.assertEqual(get_ttl_hours('tmdb', '/configuration'), 6)
+        self.assertEqual(get_ttl_hours('other', '/anything'), 24)
+
+    @override_settings(API_CACHE_TTL_OVERRIDES=[('tmdb', r'^/movie/\d+$', None, 1)])
+    def test_overrides_take_precedence(self):
+        self.assertEqual(get_ttl_hours('tmdb', '/movie/550'), 1)
+        self.assertEqual(get_ttl_hours('tmdb', '/tv/1399'), 3 * DAY)
+
+
+class ConditionalRevalidationTests(APICacheTestCase):
+
+    def test_validators_become_conditional_headers(self):
+        self.assertEqual(
+            conditional_headers({'etag': '"a"', 'last_modified': 'Wed, 01 Oct 2025 10:00:00 GMT'}),
+            {'If-None-Match': '"a"', 'If-Modified-Since': 'Wed, 01 Oct 2025 10:00:00 GMT'}
+        )
+        self.assertEqual(conditional_headers(None), {})
+
+    def test_not_modified_extends_the_entry_without_a_validators_row(self):
+        fetcher = mock.Mock(return_value=({'v': 1}, {'etag': '"a"'}))
+        cached_fetch('k', fetcher, ttl_hours=1)
+        self.expire('k', seconds_ago=1)
+
+        fetcher.side_effect = NotModified()
+        data = cached_fetch('k', fetcher, ttl_hours=1)
+
+        self.assertEqual(data, {'v': 1})
+        fetcher.assert_called_with({'etag': '"a"'})
+        self.assertEqual(list(APICache.objects.values_list('cache_key', flat=True)), ['k'])
+        self.assertFalse(APICache.is_expired('k'))
+
+    def test_changed_response_replaces_data_and_validators(self):
+        fetcher = mock.Mock(return_value=({'v': 1}, {'etag': '"a"'}))
+        cached_fetch('k', fetcher, ttl_hours=1)
+        self.expire('k', seconds_ago=1)
+
+        fetcher.return_value = ({'v': 2}, {'etag': '"b"'})
+        self.assertEqual(cached_fetch('k', fetcher, ttl_hours=1), {'v': 2})
+
+        self.assertEqual(APICache.lookup('k').validators, {'etag': '"b"'})
+
+    def test_entries_without_validators_are_stored_as_is(self):
+        cached_fetch('k', mock.Mock(return_value=({'v': 1}, {})), ttl_hours=1)
+
+        self.assertEqual(APICache.objects.get(cache_key='k').data, {'v': 1})
+
+
+class MetricsTests(APICacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        self.labels = metrics.labels('tmdb', '/movie/550')
+
+    def test_endpoint_templates_drop_identifiers(self):
+        self.assertEqual(metrics.endpoint_template('/movie/550/similar'), '/movie/{id}/similar')
+        self.assertEqual(metrics.endpoint_template('/tracks/4uLU6hMCjMI75M1A2tKUQC'), '/tracks/{id}')
+        self.assertEqual(metrics.endpoint_template('/search/multi'), '/search/multi')
+
+    def test_cached_fetch_counts_misses_hits_and_latency(self):
+        fetcher = mock.Mock(return_value=({'v': 1}, {}))
+        cached_fetch('k', fetcher, ttl_hours=1, metric_labels=self.labels)
+        cached_fetch('k', fetcher, ttl_hours=1, metric_labels=self.labels)
+
+        endpoint, = metrics.registry.snapshot()['endpoints']
+        self.assertEqual(endpoint['endpoint'], '/movie/{id}')
+        self.assertEqual(endpoint['counters']['miss'], 1)
+        self.assertEqual(endpoint['counters']['hit'], 1)
+        self.assertEqual(endpoint['hit_ratio'], 0.5)
+        self.assertEqual(endpoint['upstream_latency']['count'], 1)
+
+    def test_upstream_errors_are_counted(self):
+        with self.assertRaises(requests.ConnectionError):
+            cached_fetch('k', mock.Mock(side_effect=requests.ConnectionError()), ttl_hours=1,
+                         metric_labels=self.labels)
+
+        self.assertEqual(metrics.registry.snapshot()['endpoints'][0]['counters']['upstream_error'], 1)
+
+    def test_prometheus_exposition(self):
+        metrics.registry.incr(self.labels, metrics.HIT)
+        metrics.registry.observe_latency(self.labels, 0.2)
+
+        text = metrics.registry.prometheus()
+
+        self.assertIn('api_cache_events_total{provider="tmdb",endpoint="/movie/{id}",event="hit"} 1', text)
+        self.assertIn('api_upstream_latency_seconds_bucket{provider="tmdb",endpoint="/movie/{id}",le="0.25"} 1', text)
+
+
+class MetricsEndpointTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.url = reverse('api_cache_metrics')
+
+    def test_local_requests_are_allowed(self):
+        response = self.client.get(self.url, REMOTE_ADDR='127.0.0.1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('endpoints', response.json())
+
+    def test_remote_requests_are_refused(self):
+        response = self.client.get(self.url, REMOTE_ADDR='203.0.113.5')
+
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_staff_is_allowed_from_anywhere(self):
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+
+        response = self.client.get(self.url, {'output': 'prometheus'}, REMOTE_ADDR='203.0.113.5')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE api_cache_events_total counter', response.content.decode())
+
+
+class HTTPSessionTests(TestCase):
+
+    def setUp(self):
+        http_client.reset_sessions()
+        self.addCleanup(http_client.reset_sessions)
+
+    def test_one_session_per_host(self):
+        session = http_client.get_session('https://api.themoviedb.org/3/movie/1')
+
+        self.assertIs(http_client.get_session('https://api.themoviedb.org/3/search/movie'), session)
+        self.assertIsNot(http_client.get_session('https://api.spotify.com/v1/search'), session)
+
+    @override_settings(API_HTTP_POOL_MAXSIZE=7)
+    def test_pool_size_comes_from_settings(self):
+        adapter = http_client.get_session('https://api.themoviedb.org/3').get_adapter('https://api.themoviedb.org/3')
+
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.total, 0)
+
+    def test_sessions_are_not_shared_with_a_forked_child(self):
+        session = http_client.get_session('https://api.themoviedb.org/3')
+
+        with mock.patch.object(http_client, '_pid', -1), \
+                mock.patch.object(http_client, 'reset_redis') as reset_redis:
+            child_session = http_client.get_session('https://api.themoviedb.org/3')
+
+        self.assertIsNot(child_session, session)
+        reset_redis.assert_called_once()
+
+    def test_services_are_shared_per_process(self):
+        reset_services()
+        self.addCleanup(reset_services)
+
+        self.assertIs(get_service(TMDBService), get_service(TMDBService))
+
+
+class FanOutTests(TestCase):
+
+    def setUp(self):
+        # Pool recréé avec les réglages du test
+        fan_out._executor = None
+        self.addCleanup(setattr, fan_out, '_executor', None)
+
+    def test_results_errors_and_late_tasks(self):
+        def fail():
+            raise ValueError('upstream')
+
+        results, missing = fan_out.run_parallel([
+            ('fast', lambda: 'ok'),
+            ('failed', fail),
+            ('slow', lambda: time.sleep(0.5)),
+        ], timeout=0.2)
+
+        self.assertEqual(results, {'fast': 'ok'})
+        self.assertEqual(missing, ['failed', 'slow'])
+
+    @override_settings(API_FAN_OUT_MAX_WORKERS=1, API_FAN_OUT_MAX_QUEUE=1)
+    def test_queued_tasks_are_cancelled_at_the_deadline(self):
+        started = threading.Event()
+
+        results, missing = fan_out.run_parallel([
+            ('slow', lambda: started.set() or time.sleep(0.3)),
+            ('queued', lambda: 'never'),
+            ('shed', lambda: 'never'),
+        ], timeout=0.1)
+
+        self.assertTrue(started.is_set())
+        self.assertEqual(results, {})
+        self.assertEqual(missing, ['slow', 'queued', 'shed'])
+        self.assertEqual(fan_out._queued, 0)
+
+
+@override_settings(API_FAN_OUT_TIMEOUT_SECONDS=0.2)
+class ExternalSearchTests(TestCase):
+
+    def setUp(self):
+        fan_out._executor = None
+        self.addCleanup(setattr, fan_out, '_executor', None)
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(User.objects.create_user('reader'))
+
+    def test_slow_provider_is_reported_missing(self):
+        book = {'external_id': 'b1', 'title': 'Dune'}
+        films = {'FILMS': [{'external_id': '1', 'title': 'Dune'}], 'SERIES': []}
+
+        with mock.patch.object(TMDBService, 'search_multi', return_value=films), \
+                mock.patch.object(SpotifyService, 'search_music', side_effect=lambda *args, **kwargs: time.sleep(0.5)), \
+                mock.patch.object(BooksService, 'search_books', return_value=[book]):
+            response = self.client.get(reverse('search_external'), {'q': 'dune', 'limit': 20})
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([item['external_id'] for item in body['results']], ['1', 'b1'])
+        self.assertEqual(body['missing_providers'], [{'source': 'spotify', 'category': 'MUSIQUE'}])
+
+
+TRENDING_MOVIES = {'results': [{'id': 550, 'title': 'Fight Club'}]}
+
+
+async def fast_tmdb(self, endpoint, params, validators=None):
+    return TRENDING_MOVIES, {}
+
+
+async def slow_tmdb(self, endpoint, params, validators=None):
+    await asyncio.sleep(1)
+    return TRENDING_MOVIES, {}
+
+
+# Appels asynchrones écrits en base depuis d'autres threads : transactions réelles
+@override_settings(API_FAN_OUT_TIMEOUT_SECONDS=0.3)
+class AsyncFetchTests(TransactionTestCase):
+
+    def setUp(self):
+        APICache.local_cache().clear()
+        self.addCleanup(APICache.local_cache().clear)
+        self.user = User.objects.create_user('reader')
+        self.factory = APIRequestFactory()
+
+    def request(self, path, params=None):
+        request = self.factory.get(path, params or {})
+        request.user = self.user
+        return request
+
+    def test_misses_are_fetched_asynchronously_and_the_code_replayed(self):
+        sync_fetcher = mock.Mock()
+
+        async def async_fetcher(validators):
+            return {'v': 1}, {}
+
+        def view():
+            try:
+                return cached_fetch('k', sync_fetcher, ttl_hours=1, async_fetcher=async_fetcher)
+            except FetchDeferred:
+                return None
+
+        self.assertEqual(async_to_sync(run_with_async_fetches)(view), {'v': 1})
+        sync_fetcher.assert_not_called()
+        self.assertEqual(APICache.get_cached_data('k'), {'v': 1})
+
+    def test_trending_view_returns_fetched_results(self):
+        with mock.patch.object(TMDBService, '_afetch', fast_tmdb):
+            response = async_to_sync(run_with_async_fetches)(
+                get_trending_external_response, self.request('/', {'category': 'FILMS'})
+            )
+
+        self.assertEqual([item['title'] for item in response.data['results']], ['Fight Club'])
+        self.assertEqual(response.data['missing_providers'], [])
+
+    def test_trending_view_reports_fetches_past_the_deadline(self):
+        with mock.patch.object(TMDBService, '_afetch', slow_tmdb), \
+                mock.patch.object(TMDBService, '_fetch') as sync_fetch:
+            response = async_to_sync(run_with_async_fetches)(
+                get_trending_external_response, self.request('/', {'category': 'FILMS'})
+            )
+
+        sync_fetch.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['missing_providers'], [{'source': 'tmdb', 'category': 'FILMS'}])
+
+    def test_similar_view_reports_fetches_past_the_deadline(self):
+        taste_list = List.objects.create(owner=self.user, name='Films', category=List.Category.FILMS)
+        item = ListItem.objects.create(list=taste_list, title='Fight Club', position=1)
+
+        with mock.patch.object(TMDBService, '_afetch', slow_tmdb):
+            response = async_to_sync(run_with_async_fetches)(
+                get_similar_suggestions_response, self.request('/'), item.id
+            )
+
+        self.assertEqual(response.data['suggestions'], [])
+        self.assertEqual(response.data['missing_providers'], [{'source': 'tmdb', 'category': 'FILMS'}])
+
+    def test_async_view(self):
+        request = self.factory.get('/', {'category': 'FILMS'})
+        force_authenticate(request, self.user)
+
+        with mock.patch.object(TMDBService, '_afetch', fast_tmdb):
+            response = async_to_sync(async_views.get_trending_external)(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 1)
+
+
+def http_response(status_code, json_data=None, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = json.dumps(json_data or {}).encode()
+    return response
+
+
+@override_settings(
+    API_RATE_LIMITS={'test': {'rate': 1, 'burst': 2}, 'spotify': {'rate': 1, 'burst': 2}},
+    API_RATE_LIMIT_MAX_WAIT_SECONDS=0,
+    API_RATE_LIMIT_BULK_MAX_WAIT_SECONDS=0,
+    API_RATE_LIMIT_BULK_RESERVE=0.5,
+)
+class RateLimitTests(APICacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        rate_limit._local_buckets.clear()
+        self.addCleanup(rate_limit._local_buckets.clear)
+
+    def test_calls_beyond_the_burst_are_rejected(self):
+        rate_limit.acquire('test')
+        rate_limit.acquire('test')
+
+        with self.assertRaises(rate_limit.RateLimited):
+            rate_limit.acquire('test')
+
+    def test_bulk_calls_leave_a_reserve_for_interactive_calls(self):
+        with rate_limit.bulk_priority():
+            rate_limit.acquire('test')
+            with self.assertRaises(rate_limit.RateLimited):
+                rate_limit.acquire('test')
+
+        rate_limit.acquire('test')
+
+    def test_retry_after_pauses_the_provider(self):
+        rate_limit.observe('test', 429, {'Retry-After': '30'})
+
+        with self.assertRaises(rate_limit.RateLimited):
+            rate_limit.acquire('test')
+
+    def test_retry_after_accepts_http_dates(self):
+        self.assertEqual(rate_limit.retry_after_seconds('Wed, 01 Jan 2020 00:00:00 GMT'), 0)
+        self.assertEqual(rate_limit.retry_after_seconds(None), 1.0)
+
+    def test_unlimited_provider_is_not_throttled(self):
+        for _ in range(10):
+            rate_limit.acquire('other')
+
+    def test_429_raises_rate_limited_and_pauses_the_provider(self):
+        session = mock.Mock()
+        session.get.return_value = http_response(429, headers={'Retry-After': '30'})
+
+        with mock.patch.object(http_client, 'get_session', return_value=session):
+            with self.assertRaises(rate_limit.RateLimited):
+                http_client.get_json('https://example.invalid/x', provider='test')
+
+        with self.assertRaises(rate_limit.RateLimited):
+            rate_limit.acquire('test')
+
+    def test_async_429_raises_rate_limited(self):
+        transport = httpx.MockTransport(lambda request: httpx.Response(429, headers={'Retry-After': '30'}))
+
+        async def get_json():
+            async with httpx.AsyncClient(transport=transport) as client:
+                with mock.patch.object(async_http, '_client', return_value=client):
+                    return await async_http.get_json('https://example.invalid/x', provider='test')
+
+        with self.assertRaises(rate_limit.RateLimited):
+            async_to_sync(get_json)()
+
+    def test_spotify_429_returns_no_demo_data(self):
+        spotify = SpotifyService()
+        spotify.client_id = 'configured'
+        session = mock.Mock()
+        session.get.return_value = http_response(429, headers={'Retry-After': '30'})
+
+        with mock.patch.object(spotify, '_get_access_token', return_value='token'), \
+                mock.patch.object(http_client, 'get_session', return_value=session):
+            self.assertEqual(spotify.search_music('dune'), [])
+            self.assertEqual(spotify.search_music('dune'), [])
+
+        session.get.assert_called_once()
+
+
+@override_settings(
+    API_CIRCUIT_MIN_CALLS=2,
+    API_CIRCUIT_FAILURE_RATE=0.5,
+    API_CIRCUIT_OPEN_SECONDS=0.2,
+    API_CIRCUIT_WINDOW_SECONDS=60,
+)
+class CircuitBreakerTests(APICacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        circuit_breaker._local_circuits.clear()
+        self.addCleanup(circuit_breaker._local_circuits.clear)
+
+    def trip(self):
+        circuit_breaker.record('test', failed=True)
+        circuit_breaker.record('test', failed=True)
+
+    def test_opens_after_failures_and_closes_after_a_successful_probe(self):
+        self.trip()
+        with self.assertRaises(circuit_breaker.CircuitOpen):
+            circuit_breaker.before_call('test')
+
+        time.sleep(0.25)
+        circuit_breaker.before_call('test')
+        # Un seul appel d'essai à la fois
+        with self.assertRaises(circuit_breaker.CircuitOpen):
+            circuit_breaker.before_call('test')
+
+        circuit_breaker.record('test', failed=False)
+        self.assertEqual(circuit_breaker.state('test'), circuit_breaker.CLOSED)
+
+    def test_failed_probe_reopens_the_circuit(self):
+        self.trip()
+        time.sleep(0.25)
+        circuit_breaker.before_call('test')
+
+        circuit_breaker.record('test', failed=True)
+
+        self.assertEqual(circuit_breaker.state('test'), circuit_breaker.OPEN)
+
+    def test_slow_calls_count_as_failures(self):
+        with override_settings(API_CIRCUIT_SLOW_CALL_SECONDS=1):
+            circuit_breaker.record_response('test', 200, elapsed=2)
+            circuit_breaker.record_response('test', 200, elapsed=2)
+
+        self.assertEqual(circuit_breaker.state('test'), circuit_breaker.OPEN)
+
+    def test_rate_limited_call_does_not_claim_the_probe(self):
+        self.trip()
+        time.sleep(0.25)
+
+        with mock.patch.object(rate_limit, 'acquire', side_effect=rate_limit.RateLimited()), \
+                mock.patch.object(http_client, 'get_session') as get_session:
+            with self.assertRaises(rate_limit.RateLimited):
+                http_client.get_json('https://example.invalid/x', provider='test')
+
+        get_session.assert_not_called()
+        circuit_breaker.before_call('test')
+
+    def test_open_circuit_serves_the_last_known_copy(self):
+        APICache.set_cached_data('k', {'v': 1})
+        self.expire('k')
+        fetcher = mock.Mock(side_effect=circuit_breaker.CircuitOpen())
+
+        self.assertEqual(cached_fetch('k', fetcher, ttl_hours=1), {'v': 1})
+
+    def test_open_spotify_circuit_returns_no_demo_data(self):
+        spotify = SpotifyService()
+        spotify.client_id = 'configured'
+
+        with mock.patch.object(spotify, '_get_access_token', return_value='token'), \
+                mock.patch.object(circuit_breaker, 'before_call', side_effect=circuit_breaker.CircuitOpen()):
+            self.assertEqual(spotify.search_music('dune'), [])
+
+    def test_states_are_exposed_for_prometheus(self):
+        self.trip()
+
+        self.assertIn('api_circuit_state{provider="test",state="open"} 1', circuit_breaker.prometheus())
+
+
+class AccessTokenManagerTests(APICacheTestCase):
+
+    def manager(self, *tokens):
+        """Gestionnaire dont les demandes successives retournent tokens ((jeton, validité) ou exception)"""
+        return AccessTokenManager('test:token', mock.Mock(side_effect=tokens))
+
+    def test_token_is_kept_in_memory(self):
+        manager = self.manager(('token1', 3600))
+        self.assertEqual(manager.get(), 'token1')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(manager.get(), 'token1')
+        manager.request_token.assert_called_once()
+
+    def test_token_is_refreshed_before_it_expires(self):
+        # Validité plus courte que la marge de renouvellement anticipé
+        manager = self.manager(('token1', 200), ('token2', 3600))
+        manager.get()
+
+        self.assertEqual(manager.get(), 'token2')
+        self.assertEqual(manager.get(), 'token2')
+        self.assertEqual(manager.request_token.call_count, 2)
+
+    def test_failed_refresh_keeps_the_valid_token_and_waits_before_retrying(self):
+        manager = self.manager(('token1', 200), requests.ConnectionError(), ('token2', 3600))
+        manager.get()
+
+        self.assertEqual(manager.get(), 'token1')
+        self.assertEqual(manager.get(), 'token1')
+        self.assertEqual(manager.request_token.call_count, 2)
+
+    def test_expired_token_is_not_returned(self):
+        manager = self.manager(('token1', 200), requests.ConnectionError())
+        manager.get()
+        manager._expires_at = time.time() - 1
+
+        self.assertIsNone(manager.get())
+
+    def test_token_is_shared_between_workers(self):
+        self.manager(('token1', 3600)).get()
+        other_worker = self.manager()
+        APICache.local_cache().clear()
+
+        self.assertEqual(other_worker.get(), 'token1')
+        other_worker.request_token.assert_not_called()
+
+
+class SpotifyBatchLookupTests(APICacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.spotify = SpotifyService()
+        self.spotify.client_id = 'configured'
+        token = mock.patch.object(self.spotify, '_get_access_token', return_value='token')
+        token.start()
+        self.addCleanup(token.stop)
+
+    def test_only_missing_ids_are_fetched_in_one_batch(self):
+        APICache.set_cached_data(self.spotify.cache_key('/tracks/t1'), {'id': 't1', 'name': 'Cached'})
+        response = {'tracks': [{'id': 't2', 'name': 'Fetched'}, None]}
+
+        with mock.patch.object(self.spotify, '_fetch', return_value=(response, {})) as fetch:
+            details = self.spotify.get_tracks_details(['t1', 't2', 't3', 't1'])
+
+        fetch.assert_called_once_with('/tracks', {'ids': 't2,t3'})
+        self.assertEqual({item_id: item['title'] for item_id, item in details.items()}, {'t1': 'Cached', 't2': 'Fetched'})
+        self.assertIs(APICache.get_cached_data(self.spotify.cache_key('/tracks/t3')), APICache.NEGATIVE)
+
+    def test_batched_items_are_shared_with_single_lookups(self):
+        response = {'albums': [{'id': 'a1', 'name': 'Album'}]}
+        with mock.patch.object(self.spotify, '_fetch', return_value=(response, {})):
+            self.spotify.get_albums_details(['a1'])
+
+        with mock.patch.object(self.spotify, '_fetch') as fetch:
+            self.assertEqual(self.spotify.get_album_details('a1')['title'], 'Album')
+        fetch.assert_not_called()
+
+    def test_ids_are_split_by_the_endpoint_limit(self):
+        ids = [f'a{i}' for i in range(SpotifyService.BATCH_SIZES['albums'] + 1)]
+        responses = [({'albums': []}, {}), ({'albums': []}, {})]
+
+        with mock.patch.object(self.spotify, '_fetch', side_effect=responses) as fetch:
+            self.spotify.get_albums_details(ids)
+
+        self.assertEqual(fetch.call_count, 2)
+
+
+class TMDBTitleTests(APICacheTestCase):
+
+    TITLE = {
+        'id': 550,
+        'title': 'Fight Club',
+        'credits': {'cast': [{'name': 'Brad Pitt'}], 'crew': [{'name': 'David Fincher', 'job': 'Director'}]},
+        'similar': {'results': [{'id': 807, 'title': 'Se7en'}]},
+        'recommendations': {'results': [{'id': 680, 'title': 'Pulp Fiction'}]},
+    }
+
+    def test_details_similar_and_recommendations_share_one_call(self):
+        tmdb = TMDBService()
+
+        with mock.patch.object(tmdb, '_fetch', return_value=(self.TITLE, {})) as fetch:
+            details = tmdb.get_movie_details(550)
+            similar = tmdb.get_similar_movies(550)
+            recommendations = tmdb.get_recommendations_movies(550)
+
+        fetch.assert_called_once()
+        endpoint, params = fetch.call_args.args[:2]
+        self.assertEqual(endpoint, '/movie/550')
+        self.assertEqual(params['append_to_response'], 'similar,recommendations,credits')
+        self.assertEqual(details['cast'], ['Brad Pitt'])
+        self.assertEqual(details['directors'], ['David Fincher'])
+        self.assertEqual([movie['title'] for movie in similar], ['Se7en'])
+        self.assertEqual([movie['title'] for movie in recommendations], ['Pulp Fiction'])
+
+    def test_title_uses_the_shortest_ttl_of_its_parts(self):
+        tmdb = TMDBService()
+
+        with mock.patch.object(tmdb, '_fetch', return_value=(self.TITLE, {})):
+            tmdb.get_movie_details(550)
+
+        expires_at = APICache.objects.get().expires_at
+        self.assertLess(expires_at, timezone.now() + timedelta(hours=get_ttl_hours('tmdb', '/movie/550') - 1))
+
+
+class TMDBMultiSearchTests(APICacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmdb = TMDBService()
+
+    def test_films_and_series_come_from_one_call(self):
+        response = {'results': [
+            {'media_type': 'movie', 'id': 1, 'title': 'Dune'},
+            {'media_type': 'person', 'id': 2, 'name': 'Denis Villeneuve'},
+            {'media_type': 'tv', 'id': 3, 'name': 'Dune: Prophecy'},
+        ]}
+
+        with mock.patch.object(self.tmdb, '_fetch', return_value=(response, {})) as fetch:
+            results = self.tmdb.search_multi('dune')
+
+        fetch.assert_called_once()
+        self.assertEqual(fetch.call_args.args[0], '/search/multi')
+        self.assertEqual([movie['external_id'] for movie in results['FILMS']], ['1'])
+        self.assertEqual([show['external_id'] for show in results['SERIES']], ['3'])
+
+    def test_failed_multi_search_falls_back_to_separate_searches(self):
+        def fetch(endpoint, params, validators=None):
+            if endpoint == '/search/multi':
+                raise requests.ConnectionError()
+            if endpoint == '/search/movie':
+                return {'results': [{'id': 1, 'title': 'Dune'}]}, {}
+            return {'results': [{'id': 3, 'name': 'Dune: Prophecy'}]}, {}
+
+        with mock.patch.object(self.tmdb, '_fetch', side_effect=fetch):
+            results = self.tmdb.search_multi('dune')
+
+        self.assertEqual([movie['external_id'] for movie in results['FILMS']], ['1'])
+        self.assertEqual([show['external_id'] for show in results['SERIES']], ['3'])
+
+    def test_search_without_results_does_not_fall_back(self):
+        with mock.patch.object(self.tmdb, '_fetch', return_value=({'results': []}, {})) as fetch:
+            self.assertEqual(self.tmdb.search_multi('zzzz'), {'FILMS': [], 'SERIES': []})
+
+        fetch.assert_called_once()
+
+
+class GoogleBooksFieldsTests(APICacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.books = BooksService()
+
+    def fetched_params(self, call):
+        with mock.patch.object(self.books, '_fetch', return_value=({}, {})) as fetch:
+            call()
+        return fetch.call_args.args[1]
+
+    def test_searches_request_a_partial_response(self):
+        self.assertEqual(self.fetched_params(lambda: self.books.search_books('dune'))['fields'], BooksService.SEARCH_FIELDS)
+        self.assertEqual(
+            self.fetched_params(lambda: self.books.get_book_details_by_isbn('9782266320481'))['fields'],
+            BooksService.SEARCH_FIELDS
+        )
+
+    def test_details_request_their_own_fields(self):
+        self.assertEqual(self.fetched_params(lambda: self.books.get_book_details('abc'))['fields'], BooksService.DETAIL_FIELDS)
+
+    def test_projection_covers_every_field_read_by_the_formatter(self):
+        source = inspect.getsource(BooksService._format_google_book)
+        read_fields = set(re.findall(r"volume_info(?:\.get\('|\[')(\w+)'", source))
+
+        self.assertTrue(read_fields)
+        self.assertLessEqual(read_fields, set(BooksService.VOLUME_INFO_FIELDS))
+
+    def test_partial_response_is_formatted(self):
+        response = {'totalItems': 1, 'items': [{'id': 'v1', 'volumeInfo': {'title': 'Dune', 'authors': ['Frank Herbert']}}]}
+
+        with mock.patch.object(self.books, '_fetch', return_value=(response, {})):
+            book, = self.books.search_books('dune')
+
+        self.assertEqual((book['external_id'], book['title'], book['authors']), ('v1', 'Dune', ['Frank Herbert']))
+
+
+@override_settings(POPULAR_BOOKS_SEED_QUERIES=['dune', 'fondation'])
+class PopularBooksSnapshotTests(APICacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.books = BooksService()
+
+    def search(self, url, params, validators=None):
+        title = params['q'].title()
+        return {'totalItems': 1, 'items': [{'id': params['q'], 'volumeInfo': {'title': title}}]}, {}
+
+    def test_snapshot_is_built_from_the_seed_queries(self):
+        with mock.patch.object(self.books, '_fetch', side_effect=self.search):
+            snapshot = self.books.build_popular_snapshot()
+
+        self.assertEqual(snapshot['volume_ids'], ['dune', 'fondation'])
+        self.assertEqual(APICache.get_cached_data(BooksService.POPULAR_SNAPSHOT_KEY)['volume_ids'], ['dune', 'fondation'])
+
+    def test_snapshot_is_served_with_one_read(self):
+        with mock.patch.object(self.books, '_fetch', side_effect=self.search):
+            self.books.build_popular_snapshot()
+        APICache.local_cache().clear()
+
+        with mock.patch.object(self.books, '_fetch') as fetch, self.assertNumQueries(1):
+            books = self.books.get_popular_books(limit=1)
+
+        fetch.assert_not_called()
+        self.assertEqual([book['title'] for book in books], ['Dune'])
+
+    def test_missing_snapshot_is_rebuilt_in_the_background(self):
+        with mock.patch.object(books_service, 'schedule_refresh') as schedule_refresh, \
+                mock.patch.object(self.books, '_fetch', side_effect=self.search):
+            books = self.books.get_popular_books()
+
+        self.assertEqual([book['title'] for book in books], ['Dune', 'Fondation'])
+        schedule_refresh.assert_called_once_with(BooksService.POPULAR_SNAPSHOT_KEY, self.books.build_popular_snapshot)
+
+    def test_failed_rebuild_keeps_the_previous_snapshot(self):
+        with mock.patch.object(self.books, '_fetch', side_effect=self.search):
+            self.books.build_popular_snapshot()
+
+        with mock.patch.object(self.books, '_fetch', side_effect=requests.ConnectionError()):
+            APICache.objects.filter(cache_key__startswith='google_books:v').delete()
+            APICache.local_cache().clear()
+            self.assertIsNone(self.books.build_popular_snapshot())
+
+        self.assertEqual(len(self.books.get_popular_books()), 2)
+
+    def test_management_command(self):
+        out = StringIO()
+
+        with mock.patch.object(BooksService, '_fetch', side_effect=self.search):
+            call_command('build_popular_books_snapshot', stdout=out)
+
+        self.assertIn('2 livres enregistrés', out.getvalue())
+
+
+class SpotifyTypeResolutionTests(APICacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.spotify = SpotifyService()
+        self.spotify.client_id = 'configured'
+
+    def test_ids_are_parsed_from_uris_and_links(self):
+        self.assertEqual(self.spotify.parse_id('spotify:album:abc123'), ('album', 'abc123'))
+        self.assertEqual(self.spotify.parse_id('https://open.spotify.com/track/abc123?si=x'), ('track', 'abc123'))
+        self.assertEqual(self.spotify.parse_id(' abc123 '), (None, 'abc123'))
+
+    def test_search_results_are_indexed_in_memory_only(self):
+        response = {'albums': {'items': [{'id': 'album1', 'name': 'Album'}]}}
+
+        with mock.patch.object(self.spotify, '_make_request', return_value=response):
+            self.spotify.search_albums('album')
+
+        self.assertFalse(APICache.objects.exists())
+        with self.assertNumQueries(0):
+            self.assertEqual(self.spotify.resolve_type('album1'), 'album')
+
+    def test_type_is_resolved_from_cached_details(self):
+        APICache.set_cached_data(self.spotify.cache_key('/artists/artist1'), {'id': 'artist1', 'name': 'Artist'})
+        APICache.local_cache().clear()
+
+        self.assertEqual(self.spotify.resolve_type('artist1'), 'artist')
+
+    def test_type_found_by_trial_is_indexed(self):
+        def make_request(endpoint, params=None, **kwargs):
+            return {'id': 'x1', 'name': 'Artist'} if endpoint == '/artists/x1' else None
+
+        with mock.patch.object(self.spotify, '_make_request', side_effect=make_request) as request:
+            self.assertEqual(self.spotify.get_details('x1')['type'], 'artist')
+
+        self.assertEqual([call.args[0] for call in request.call_args_list], ['/tracks/x1', '/artists/x1'])
+        self.assertEqual(APICache.get_cached_data('spotify:id_type:x1'), 'artist')
+        self.assertEqual(SpotifyService().resolve_type('x1'), 'artist')
+
+    def test_explicit_type_skips_resolution(self):
+        with mock.patch.object(self.spotify, '_make_request', return_value={'id': 'a1', 'name': 'Album'}) as request:
+            self.spotify.get_details('spotify:album:a1')
+
+        request.assert_called_once_with('/albums/a1')
+
+
+@override_settings(ENRICHMENT_ASYNC=False)
+class EnrichmentTaskTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('reader')
+        self.item = ListItem.objects.create(
+            title='Dune', position=1,
+            list=List.objects.create(owner=user, name='Livres', category=List.Category.LIVRES)
+        )
+
+    def enqueue(self, success):
+        with mock.patch('core.services.external_enrichment_service.ExternalEnrichmentService.enrich_list_item',
+                        return_value=success) as enrich, \
+                self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue_enrichment(self.item)
+        return enrich
+
+    def test_sync_mode_reports_the_final_status(self):
+        enrich = self.enqueue(success=True)
+
+        enrich.assert_called_once()
+        self.assertEqual(self.item.enrichment_status, ListItem.EnrichmentStatus.DONE)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.enrichment_status, ListItem.EnrichmentStatus.DONE)
+
+    def test_failed_enrichment_is_recorded(self):
+        self.enqueue(success=False)
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.enrichment_status, ListItem.EnrichmentStatus.FAILED)
+
+    @override_settings(ENRICHMENT_ASYNC=True)
+    def test_async_mode_queues_one_task_per_item(self):
+        with mock.patch.object(tasks.enrich_list_item, 'delay') as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue_enrichment(self.item)
+            tasks.enqueue_enrichment(self.item)
+
+        delay.assert_called_once_with(self.item.pk, False)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.enrichment_status, ListItem.EnrichmentStatus.PENDING)
+
+    @override_settings(ENRICHMENT_ASYNC=True)
+    def test_unreachable_broker_marks_the_item_failed(self):
+        with mock.patch.object(tasks.enrich_list_item, 'delay', side_effect=ConnectionError('broker down')), \
+                self.captureOnCommitCallbacks(execute=True):
+            tasks.enqueue_enrichment(self.item)
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.enrichment_status, ListItem.EnrichmentStatus.FAILED)
+
+    def test_task_runs_at_bulk_priority_and_clears_the_queue_marker(self):
+        priorities = []
+
+        def enrich(list_item, force_refresh=False):
+            priorities.append(rate_limit._priority.get())
+            return True
+
+        with mock.patch('core.services.external_enrichment_service.ExternalEnrichmentService.enrich_list_item',
+                        side_effect=enrich):
+            self.assertTrue(tasks.enrich_list_item(self.item.pk))
+
+        self.assertEqual(priorities, [rate_limit.BULK])
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.enrichment_status, ListItem.EnrichmentStatus.DONE)
+
+    def test_task_for_a_deleted_item_does_nothing(self):
+        item_id = self.item.pk
+        self.item.delete()
+
+        self.assertFalse(tasks.enrich_list_item(item_id))
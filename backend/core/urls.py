@@ -1,20 +1,26 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    health_check, register_user, get_user_profile, 
+    health_check, api_cache_metrics, register_user, get_user_profile, 
     ListViewSet, ListItemViewSet,
     search_items, get_suggestions, quick_add_item,
-    search_external, get_trending_external, enrich_list_item, 
+    search_external, get_trending_external, enrich_list_item, get_enrichment_status,
     import_from_external, get_external_details,
     get_trending_suggestions, get_similar_suggestions
 )
 
+if settings.API_ASYNC_VIEWS:
+    # Déploiement ASGI : vues des APIs externes asynchrones
+    from .async_views import search_external, get_trending_external, get_similar_suggestions
+
 router = DefaultRouter()
 router.register(r'lists', ListViewSet, basename='list')
 router.register(r'list-items', ListItemViewSet, basename='listitem')
 
 urlpatterns = [
     path('health/', health_check, name='health_check'),
+    path('metrics/api-cache/', api_cache_metrics, name='api_cache_metrics'),
     path('auth/register/', register_user, name='auth_register'),
     path('users/me/', get_user_profile, name='user_profile'),
     # Search and suggestions endpoints
@@ -27,6 +33,7 @@ urlpatterns = [
     path('import/external/', import_from_external, name='import_from_external'),
     path('external/<str:source>/<str:external_id>/', get_external_details, name='get_external_details'),
     path('lists/<int:list_pk>/items/<int:item_pk>/enrich/', enrich_list_item, name='enrich_list_item'),
+    path('lists/<int:list_pk>/items/<int:item_pk>/enrichment/', get_enrichment_status, name='enrichment_status'),
     # Nouveaux endpoints pour les suggestions enrichies
     path('suggestions/trending/<str:category>/', get_trending_suggestions, name='get_trending_suggestions'),
     path('suggestions/similar/<int:item_id>/', get_similar_suggestions, name='get_similar_suggestions'),
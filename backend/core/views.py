@@ -5,10 +5,16 @@ from rest_framework import status, viewsets, serializers
 from django.db import models
 from django.db.models import Q, Count
 from django.core.cache import cache
+from django.http import HttpResponse
 from .serializers import RegisterSerializer, ListSerializer, ListItemSerializer
 from .models import List, ListItem, ExternalReference
-from .permissions import IsOwnerOrReadOnly
+from .permissions import IsOwnerOrReadOnly, IsLocalOrStaff
 from .services.external_enrichment_service import ExternalEnrichmentService
+from .services.registry import get_service
+from .services.fan_out import run_parallel
+from .services.provider_cache import FetchIncomplete, complete_or_raise
+from .services import circuit_breaker, metrics
+from .tasks import enqueue_enrichment
 import json
 import hashlib
 import logging
@@ -26,6 +32,24 @@ def health_check(request):
         status=status.HTTP_200_OK
     )
 
+@api_view(['GET'])
+@permission_classes([IsLocalOrStaff])
+def api_cache_metrics(request):
+    """
+    Métriques du cache des APIs externes pour ce worker (hit/stale/miss, erreurs, latences)
+    et état des disjoncteurs des fournisseurs.
+    ?output=prometheus pour le format texte Prometheus.
+    Les compteurs sont propres au processus qui répond (champ pid) : avec plusieurs workers
+    derrière un même port, chaque appel montre un worker différent ; collecter les métriques
+    de chaque worker séparément ou lancer un seul worker.
+    """
+    if request.query_params.get('output') == 'prometheus':
+        return HttpResponse(
+            metrics.registry.prometheus() + circuit_breaker.prometheus(),
+            content_type='text/plain; version=0.0.4'
+        )
+    return Response({**metrics.registry.snapshot(), 'circuits': circuit_breaker.states()})
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_user(request):
@@ -173,15 +197,10 @@ class ListItemViewSet(viewsets.ModelViewSet):
             
             serializer.save()
 
-        # Enrichissement automatique après création (best-effort, non bloquant)
-        try:
-            created_item = serializer.instance
-            if created_item and created_item.list.category in ['FILMS', 'SERIES', 'MUSIQUE', 'LIVRES']:
-                enrichment_service = ExternalEnrichmentService()
-                enrichment_service.enrich_list_item(created_item, force_refresh=False)
-        except Exception:
-            # Ne pas bloquer la création en cas d'erreur d'enrichissement
-            pass
+        # Enrichissement automatique après création, planifié hors de la requête
+        created_item = serializer.instance
+        if created_item and created_item.list.category in ['FILMS', 'SERIES', 'MUSIQUE', 'LIVRES']:
+            enqueue_enrichment(created_item, force_refresh=False)
 
 
 @api_view(['GET'])
@@ -363,12 +382,8 @@ def quick_add_item(request):
             position=max_position + 1
         )
         
-        # Enrichissement automatique (best-effort)
-        try:
-            enrichment_service = ExternalEnrichmentService()
-            enrichment_service.enrich_list_item(new_item, force_refresh=False)
-        except Exception:
-            pass
+        # Enrichissement automatique, planifié hors de la requête
+        enqueue_enrichment(new_item, force_refresh=False)
 
         # Sérialiser la réponse
         serializer = ListItemSerializer(new_item)
@@ -530,7 +545,7 @@ def get_trending_external(request):
     limit = min(int(request.GET.get('limit', 20)), 50)
     
     try:
-        enrichment_service = ExternalEnrichmentService()
+        enrichment_service = get_service(ExternalEnrichmentService)
         results = enrichment_service.get_trending_content(category, limit)
         
         return Response({
@@ -562,7 +577,7 @@ def enrich_list_item(request, list_pk, item_pk):
         
         force_refresh = request.data.get('force_refresh', False)
         
-        enrichment_service = ExternalEnrichmentService()
+        enrichment_service = get_service(ExternalEnrichmentService)
         success = enrichment_service.enrich_list_item(list_item, force_refresh)
         
         if success:
@@ -600,6 +615,31 @@ def enrich_list_item(request, list_pk, item_pk):
         )
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_enrichment_status(request, list_pk, item_pk):
+    """
+    État de l'enrichissement d'un élément (planifié à sa création) et référence externe obtenue
+    """
+    try:
+        list_item = ListItem.objects.select_related('external_ref').get(
+            pk=item_pk,
+            list__pk=list_pk,
+            list__owner=request.user
+        )
+    except ListItem.DoesNotExist:
+        return Response(
+            {'error': 'Élément non trouvé ou vous n\'êtes pas le propriétaire'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    return Response({
+        'id': list_item.id,
+        'enrichment_status': list_item.enrichment_status,
+        'external_ref': ListItemSerializer(list_item).data['external_ref']
+    })
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def import_from_external(request):
@@ -635,8 +675,10 @@ def import_from_external(request):
         )
     
     try:
-        enrichment_service = ExternalEnrichmentService()
-        result = enrichment_service.import_from_external_id(external_id, source, category, request.user)
+        enrichment_service = get_service(ExternalEnrichmentService)
+        result = enrichment_service.import_from_external_id(
+            external_id, source, category, request.user, item_type=request.data.get('type')
+        )
         
         if result:
             list_item = result['list_item']
@@ -673,17 +715,15 @@ def get_external_details(request, source, external_id):
     Récupère les détails complets d'un élément externe
     """
     try:
-        enrichment_service = ExternalEnrichmentService()
+        enrichment_service = get_service(ExternalEnrichmentService)
         
         if source == 'tmdb':
             # Essayer film puis série
             details = (enrichment_service.tmdb.get_movie_details(external_id) or
                       enrichment_service.tmdb.get_tv_show_details(external_id))
         elif source == 'spotify':
-            # Essayer track puis artist puis album
-            details = (enrichment_service.spotify.get_track_details(external_id) or
-                      enrichment_service.spotify.get_artist_details(external_id) or
-                      enrichment_service.spotify.get_album_details(external_id))
+            # Type explicite (?type=), URI spotify:track:..., ou index des identifiants
+            details = enrichment_service.spotify.get_details(external_id, request.GET.get('type'))
         elif source in ['openlibrary', 'google_books']:
             details = enrichment_service.books.get_book_details_by_isbn(external_id)
         else:
@@ -721,7 +761,7 @@ def get_trending_suggestions(request, category):
     time_window = request.GET.get('time_window', 'week')
     
     try:
-        enrichment_service = ExternalEnrichmentService()
+        enrichment_service = get_service(ExternalEnrichmentService)
         results = enrichment_service.get_trending_content(category, limit)
         
         return Response({
@@ -738,12 +778,42 @@ def get_trending_suggestions(request, category):
         )
 
 
+# Fournisseur interrogé pour chaque catégorie (champ missing_providers des réponses)
+CATEGORY_SOURCES = {
+    'FILMS': 'tmdb',
+    'SERIES': 'tmdb',
+    'MUSIQUE': 'spotify',
+    'LIVRES': 'google_books',
+}
+
+
+def _complete_or_missing(fetch, category, missing_providers):
+    """
+    Résultat de fetch(). Sous une vue asynchrone, si des données ne sont pas arrivées
+    à l'échéance, le fournisseur de category est ajouté à missing_providers et le
+    résultat partiel est remplacé par une liste vide (comme dans search_external)
+    """
+    try:
+        return complete_or_raise(fetch)
+    except FetchIncomplete as e:
+        logger.debug(f"{category} results incomplete, waiting on {e}")
+        provider = {'source': CATEGORY_SOURCES[category], 'category': category}
+        if provider not in missing_providers:
+            missing_providers.append(provider)
+        return []
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_similar_suggestions(request, item_id):
     """
     Suggestions similaires basées sur un élément existant
     """
+    return get_similar_suggestions_response(request, item_id)
+
+
+def get_similar_suggestions_response(request, item_id):
+    """Corps de get_similar_suggestions, partagé avec sa version asynchrone (voir async_views)"""
     limit = min(int(request.GET.get('limit', 10)), 50)
     
     try:
@@ -754,8 +824,12 @@ def get_similar_suggestions(request, item_id):
         )
         
         # Utiliser la nouvelle méthode pour obtenir du contenu similaire
-        enrichment_service = ExternalEnrichmentService()
-        results = enrichment_service.get_similar_content(list_item, limit)
+        enrichment_service = get_service(ExternalEnrichmentService)
+        missing_providers = []
+        results = _complete_or_missing(
+            lambda: enrichment_service.get_similar_content(list_item, limit),
+            list_item.list.category, missing_providers
+        )
         
         return Response({
             'suggestions': results,
@@ -764,7 +838,8 @@ def get_similar_suggestions(request, item_id):
                 'title': list_item.title,
                 'category': list_item.list.category
             },
-            'total': len(results)
+            'total': len(results),
+            'missing_providers': missing_providers
         })
         
     except ListItem.DoesNotExist:
@@ -785,6 +860,11 @@ def search_external(request):
     """
     Recherche dans les APIs externes (TMDB, Spotify, Google Books)
     """
+    return search_external_response(request)
+
+
+def search_external_response(request):
+    """Corps de search_external, partagé avec sa version asynchrone (voir async_views)"""
     query = request.GET.get('q', '').strip()
     limit = min(int(request.GET.get('limit', 10)), 50)
     source = request.GET.get('source', '')  # tmdb, spotify, google_books
@@ -800,6 +880,7 @@ def search_external(request):
         })
     
     results = []
+    missing_providers = []
     
     try:
         # Import des services
@@ -807,77 +888,95 @@ def search_external(request):
         from .services.spotify_service import SpotifyService
         from .services.books_service import BooksService
         
-        # Rechercher selon la catégorie ou source spécifiée
-        if not category or category == 'FILMS' or not source or source == 'tmdb':
-            tmdb = TMDBService()
-            movies = tmdb.search_movies(query, limit=limit//4 if not category else limit)
-            for movie in movies:
-                results.append({
-                    'external_id': movie.get('external_id'),
-                    'source': movie.get('source', 'tmdb'),
-                    'category': 'FILMS',
-                    'category_display': 'Films',
-                    'title': movie.get('title', ''),
-                    'description': movie.get('description', ''),
-                    'poster_url': movie.get('poster_url'),
-                    'release_date': movie.get('release_date', '')
-                })
+        per_provider_limit = limit//4 if not category else limit
         
-        if not category or category == 'SERIES' or not source or source == 'tmdb':
-            tmdb = TMDBService()
-            series = tmdb.search_tv_shows(query, limit=limit//4 if not category else limit)
-            for show in series:
-                results.append({
-                    'external_id': show.get('external_id'),
-                    'source': show.get('source', 'tmdb'),
-                    'category': 'SERIES',
-                    'category_display': 'Séries',
-                    'title': show.get('title', ''),
-                    'description': show.get('description', ''),
-                    'poster_url': show.get('poster_url'),
-                    'release_date': show.get('first_air_date', '')
-                })
+        def search_tmdb(tmdb_category):
+            tmdb = get_service(TMDBService)
+            if category:
+                if tmdb_category == 'FILMS':
+                    return tmdb.search_movies(query, limit=per_provider_limit)
+                return tmdb.search_tv_shows(query, limit=per_provider_limit)
+            # Sans catégorie : films et séries en un seul appel /search/multi (partagé
+            # entre format_movies et format_series, lancés en parallèle)
+            return tmdb.search_multi(query, limit=per_provider_limit)[tmdb_category]
         
-        if not category or category == 'MUSIQUE' or not source or source == 'spotify':
-            try:
-                spotify = SpotifyService()
-                # Recherche plus complète : morceaux et albums
-                music_results = spotify.search_music(query, limit=limit//4 if not category else limit)
-                for item in music_results:
-                    if isinstance(item, dict):
-                        results.append({
-                            'external_id': item.get('external_id'),
-                            'source': item.get('source', 'spotify'),
-                            'category': 'MUSIQUE',
-                            'category_display': 'Musique',
-                            'title': item.get('title', ''),
-                            'description': item.get('description', ''),
-                            'poster_url': item.get('poster_url'),
-                            'release_date': item.get('release_date', ''),
-                            'item_type': item.get('type')  # Ajout du type: track, album, artist
-                        })
-            except Exception as e:
-                logger.error(f"Spotify search error: {e}")
+        def format_movies():
+            movies = search_tmdb('FILMS')
+            return [{
+                'external_id': movie.get('external_id'),
+                'source': movie.get('source', 'tmdb'),
+                'category': 'FILMS',
+                'category_display': 'Films',
+                'title': movie.get('title', ''),
+                'description': movie.get('description', ''),
+                'poster_url': movie.get('poster_url'),
+                'release_date': movie.get('release_date', '')
+            } for movie in movies]
         
-        if not category or category == 'LIVRES' or not source or source == 'google_books':
-            try:
-                books = BooksService()
-                book_results = books.search_books(query, limit=limit//4 if not category else limit)
-                for book in book_results:
-                    if isinstance(book, dict):
-                        results.append({
-                            'external_id': book.get('external_id'),
-                            'source': book.get('source', 'google_books'),
-                            'category': 'LIVRES',
-                            'category_display': 'Livres',
-                            'title': book.get('title', ''),
-                            'description': book.get('description', ''),
-                            'poster_url': book.get('poster_url'),
-                            'release_date': book.get('published_date', ''),
-                            'authors': book.get('authors', [])
-                        })
-            except Exception as e:
-                logger.error(f"Google Books search error: {e}")
+        def format_series():
+            series = search_tmdb('SERIES')
+            return [{
+                'external_id': show.get('external_id'),
+                'source': show.get('source', 'tmdb'),
+                'category': 'SERIES',
+                'category_display': 'Séries',
+                'title': show.get('title', ''),
+                'description': show.get('description', ''),
+                'poster_url': show.get('poster_url'),
+                'release_date': show.get('first_air_date', '')
+            } for show in series]
+        
+        def format_music():
+            # Recherche plus complète : morceaux et albums
+            music_results = get_service(SpotifyService).search_music(query, limit=per_provider_limit)
+            return [{
+                'external_id': item.get('external_id'),
+                'source': item.get('source', 'spotify'),
+                'category': 'MUSIQUE',
+                'category_display': 'Musique',
+                'title': item.get('title', ''),
+                'description': item.get('description', ''),
+                'poster_url': item.get('poster_url'),
+                'release_date': item.get('release_date', ''),
+                'item_type': item.get('type')  # Ajout du type: track, album, artist
+            } for item in music_results if isinstance(item, dict)]
+        
+        def format_books():
+            book_results = get_service(BooksService).search_books(query, limit=per_provider_limit)
+            return [{
+                'external_id': book.get('external_id'),
+                'source': book.get('source', 'google_books'),
+                'category': 'LIVRES',
+                'category_display': 'Livres',
+                'title': book.get('title', ''),
+                'description': book.get('description', ''),
+                'poster_url': book.get('poster_url'),
+                'release_date': book.get('published_date', ''),
+                'authors': book.get('authors', [])
+            } for book in book_results if isinstance(book, dict)]
+        
+        # Rechercher selon la catégorie ou source spécifiée, dans l'ordre des catégories
+        searches = [
+            ('FILMS', 'tmdb', format_movies),
+            ('SERIES', 'tmdb', format_series),
+            ('MUSIQUE', 'spotify', format_music),
+            ('LIVRES', 'google_books', format_books),
+        ]
+        searches = [
+            (search_category, search_source, search)
+            for search_category, search_source, search in searches
+            if not category or category == search_category or not source or source == search_source
+        ]
+        
+        # Les APIs sont interrogées en parallèle; une API trop lente est signalée comme manquante
+        provider_results, missing = run_parallel(
+            [(search_category, search) for search_category, _, search in searches]
+        )
+        for search_category, search_source, _ in searches:
+            if search_category in missing:
+                missing_providers.append({'source': search_source, 'category': search_category})
+            else:
+                results.extend(provider_results[search_category])
                 
     except Exception as e:
         logger.error(f"External search error: {e}")
@@ -894,7 +993,8 @@ def search_external(request):
         'query': query,
         'category': category,
         'source': source,
-        'total': len(results)
+        'total': len(results),
+        'missing_providers': missing_providers
     })
 
 
@@ -904,10 +1004,16 @@ def get_trending_external(request):
     """
     Récupère le contenu tendance depuis les APIs externes
     """
+    return get_trending_external_response(request)
+
+
+def get_trending_external_response(request):
+    """Corps de get_trending_external, partagé avec sa version asynchrone (voir async_views)"""
     category = request.GET.get('category', '')
     limit = min(int(request.GET.get('limit', 10)), 50)
     
     results = []
+    missing_providers = []
     
     try:
         from .services.tmdb_service import TMDBService
@@ -915,8 +1021,11 @@ def get_trending_external(request):
         from .services.books_service import BooksService
         
         if not category or category == 'FILMS':
-            tmdb = TMDBService()
-            trending_movies = tmdb.get_trending_movies(limit=limit//4 if not category else limit)
+            tmdb = get_service(TMDBService)
+            trending_movies = _complete_or_missing(
+                lambda: tmdb.get_trending_movies(limit=limit//4 if not category else limit),
+                'FILMS', missing_providers
+            )
             for movie in trending_movies:
                 results.append({
                     'external_id': movie.get('external_id'),
@@ -930,8 +1039,11 @@ def get_trending_external(request):
                 })
         
         if not category or category == 'SERIES':
-            tmdb = TMDBService()
-            trending_tv = tmdb.get_trending_tv_shows(limit=limit//4 if not category else limit)
+            tmdb = get_service(TMDBService)
+            trending_tv = _complete_or_missing(
+                lambda: tmdb.get_trending_tv_shows(limit=limit//4 if not category else limit),
+                'SERIES', missing_providers
+            )
             for show in trending_tv:
                 results.append({
                     'external_id': show.get('external_id'),
@@ -946,12 +1058,15 @@ def get_trending_external(request):
         
         if category == 'MUSIQUE':
             try:
-                spotify = SpotifyService()
+                spotify = get_service(SpotifyService)
                 # Utiliser une recherche avec des termes populaires comme alternative
                 popular_queries = ["pop", "rock", "hip hop", "electronic", "jazz"]
                 for query in popular_queries[:2]:  # Limiter à 2 requêtes
                     try:
-                        albums = spotify.search_albums(query, limit=limit//2)
+                        albums = _complete_or_missing(
+                            lambda: spotify.search_albums(query, limit=limit//2),
+                            'MUSIQUE', missing_providers
+                        )
                         for album in albums[:limit//2]:  # Limiter encore plus
                             if isinstance(album, dict) and album.get('external_id'):
                                 results.append({
@@ -976,9 +1091,12 @@ def get_trending_external(request):
                 
         if category == 'LIVRES':
             try:
-                books = BooksService()
+                books = get_service(BooksService)
                 # Pour les tendances, utiliser get_popular_books qui retourne des données formatées
-                trending_books = books.get_popular_books(limit=limit)
+                trending_books = _complete_or_missing(
+                    lambda: books.get_popular_books(limit=limit),
+                    'LIVRES', missing_providers
+                )
                 for book in trending_books:
                     if isinstance(book, dict) and book.get('external_id'):
                         results.append({
@@ -1008,7 +1126,8 @@ def get_trending_external(request):
     return Response({
         'results': results,
         'category': category or 'all',
-        'total': len(results)
+        'total': len(results),
+        'missing_providers': missing_providers
     })
 
 
@@ -1045,13 +1164,10 @@ def import_from_external(request):
         )['max_pos'] or 0
         
         # Récupérer les détails depuis l'API externe
-        from .services.external_enrichment_service import ExternalEnrichmentService
-        enrichment_service = ExternalEnrichmentService()
-        
         # Créer l'élément de base avec des informations minimales
         if source == 'tmdb':
             from .services.tmdb_service import TMDBService
-            tmdb = TMDBService()
+            tmdb = get_service(TMDBService)
             if category == 'FILMS':
                 details = tmdb.get_movie_details(external_id)
                 if not details:
@@ -1066,28 +1182,27 @@ def import_from_external(request):
                 description = details.get('description', '')
         elif source == 'spotify':
             from .services.spotify_service import SpotifyService
-            spotify = SpotifyService()
+            spotify = get_service(SpotifyService)
             
-            # Essayer de récupérer les détails en tant que morceau, puis en tant qu'album
-            details = spotify.get_track_details(external_id)
-            item_type = 'track'
-            if not details:
-                details = spotify.get_album_details(external_id)
-                item_type = 'album'
+            # Type explicite, URI spotify:track:..., ou index des identifiants
+            details = spotify.get_details(external_id, request.data.get('type'))
 
             if not details:
                 raise Exception('Impossible de trouver les détails sur Spotify.')
 
             artists = ', '.join(details.get('artists', []))
-            if item_type == 'track':
+            if details.get('type') == 'track':
                 title = f"{details.get('title', '')} - {artists}"
                 description = f"Morceau de {artists} de l'album {details.get('album', '')}"
+            elif details.get('type') == 'artist':
+                title = details.get('title', '')
+                description = details.get('description', '')
             else: # album
                 title = f"{details.get('title', '')} - {artists}"
                 description = f"Album de {artists}"
         elif source == 'google_books':
             from .services.books_service import BooksService
-            books = BooksService()
+            books = get_service(BooksService)
             details = books.get_book_details(external_id)
             volume_info = details.get('volumeInfo', {})
             title = volume_info.get('title', f'Livre {external_id}')
@@ -1105,8 +1220,8 @@ def import_from_external(request):
             list=list_obj
         )
         
-        # Enrichir l'élément avec les données externes
-        enrichment_service.enrich_list_item(list_item, force_refresh=True)
+        # Enrichir l'élément avec les données externes, hors de la requête
+        enqueue_enrichment(list_item, force_refresh=True)
         
         return Response({
             'id': list_item.id,
@@ -1115,7 +1230,8 @@ def import_from_external(request):
             'category': category,
             'list_id': list_obj.id,
             'external_id': external_id,
-            'source': source
+            'source': source,
+            'enrichment_status': list_item.enrichment_status
         }, status=status.HTTP_201_CREATED)
         
     except Exception as e:
@@ -1135,18 +1251,18 @@ def get_external_details(request, source, external_id):
     try:
         if source == 'tmdb':
             from .services.tmdb_service import TMDBService
-            tmdb = TMDBService()
+            tmdb = get_service(TMDBService)
             # Essayer d'abord comme un film, puis comme une série
             details = tmdb.get_movie_details(external_id)
             if not details:
                 details = tmdb.get_tv_show_details(external_id)
         elif source == 'spotify':
             from .services.spotify_service import SpotifyService
-            spotify = SpotifyService()
-            details = spotify.get_album_details(external_id)
+            spotify = get_service(SpotifyService)
+            details = spotify.get_details(external_id, request.GET.get('type'))
         elif source == 'google_books':
             from .services.books_service import BooksService
-            books = BooksService()
+            books = get_service(BooksService)
             details = books.get_book_details(external_id)
         else:
             return Response(
@@ -0,0 +1,18 @@
+"""
+Configuration Celery pour tastematch_api.
+
+Démarrage d'un worker avec les tâches périodiques :
+    celery -A tastematch_api worker -B -l info
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tastematch_api.settings')
+
+app = Celery('tastematch_api')
+
+# Toutes les options Celery sont lues depuis les settings Django préfixés par CELERY_
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -167,4 +167,124 @@ REST_FRAMEWORK = {
 TMDB_API_KEY = os.environ.get('TMDB_API_KEY')
 SPOTIFY_CLIENT_ID = os.environ.get('SPOTIFY_CLIENT_ID')
 SPOTIFY_CLIENT_SECRET = os.environ.get('SPOTIFY_CLIENT_SECRET')
-GOOGLE_BOOKS_API_KEY = os.environ.get('GOOGLE_BOOKS_API_KEY')
\ No newline at end of file
+GOOGLE_BOOKS_API_KEY = os.environ.get('GOOGLE_BOOKS_API_KEY')
+
+# APICache : tier mémoire local (par worker) devant la table en base
+API_CACHE_LOCAL_MAX_ENTRIES = int(os.environ.get('API_CACHE_LOCAL_MAX_ENTRIES', 1000))
+API_CACHE_LOCAL_MAX_BYTES = int(os.environ.get('API_CACHE_LOCAL_MAX_BYTES', 16 * 1024 * 1024))
+API_CACHE_LOCAL_MAX_TTL = int(os.environ.get('API_CACHE_LOCAL_MAX_TTL', 600))  # secondes
+
+# APICache : stale-while-revalidate (fenêtre maximale de conservation des entrées expirées)
+API_CACHE_STALE_MAX_GRACE_HOURS = float(os.environ.get('API_CACHE_STALE_MAX_GRACE_HOURS', 24))
+
+# Redis (optionnel) : verrous et compteurs partagés entre workers
+REDIS_URL = os.environ.get('REDIS_URL')
+if not REDIS_URL and os.environ.get('REDIS_HOST'):
+    REDIS_URL = f"redis://{os.environ['REDIS_HOST']}:{os.environ.get('REDIS_PORT', '6379')}/0"
+
+# Délai d'attente (secondes) d'un appel coalescé sur le résultat de l'appel en cours
+API_SINGLE_FLIGHT_TIMEOUT = float(os.environ.get('API_SINGLE_FLIGHT_TIMEOUT', 10))
+
+# APICache : durée de vie des entrées négatives (réponses vides ou 404)
+API_CACHE_NEGATIVE_TTL_HOURS = float(os.environ.get('API_CACHE_NEGATIVE_TTL_HOURS', 0.25))
+
+# Celery (tâches hors requête) : Redis comme broker si disponible
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', REDIS_URL or 'memory://')
+CELERY_TASK_IGNORE_RESULT = True
+CELERY_BEAT_SCHEDULE = {
+    'purge-expired-api-cache': {
+        'task': 'core.tasks.purge_expired_api_cache',
+        'schedule': 60 * 60,  # toutes les heures
+    },
+    'build-popular-books-snapshot': {
+        'task': 'core.tasks.build_popular_books_snapshot',
+        'schedule': 24 * 60 * 60,  # tous les jours
+    },
+}
+
+# APICache : taille des lots de la purge des entrées expirées
+API_CACHE_PURGE_BATCH_SIZE = int(os.environ.get('API_CACHE_PURGE_BATCH_SIZE', 1000))
+
+# APICache : format de stockage des données ("json" = JSONField, ou "zlib+json",
+# "zlib+msgpack", "zstd+msgpack"... selon les dépendances installées)
+API_CACHE_ENCODING = os.environ.get('API_CACHE_ENCODING', 'json')
+
+# APICache : backend de stockage ("database" = table APICache, "redis" = Redis avec repli en base)
+API_CACHE_BACKEND = os.environ.get('API_CACHE_BACKEND', 'redis' if REDIS_URL else 'database')
+
+# Cache Django partagé entre workers quand Redis est disponible (LocMem par processus sinon)
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+
+# APICache : règles de durée prioritaires sur core.services.ttl_policy.TTL_POLICIES
+# Format : [(fournisseur, motif d'endpoint, préfixe de recherche ou None, durée en heures), ...]
+API_CACHE_TTL_OVERRIDES = []
+
+
+# Endpoint de métriques du cache des APIs externes : adresses autorisées (en plus du staff),
+# comparées à REMOTE_ADDR (adresse du proxy derrière un reverse proxy). Compteurs par worker.
+API_METRICS_ALLOWED_IPS = os.environ.get('API_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# APIs externes : connexions keep-alive conservées par hôte et par worker
+API_HTTP_POOL_MAXSIZE = int(os.environ.get('API_HTTP_POOL_MAXSIZE', 20))
+
+# Recherche externe : appels parallèles aux APIs (threads par worker, échéance globale en secondes).
+# Threads : requêtes simultanées attendues par worker x 4 fournisseurs. Au-delà de
+# API_FAN_OUT_MAX_QUEUE appels en attente d'un thread, les suivants sont signalés manquants
+API_FAN_OUT_MAX_WORKERS = int(os.environ.get('API_FAN_OUT_MAX_WORKERS', 16))
+API_FAN_OUT_MAX_QUEUE = int(os.environ.get('API_FAN_OUT_MAX_QUEUE', 16))
+API_FAN_OUT_TIMEOUT_SECONDS = float(os.environ.get('API_FAN_OUT_TIMEOUT_SECONDS', 5))
+
+# Vues asynchrones des APIs externes (core.async_views), pour un serveur ASGI :
+# uvicorn tastematch_api.asgi:application
+API_ASYNC_VIEWS = os.environ.get('API_ASYNC_VIEWS', 'False') == 'True'
+API_ASYNC_HTTP_MAX_CONNECTIONS = int(os.environ.get('API_ASYNC_HTTP_MAX_CONNECTIONS', 100))
+
+# APIs externes : limite de débit par fournisseur, partagée entre workers via Redis
+# (rate = appels par seconde, burst = rafale maximale), sous les quotas des fournisseurs
+API_RATE_LIMITS = {
+    'tmdb': {
+        'rate': float(os.environ.get('TMDB_RATE_LIMIT', 40)),
+        'burst': int(os.environ.get('TMDB_RATE_BURST', 40)),
+    },
+    'spotify': {
+        'rate': float(os.environ.get('SPOTIFY_RATE_LIMIT', 5)),
+        'burst': int(os.environ.get('SPOTIFY_RATE_BURST', 20)),
+    },
+    'google_books': {
+        'rate': float(os.environ.get('GOOGLE_BOOKS_RATE_LIMIT', 2)),
+        'burst': int(os.environ.get('GOOGLE_BOOKS_RATE_BURST', 10)),
+    },
+}
+# Part de la rafale réservée aux requêtes interactives (enrichissement et rafraîchissements exclus)
+API_RATE_LIMIT_BULK_RESERVE = float(os.environ.get('API_RATE_LIMIT_BULK_RESERVE', 0.3))
+# Attente maximale d'un jeton avant d'abandonner l'appel (secondes)
+API_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.environ.get('API_RATE_LIMIT_MAX_WAIT_SECONDS', 1))
+API_RATE_LIMIT_BULK_MAX_WAIT_SECONDS = float(os.environ.get('API_RATE_LIMIT_BULK_MAX_WAIT_SECONDS', 30))
+
+# APIs externes : disjoncteur par fournisseur, partagé entre workers via Redis
+# Ouverture quand le taux d'échecs (erreurs réseau, 5xx, appels lents) atteint le seuil sur
+# la fenêtre, puis un appel d'essai après API_CIRCUIT_OPEN_SECONDS
+API_CIRCUIT_WINDOW_SECONDS = int(os.environ.get('API_CIRCUIT_WINDOW_SECONDS', 60))
+API_CIRCUIT_MIN_CALLS = int(os.environ.get('API_CIRCUIT_MIN_CALLS', 5))
+API_CIRCUIT_FAILURE_RATE = float(os.environ.get('API_CIRCUIT_FAILURE_RATE', 0.5))
+API_CIRCUIT_SLOW_CALL_SECONDS = float(os.environ.get('API_CIRCUIT_SLOW_CALL_SECONDS', 3))
+API_CIRCUIT_OPEN_SECONDS = float(os.environ.get('API_CIRCUIT_OPEN_SECONDS', 30))
+
+# Livres populaires : recherches résolues dans l'instantané (séparées par ";", défaut :
+# BooksService.POPULAR_QUERIES) et durée de vie de l'instantané, reconstruit chaque jour
+POPULAR_BOOKS_SEED_QUERIES = [
+    query.strip() for query in os.environ.get('POPULAR_BOOKS_SEED_QUERIES', '').split(';') if query.strip()
+]
+POPULAR_BOOKS_SNAPSHOT_TTL_HOURS = float(os.environ.get('POPULAR_BOOKS_SNAPSHOT_TTL_HOURS', 48))
+
+# Enrichissement externe des éléments créés : tâche Celery planifiée après validation de la
+# transaction, une seule tâche en attente par élément. Sans broker Redis, enrichissement sur place
+# après la validation : la requête attend les APIs et sa réponse porte l'état final
+ENRICHMENT_ASYNC = os.environ.get('ENRICHMENT_ASYNC', 'True' if REDIS_URL else 'False') == 'True'
+ENRICHMENT_QUEUE_DEDUP_SECONDS = int(os.environ.get('ENRICHMENT_QUEUE_DEDUP_SECONDS', 600))